@@ -1,16 +1,23 @@
-from dotenv import load_dotenv
 from flask import Flask, jsonify, send_file, g, request
 
 from core import Engine
+from core.event_loop import event_loop
+from core.excel_engines import engine_timings
+from core.instruction_parser import instruction_parser
+from core.llm_client import gemini_client
+from core.llm_scheduler import llm_scheduler
+from core.params_cache import params_cache
+from core.sentiment_cache import sentiment_cache
+from core.sessions import workbook_sessions
+from core.workbook_cache import workbook_cache
 from custom_exceptions import CustomBaseException
-from utils import validate_process_excel_request
+from utils import validate_process_excel_request, validate_upload_workbook_request, validate_workbook_session_request, \
+    SpooledUploadRequest
 from config import logger
 from flasgger import Swagger
 
-# Load environment variables from .env file
-load_dotenv()
-
 app = Flask(__name__)
+app.request_class = SpooledUploadRequest
 swagger = Swagger(app)
 
 @app.errorhandler(CustomBaseException)
@@ -25,6 +32,16 @@ def handle_custom_exception(error):
     return jsonify(error.to_dict()), error.status_code
 
 
+@app.teardown_request
+def release_workbook(_error=None):
+    """Releases the workbook opened for the request and the workbook sessions that expired."""
+    workbook = g.pop('workbook', None)
+    if workbook is not None:
+        workbook.close()
+    # expired sessions are released even when no request uses sessions any more
+    workbook_sessions.reap()
+
+
 @app.route('/health')
 def health_check():
     """
@@ -43,6 +60,28 @@ def health_check():
     return jsonify({"status": "ok"}), 200
 
 
+@app.route('/metrics')
+def metrics():
+    """
+    Cache and client counters of this worker.
+    ---
+    responses:
+        200:
+            description: Counters grouped by component
+    """
+    return jsonify({
+        "workbook_cache": workbook_cache.stats(),
+        "workbook_sessions": workbook_sessions.stats(),
+        "excel_engines": engine_timings.stats(),
+        "params_cache": params_cache.stats(),
+        "instruction_parser": instruction_parser.stats(),
+        "llm_http": gemini_client.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "nlp_event_loop": event_loop.stats(),
+        "sentiment_cache": sentiment_cache.stats(),
+    }), 200
+
+
 @app.route('/process-excel', methods=['POST'])
 @validate_process_excel_request
 def process_excel():
@@ -70,12 +109,89 @@ def process_excel():
         500:
             description: Internal server error.
     """
-    core = Engine(g.params, request.files['file'])
-    core.execute()
+    core = Engine(g.params, g.workbook)
+    output = core.execute()
 
-    return send_file("./output.xlsx", download_name="output.xlsx", as_attachment=True,
+    return send_file(output, download_name="output.xlsx", as_attachment=True,
                      mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
+
+@app.route('/workbooks', methods=['POST'])
+@validate_upload_workbook_request
+def upload_workbook():
+    """
+    Upload an Excel file once to run several instructions against it.
+    ---
+    parameters:
+      - name: file
+        in: formData
+        type: file
+        required: true
+        description: Input Excel file to be kept on the server.
+    responses:
+        201:
+            description: Id of the uploaded workbook with its sheets and columns.
+        400:
+            description: Bad request if the input file is invalid.
+    """
+    session, metadata = workbook_sessions.create(request.files['file'])
+    return jsonify({"workbook_id": session.workbook_id, "sheets": metadata}), 201
+
+
+@app.route('/workbooks/<workbook_id>/process-excel', methods=['POST'])
+@validate_workbook_session_request
+def process_workbook(workbook_id):
+    """
+    Process an uploaded Excel file and return the processed output.
+    ---
+    parameters:
+      - name: workbook_id
+        in: path
+        type: string
+        required: true
+        description: Id returned when the workbook was uploaded.
+      - name: instructions
+        in: formData
+        type: string
+        required: true
+        description: Instructions for the processing of the Excel file (e.g., "Sum column A and column B").
+    responses:
+        200:
+            description: Successfully processed Excel file and returned as a downloadable file.
+            schema:
+                type: file
+        400:
+            description: Bad request if the instructions are invalid.
+        404:
+            description: The workbook does not exist or has expired.
+    """
+    core = Engine(g.params, g.workbook)
+    output = core.execute()
+
+    return send_file(output, download_name="output.xlsx", as_attachment=True,
+                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+@app.route('/workbooks/<workbook_id>', methods=['DELETE'])
+def delete_workbook(workbook_id):
+    """
+    Remove an uploaded Excel file from the server.
+    ---
+    parameters:
+      - name: workbook_id
+        in: path
+        type: string
+        required: true
+        description: Id returned when the workbook was uploaded.
+    responses:
+        204:
+            description: The workbook was removed.
+        404:
+            description: The workbook does not exist or has expired.
+    """
+    workbook_sessions.delete(workbook_id)
+    return '', 204
+
 if __name__ == '__main__':
     logger.info("Starting the server...")
     app.run(host="0.0.0.0", port=5001, debug=True)
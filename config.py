@@ -1,4 +1,13 @@
 import logging
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+from constants import OutputModes, ExcelEngines
+
+# Load environment variables from .env file before any setting below reads them
+load_dotenv()
 
 # Configure the logging
 logging.basicConfig(
@@ -11,3 +20,100 @@ logging.basicConfig(
 
 # Get the logger
 logger = logging.getLogger(__name__)
+
+# Output mode of processed workbooks, one of constants.OutputModes
+OUTPUT_MODE = os.environ.get('EXCEL_OUTPUT_MODE', OutputModes.PASSTHROUGH)
+
+# Processed workbooks are kept in memory up to this many bytes, then spooled to a temporary file
+OUTPUT_SPOOL_MAX_SIZE = int(os.environ.get('OUTPUT_SPOOL_MAX_SIZE', 32 * 1024 * 1024))
+
+# Engines reading and writing workbooks, one of constants.ExcelEngines. With 'auto', files of at least
+# EXCEL_FAST_ENGINE_MIN_SIZE bytes use the fast engines when installed and smaller ones use openpyxl
+EXCEL_READER_ENGINE = os.environ.get('EXCEL_READER_ENGINE', ExcelEngines.AUTO)
+EXCEL_WRITER_ENGINE = os.environ.get('EXCEL_WRITER_ENGINE', ExcelEngines.AUTO)
+EXCEL_FAST_ENGINE_MIN_SIZE = int(os.environ.get('EXCEL_FAST_ENGINE_MIN_SIZE', 256 * 1024))
+
+# Uploads are held in memory up to this many bytes and spooled to a temporary file in UPLOAD_SPOOL_DIR above it,
+# the system temporary directory by default
+UPLOAD_SPOOL_MAX_SIZE = int(os.environ.get('UPLOAD_SPOOL_MAX_SIZE', 1024 * 1024))
+UPLOAD_SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR') or None
+
+# Parsed workbook cache budgets in bytes. The disk tier is off unless WORKBOOK_CACHE_DISK_BUDGET is set; its
+# directory must be private to the user running the app, or it is left unused
+WORKBOOK_CACHE_MEMORY_BUDGET = int(os.environ.get('WORKBOOK_CACHE_MEMORY_BUDGET', 512 * 1024 * 1024))
+WORKBOOK_CACHE_DISK_BUDGET = int(os.environ.get('WORKBOOK_CACHE_DISK_BUDGET', 0))
+WORKBOOK_CACHE_DIR = os.environ.get('WORKBOOK_CACHE_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'nlp-excel-engine-workbooks'))
+
+# Uploaded workbook sessions expire after this many idle seconds, or least recently used first once the
+# parsed sheets of all sessions exceed the memory budget in bytes. Their files are kept in SESSION_DIR, which must
+# be a directory private to the user running the app
+SESSION_IDLE_TIMEOUT = int(os.environ.get('SESSION_IDLE_TIMEOUT', 30 * 60))
+SESSION_MEMORY_BUDGET = int(os.environ.get('SESSION_MEMORY_BUDGET', 1024 * 1024 * 1024))
+SESSION_DIR = os.environ.get('SESSION_DIR', os.path.join(tempfile.gettempdir(), 'nlp-excel-engine-sessions'))
+
+# Parameters extracted from instructions are reused for this many seconds, for up to PARAMS_CACHE_MAX_ENTRIES
+# instructions. With PARAMS_CACHE_PATH set they are also kept in that SQLite database, shared by the workers
+PARAMS_CACHE_MAX_ENTRIES = int(os.environ.get('PARAMS_CACHE_MAX_ENTRIES', 1024))
+PARAMS_CACHE_TTL = int(os.environ.get('PARAMS_CACHE_TTL', 24 * 60 * 60))
+PARAMS_CACHE_PATH = os.environ.get('PARAMS_CACHE_PATH') or None
+
+# Simple instructions are parsed locally when possible, the LLM is asked only for the others
+LOCAL_INSTRUCTION_PARSER = os.environ.get('LOCAL_INSTRUCTION_PARSER', 'true').lower() == 'true'
+
+# Gemini model used to extract parameters and run the NLP operations
+GEMINI_MODEL_NAME = os.environ.get('GEMINI_MODEL_NAME', 'gemini-2.0-flash')
+
+# Connection pool of the HTTP session the NLP operations share per event loop: open connections in total and
+# per host, seconds an idle connection is kept alive and seconds resolved addresses are cached
+LLM_HTTP_POOL_LIMIT = int(os.environ.get('LLM_HTTP_POOL_LIMIT', 100))
+LLM_HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get('LLM_HTTP_POOL_LIMIT_PER_HOST', 20))
+LLM_HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get('LLM_HTTP_KEEPALIVE_TIMEOUT', 60))
+LLM_HTTP_DNS_CACHE_TTL = int(os.environ.get('LLM_HTTP_DNS_CACHE_TTL', 300))
+
+# Chunk calls of the NLP operations: calls in flight at once, requests and estimated input tokens allowed per minute
+# (0 for no limit), and retries of rate limited or failed calls, waiting a random delay of up to
+# LLM_RETRY_BASE_DELAY * 2 ** attempt seconds, capped at LLM_RETRY_MAX_DELAY
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get('LLM_REQUESTS_PER_MINUTE', 1000))
+LLM_TOKENS_PER_MINUTE = int(os.environ.get('LLM_TOKENS_PER_MINUTE', 1000000))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 5))
+LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY', 1))
+LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY', 30))
+
+# Rows sent in one NLP request are packed up to NLP_CHUNK_TOKEN_BUDGET estimated input tokens and, for operations
+# answering per row, NLP_MAX_OUTPUT_TOKENS output tokens, with at most NLP_CHUNK_MAX_ROWS rows. Longer cells are split
+NLP_CHUNK_TOKEN_BUDGET = int(os.environ.get('NLP_CHUNK_TOKEN_BUDGET', 8000))
+NLP_MAX_OUTPUT_TOKENS = int(os.environ.get('NLP_MAX_OUTPUT_TOKENS', 7192))
+NLP_CHUNK_MAX_ROWS = int(os.environ.get('NLP_CHUNK_MAX_ROWS', 200))
+
+# The LLM calls of all requests run on one long-lived event loop thread; CPU-bound steps of those jobs, like
+# packing the rows into chunks, run in a pool of NLP_CPU_WORKERS threads so they do not stall the loop
+NLP_CPU_WORKERS = int(os.environ.get('NLP_CPU_WORKERS', 4))
+
+# Sentiment labels of up to SENTIMENT_CACHE_MAX_ENTRIES distinct texts are kept across requests. With
+# SENTIMENT_CACHE_PATH set they are also kept in that SQLite database, shared by the workers
+SENTIMENT_CACHE_MAX_ENTRIES = int(os.environ.get('SENTIMENT_CACHE_MAX_ENTRIES', 100000))
+SENTIMENT_CACHE_PATH = os.environ.get('SENTIMENT_CACHE_PATH') or None
+
+# Sentiment backend used when the instruction does not choose one, 'llm' or 'lexicon'. With
+# SENTIMENT_LEXICON_FALLBACK, texts the LLM could not classify after its retries are labelled by the lexicon
+SENTIMENT_BACKEND = os.environ.get('SENTIMENT_BACKEND', 'llm')
+SENTIMENT_LEXICON_FALLBACK = os.environ.get('SENTIMENT_LEXICON_FALLBACK', 'false').lower() == 'true'
+
+# Summarization backend used when the instruction does not choose one, 'llm' or 'extractive'. Extractive summaries
+# hold the SUMMARY_SENTENCES best ranked sentences of the column
+SUMMARY_BACKEND = os.environ.get('SUMMARY_BACKEND', 'llm')
+SUMMARY_SENTENCES = int(os.environ.get('SUMMARY_SENTENCES', 5))
+
+# LLM summaries are reduced level by level, each call merging up to SUMMARY_REDUCE_FAN_IN partial summaries
+SUMMARY_REDUCE_FAN_IN = int(os.environ.get('SUMMARY_REDUCE_FAN_IN', 8))
+
+# Sheets an instruction likely needs are parsed by this many background threads while the LLM extracts the
+# parameters, at most PREFETCH_MAX_SHEETS sheets per request
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 4))
+PREFETCH_MAX_SHEETS = int(os.environ.get('PREFETCH_MAX_SHEETS', 4))
+
+# Estimated tokens the parameter extraction prompt may take. Columns of wider workbooks are shown by relevance
+# to the instruction until the budget is spent
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 8000))
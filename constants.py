@@ -31,6 +31,9 @@ class Operations:
     DATE_DIFFERENCE = 'date_difference'
 
     ######### Misc ########
+    # operations whose result only holds the referenced columns, so the sheet is never written back
+    COLUMN_PROJECTION_OPERATIONS = [AVG, MIN, MAX, PIVOT_TABLE]
+
     DF_JOIN_MAPPER = {
         INNER_JOIN: 'inner',
         LEFT_JOIN: 'left',
@@ -39,6 +42,45 @@ class Operations:
     }
 
 
+class OutputModes:
+    """Ways of writing the processed workbook."""
+    # copy untouched sheets from the uploaded zip, write only modified and new sheets
+    PASSTHROUGH = 'passthrough'
+    # rewrite every sheet through pandas
+    REWRITE = 'rewrite'
+
+
+class ExcelEngines:
+    """Engines pandas reads and writes Excel files with."""
+    # pick by file size, preferring the fast engines when they are installed
+    AUTO = 'auto'
+    OPENPYXL = 'openpyxl'
+    # Rust-backed reader from the optional python-calamine package
+    CALAMINE = 'calamine'
+    # writer from the optional xlsxwriter package
+    XLSXWRITER = 'xlsxwriter'
+
+
+class SentimentBackends:
+    """Classifiers sentiment analysis runs with, chosen by the 'backend' parameter."""
+    # Gemini, one request per chunk of distinct texts
+    LLM = 'llm'
+    # local lexicon and negation rules, no network
+    LEXICON = 'lexicon'
+
+    ALL = [LLM, LEXICON]
+
+
+class SummaryBackends:
+    """Summarizers summarization runs with, chosen by the 'backend' parameter."""
+    # Gemini, summarizing the chunk summaries again
+    LLM = 'llm'
+    # local sentence ranking, the summary made of the best ranked sentences of the column
+    EXTRACTIVE = 'extractive'
+
+    ALL = [LLM, EXTRACTIVE]
+
+
 class ErrorCodes:
     """Error codes for custom exceptions."""
     INVALID_FILE = "INVALID_FILE"
@@ -51,6 +93,9 @@ class ErrorCodes:
     LLM_RAISED_EXCEPTION = "LLM_RAISED_EXCEPTION"
     INVALID_REQUEST = "INVALID_REQUEST"
     OPERATION_NOT_SUPPORTED = "OPERATION_NOT_SUPPORTED"
+    WORKBOOK_NOT_FOUND = "WORKBOOK_NOT_FOUND"
+    LLM_UNAVAILABLE = "LLM_UNAVAILABLE"
+    SESSIONS_UNAVAILABLE = "SESSIONS_UNAVAILABLE"
 
 
 class ErrorMessages:
@@ -61,6 +106,9 @@ class ErrorMessages:
     INVALID_COLUMN = "Invalid column. Provide a valid column."
     INVALID_SHEET = "Invalid sheet. Provide a valid sheet."
     INVALID_PARAMETERS = "Invalid parameters. Provide valid parameters."
+    WORKBOOK_NOT_FOUND = "Workbook not found. It may have expired, upload it again."
+    LLM_UNAVAILABLE = "The language model could not process the request. Try again later."
+    SESSIONS_UNAVAILABLE = "Workbook sessions are unavailable on this server. Use /process-excel instead."
 
 
 class StatusCodes:
@@ -68,3 +116,4 @@ class StatusCodes:
     BAD_REQUEST = 400
     INTERNAL_SERVER_ERROR = 500
     NOT_FOUND = 404
+    SERVICE_UNAVAILABLE = 503
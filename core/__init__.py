@@ -1,62 +1,152 @@
+from tempfile import SpooledTemporaryFile
+
+import numpy as np
 import pandas as pd
 
-from config import logger
-from constants import Operations
+from config import logger, OUTPUT_MODE, OUTPUT_SPOOL_MAX_SIZE
+from constants import Operations, OutputModes, ExcelEngines
+from core.excel_engines import select_writer, writer_options, engine_timings
 from core.math_processor import MathOperationExecutor
 from core.nlp_processor import NLPTaskExecutor
+from core.workbook import Workbook
+from core.xlsx_passthrough import XlsxPassthroughWriter
 
 
 class FileHandler:
     """Handles reading and writing Excel files."""
 
-    def __init__(self, file_stream, sheet_names):
-        self.file_stream = file_stream
+    def __init__(self, workbook: Workbook, sheet_names):
+        self.workbook = workbook
         self.sheet_names = sheet_names
         self.__load_df = {}
+        self.__loaded_columns = {}
+        self.__loaded_hashes = {}
+        self.__updated_sheets = set()
 
     @property
     def df_dict(self) -> dict[str, pd.DataFrame]:
+        """Sheets loaded so far, plus any sheet added through update_df."""
         return self.__load_df
 
+    def get_df(self, sheet_name: str, columns: list = None) -> pd.DataFrame:
+        """
+            Returns the dataframe for the specified sheet, parsing it on first access.
+
+        :param sheet_name: Name of the sheet
+        :param columns: Columns the caller needs. Only these columns are read, and the sheet stays untouched, so
+            the result must not be written back to the sheet.
+        """
+        if sheet_name not in self.__load_df:
+            if sheet_name not in self.workbook.sheet_names:
+                raise ValueError(f"Sheet '{sheet_name}' does not exist in the Excel file.")
+            if columns is not None:
+                return self.workbook.get_sheet(sheet_name, columns)
+            self.__load_df[sheet_name] = self.workbook.get_sheet(sheet_name)
+            self.__loaded_columns[sheet_name] = list(self.__load_df[sheet_name].columns)
+            self.__loaded_hashes[sheet_name] = self.__hash(self.__load_df[sheet_name])
+        if columns is not None:
+            return self.__load_df[sheet_name][columns]
+        return self.__load_df[sheet_name]
+
+    @property
+    def modified_sheets(self) -> dict[str, pd.DataFrame]:
+        """
+            Sheets set through update_df or changed in place since they were loaded, whether columns were added or
+            removed or the values of existing columns overwritten.
+        """
+        return {sheet_name: df for sheet_name, df in self.__load_df.items()
+                if sheet_name in self.__updated_sheets or list(df.columns) != self.__loaded_columns.get(sheet_name)
+                or not np.array_equal(self.__hash(df), self.__loaded_hashes[sheet_name])}
+
+    @staticmethod
+    def __hash(df: pd.DataFrame) -> np.ndarray:
+        """Hash of each row of the sheet, index included, to tell whether any cell changed."""
+        return pd.util.hash_pandas_object(df, index=True).to_numpy()
+
     def update_df(self, df: pd.DataFrame, sheet_name: str):
         """Updates the dataframe for the specified sheet."""
         self.__load_df[sheet_name] = df
+        self.__updated_sheets.add(sheet_name)
         logger.info(f"Updated dataframe for sheet '{sheet_name}'")
 
     def load_file(self) -> None:
-        """Loads Excel file from a file stream into a Pandas DataFrame."""
-        xls = pd.ExcelFile(self.file_stream, engine='openpyxl')
-
-        # Check if all sheets exist
+        """
+            Checks the requested sheets exist. Sheets are parsed lazily through get_df.
+        """
         for sheet in self.sheet_names:
-            if sheet not in xls.sheet_names:
+            if sheet not in self.workbook.sheet_names:
                 raise ValueError(f"Sheet '{sheet}' does not exist in the Excel file.")
 
-        for sheet in xls.sheet_names:
-            self.__load_df[sheet] = pd.read_excel(xls, sheet_name=sheet)
+    def save_file(self, save_path, mode: str = None) -> None:
+        """
+            Saves modifications back to a specified path for the Excel file.
 
-    def save_file(self, save_path: str = './output.xlsx') -> None:
-        """Saves modifications back to a specified path for the Excel file."""
-        with pd.ExcelWriter(save_path, engine='openpyxl', mode='w') as writer:
-            for sheet_name, df in self.__load_df.items():
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+        :param save_path: Path or writable binary stream
+        :param mode: One of OutputModes, defaults to the configured output mode. In passthrough mode the untouched
+            sheets are copied from the uploaded file as they are, styles and formulas included.
+        """
+        if (mode or OUTPUT_MODE) == OutputModes.PASSTHROUGH:
+            with self.workbook.stream_lock:
+                try:
+                    writer = XlsxPassthroughWriter(self.workbook.file_stream)
+                except ValueError as e:
+                    logger.warning(f"{e}. Rewriting every sheet instead.")
+                else:
+                    with engine_timings.timed(OutputModes.PASSTHROUGH, 'write'):
+                        writer.write(save_path, self.modified_sheets)
+                    logger.info(f"File saved to {save_path}")
+                    return
+        self.__rewrite_file(save_path)
+
+    def __rewrite_file(self, save_path) -> None:
+        """
+            Rewrites every sheet through pandas, with the writer engine picked by the size of the uploaded file.
+            Sheets that were never loaded are copied cell by cell without being decoded into DataFrames.
+        """
+        engine = select_writer(self.workbook.size)
+        with engine_timings.timed(engine, 'write'):
+            with pd.ExcelWriter(save_path, engine=engine, mode='w', **writer_options(engine)) as writer:
+                for sheet_name in self.workbook.sheet_names:
+                    if sheet_name in self.__load_df:
+                        self.__load_df[sheet_name].to_excel(writer, sheet_name=sheet_name, index=False)
+                    else:
+                        self.__copy_sheet(writer, engine, sheet_name)
+                for sheet_name, df in self.__load_df.items():
+                    if sheet_name not in self.workbook.sheet_names:
+                        df.to_excel(writer, sheet_name=sheet_name, index=False)
         logger.info(f"File saved to {save_path}")
 
+    def __copy_sheet(self, writer: pd.ExcelWriter, engine: str, sheet_name: str) -> None:
+        if engine == ExcelEngines.XLSXWRITER:
+            worksheet = writer.book.add_worksheet(sheet_name)
+            for row_number, row in enumerate(self.workbook.iter_rows(sheet_name)):
+                worksheet.write_row(row_number, 0, row)
+        else:
+            worksheet = writer.book.create_sheet(sheet_name)
+            for row in self.workbook.iter_rows(sheet_name):
+                worksheet.append(row)
+
 
 class Engine:
 
-    def __init__(self, metadata: dict, file_stream):
+    # parameters naming the columns an operation reads
+    COLUMN_PARAMETERS = ('group_by', 'index_column', 'value_column', 'columns', 'on', 'id_vars', 'value_vars')
+
+    def __init__(self, metadata: dict, workbook: Workbook):
         self._metadata = metadata
         self._math_operation_executor = MathOperationExecutor()
         self._nlp_operation_executor = NLPTaskExecutor()
-        self._file_handler = FileHandler(file_stream, metadata.get('sheets'))
+        self._file_handler = FileHandler(workbook, metadata.get('sheets'))
 
-    def execute(self):
+    def execute(self) -> SpooledTemporaryFile:
         """
             Driver method to execute the user instructed task.
+
+        :return: The processed workbook, held in memory unless it outgrows OUTPUT_SPOOL_MAX_SIZE, rewound for reading
         """
         self._file_handler.load_file()
-        df = self._file_handler.df_dict.get(self._metadata.get('sheets')[0])
+        sheets = self._metadata.get('sheets')
+        df = self._file_handler.get_df(sheets[0], self.__referenced_columns(sheets[0]))
 
         if (self._metadata.get('operation') in
                 {Operations.SENTIMENT_ANALYSIS, Operations.SUMMARIZATION}):
@@ -64,8 +154,8 @@ class Engine:
         elif self._metadata.get('operation') in {Operations.INNER_JOIN, Operations.LEFT_JOIN, Operations.RIGHT_JOIN,
                                                  Operations.FULL_OUTER_JOIN}:
             logger.info(f"Join operation detected: {self._metadata.get('operation')}")
-            logger.info(f"Right sheet: {self._file_handler.df_dict}")
-            right_df = self._file_handler.df_dict.get(self._metadata.get('sheets')[1])
+            right_df = self._file_handler.get_df(sheets[1]) if len(sheets) > 1 else None
+            logger.info(f"Right sheet: {sheets[1:]}")
             result = self._math_operation_executor.execute(df, self._metadata, right_df)
         else:
             result = self._math_operation_executor.execute(df, self._metadata)
@@ -73,4 +163,23 @@ class Engine:
         if result is not None and isinstance(result, pd.DataFrame):
             self._file_handler.update_df(result, "result_sheet")
 
-        self._file_handler.save_file()
+        output = SpooledTemporaryFile(max_size=OUTPUT_SPOOL_MAX_SIZE)
+        self._file_handler.save_file(output)
+        output.seek(0)
+        return output
+
+    def __referenced_columns(self, sheet_name: str):
+        """
+            Columns of the sheet the operation reads, or None when the whole sheet is needed, either because the
+            operation writes the sheet back or because it references no known column.
+        """
+        if self._metadata.get('operation') not in Operations.COLUMN_PROJECTION_OPERATIONS:
+            return None
+        referenced = list(self._metadata.get('columns') or [])
+        for key in self.COLUMN_PARAMETERS:
+            value = self._metadata.get('parameters', {}).get(key)
+            referenced.extend(value if isinstance(value, list) else [value])
+        sheet_columns = self._file_handler.workbook.get_columns(sheet_name)
+        columns = [column for column in sheet_columns if column in referenced]
+        logger.debug(f"Columns read from sheet '{sheet_name}': {columns}")
+        return columns or None
@@ -0,0 +1,120 @@
+"""
+    Long-lived event loop the NLP operations run their LLM calls on, and the pool their CPU-bound work runs in
+"""
+import asyncio
+import atexit
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, TypeVar
+
+from config import logger, NLP_CPU_WORKERS
+
+T = TypeVar('T')
+
+_cpu_executor = ThreadPoolExecutor(max_workers=NLP_CPU_WORKERS, thread_name_prefix='nlp-cpu')
+
+
+async def offload(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+        Runs a CPU-bound function, such as packing thousands of rows into chunks or decoding a large response, in
+        the CPU pool, so the event loop keeps serving the calls of the other jobs meanwhile.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_cpu_executor, functools.partial(func, *args, **kwargs))
+
+
+class EventLoopThread:
+    """
+        Event loop running in a daemon thread for the life of the worker. Request threads submit their coroutines
+        to it and wait for the result, so the jobs of all the requests share one loop: their calls are interleaved,
+        and the HTTP session, connection pool and scheduler limits bound to the loop outlive every request instead
+        of being rebuilt by each. The loop is started on first use, again in a forked child.
+    """
+
+    def __init__(self, name: str = 'nlp-event-loop'):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.jobs_in_flight = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if not self.__alive():
+                self.__start()
+            return self._loop
+
+    @property
+    def running(self) -> bool:
+        """Whether the loop of this process is started, without starting it."""
+        with self._lock:
+            return self.__alive()
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """
+            Runs a coroutine on the loop, blocking the calling thread until it completes.
+
+        :return: Result of the coroutine
+        """
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("EventLoopThread.run called from its own loop, await the coroutine instead")
+        self.__count(jobs=1, jobs_in_flight=1)
+        try:
+            return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+        finally:
+            self.__count(jobs_in_flight=-1)
+
+    def stop(self) -> None:
+        """Stops the loop and waits for its thread, cancelling the coroutines still running on it."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or not thread.is_alive():
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"jobs": self.jobs, "jobs_in_flight": self.jobs_in_flight}
+
+    def __alive(self) -> bool:
+        return self._loop is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def __start(self) -> None:
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            try:
+                loop.run_forever()
+            finally:
+                tasks = asyncio.all_tasks(loop)
+                for task in tasks:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+
+        self._thread = threading.Thread(target=serve, name=self.name, daemon=True)
+        self._thread.start()
+        ready.wait()
+        self._loop, self._pid = loop, os.getpid()
+        logger.info(f"Started event loop thread {self.name}")
+
+    def __count(self, **counts) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+
+event_loop = EventLoopThread()
+atexit.register(event_loop.stop)
@@ -0,0 +1,91 @@
+"""
+    Reader and writer engines for Excel files, picked by file size and timed per operation
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from importlib.util import find_spec
+
+from config import logger, EXCEL_READER_ENGINE, EXCEL_WRITER_ENGINE, EXCEL_FAST_ENGINE_MIN_SIZE
+from constants import ExcelEngines
+
+# module each engine needs, the fast engines are optional dependencies
+ENGINE_MODULES = {
+    ExcelEngines.OPENPYXL: 'openpyxl',
+    ExcelEngines.CALAMINE: 'python_calamine',
+    ExcelEngines.XLSXWRITER: 'xlsxwriter',
+}
+
+
+@lru_cache(maxsize=None)
+def is_available(engine: str) -> bool:
+    """Whether the package of an engine is installed."""
+    return engine in ENGINE_MODULES and find_spec(ENGINE_MODULES[engine]) is not None
+
+
+def select_reader(file_size: int, configured: str = None) -> str:
+    """
+        Picks the engine reading a workbook.
+
+    :param file_size: Size of the uploaded file in bytes
+    :param configured: Engine to use, defaults to EXCEL_READER_ENGINE
+    """
+    return _select(configured or EXCEL_READER_ENGINE, ExcelEngines.CALAMINE, file_size)
+
+
+def select_writer(file_size: int, configured: str = None) -> str:
+    """
+        Picks the engine rewriting a workbook.
+
+    :param file_size: Size of the uploaded file in bytes, standing in for the size of the output
+    :param configured: Engine to use, defaults to EXCEL_WRITER_ENGINE
+    """
+    return _select(configured or EXCEL_WRITER_ENGINE, ExcelEngines.XLSXWRITER, file_size)
+
+
+def writer_options(engine: str) -> dict:
+    """Engine specific options of pd.ExcelWriter."""
+    if engine == ExcelEngines.XLSXWRITER:
+        # Dates of sheets copied cell by cell would otherwise be shown as serial numbers
+        return {"engine_kwargs": {"options": {"default_date_format": "yyyy-mm-dd hh:mm:ss"}}}
+    return {}
+
+
+def _select(configured: str, fast_engine: str, file_size: int) -> str:
+    if configured != ExcelEngines.AUTO:
+        if is_available(configured):
+            return configured
+        logger.warning(f"Excel engine '{configured}' is not installed, using openpyxl instead")
+        return ExcelEngines.OPENPYXL
+    if file_size >= EXCEL_FAST_ENGINE_MIN_SIZE and is_available(fast_engine):
+        return fast_engine
+    return ExcelEngines.OPENPYXL
+
+
+class EngineTimings:
+    """Calls and seconds spent per engine and operation, to compare the engines in production."""
+
+    def __init__(self):
+        self._timings: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, engine: str, operation: str, target: str = ''):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            logger.info(f"Excel {operation} of {target or 'workbook'} with {engine} took {elapsed:.3f}s")
+            with self._lock:
+                timing = self._timings.setdefault(f"{engine}.{operation}", {"calls": 0, "seconds": 0.0})
+                timing["calls"] += 1
+                timing["seconds"] += elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: dict(timing) for name, timing in self._timings.items()}
+
+
+engine_timings = EngineTimings()
@@ -0,0 +1,108 @@
+"""
+    Local extractive summarizer ranking the sentences of a column by TextRank over TF-IDF vectors
+"""
+import re
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from config import logger, SUMMARY_SENTENCES
+
+# words too common to tell sentences apart
+STOP_WORDS = {
+    'a', 'an', 'the', 'and', 'or', 'but', 'if', 'of', 'to', 'in', 'on', 'at', 'by', 'for', 'with', 'from', 'as',
+    'is', 'are', 'was', 'were', 'be', 'been', 'being', 'it', 'its', 'this', 'that', 'these', 'those', 'i', 'we',
+    'you', 'he', 'she', 'they', 'me', 'us', 'him', 'her', 'them', 'my', 'our', 'your', 'his', 'their', 'have', 'has',
+    'had', 'do', 'does', 'did', 'so', 'than', 'then', 'there', 'here', 'which', 'who', 'what', 'will', 'would',
+    'can', 'could', 'should', 'also', 'just', 'about', 'into', 'over', 'all', 'any', 'some', 'more', 'very',
+}
+
+# TextRank compares every pair of sentences; beyond this many, sentences are ranked by their similarity to the
+# centroid of the column instead, which is linear in the number of words
+TEXTRANK_MAX_SENTENCES = 2000
+DAMPING = 0.85
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-6
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+|\s*\n+\s*')
+_TOKEN_PATTERN = r"[a-z0-9]+(?:'[a-z]+)?"
+
+
+class ExtractiveSummarizer:
+    """
+        Summarizes a column locally, without calling the LLM, by picking its most central sentences. The sentences
+        of all the texts are vectorized into one sparse TF-IDF matrix, ranked with TextRank on their cosine
+        similarities and the best max_sentences are returned in their original order.
+    """
+
+    def __init__(self, max_sentences: int = SUMMARY_SENTENCES):
+        self.max_sentences = max_sentences
+
+    def summarize(self, data_list: list[str]) -> list[str]:
+        """
+            Summarizes the text from a list of strings.
+
+        :return: The summary as a single-item list, like Summarizer.summarize
+        """
+        sentences = self.split_sentences(data_list)
+        if len(sentences) > self.max_sentences:
+            matrix = self.__tfidf(sentences)
+            if len(sentences) <= TEXTRANK_MAX_SENTENCES:
+                scores = self.__textrank(matrix)
+            else:
+                scores = self.__centrality(matrix)
+            best = np.sort(np.argsort(-scores, kind='stable')[:self.max_sentences])
+            logger.info(f"Extractive summary of {len(best)} out of {len(sentences)} sentences")
+            sentences = [sentences[index] for index in best]
+        return [' '.join(sentences)]
+
+    @staticmethod
+    def split_sentences(data_list: list[str]) -> list[str]:
+        """Sentences of the texts, each kept once."""
+        sentences = (sentence.strip() for text in data_list for sentence in _SENTENCE_RE.split(str(text)))
+        return list(dict.fromkeys(sentence for sentence in sentences if sentence))
+
+    @staticmethod
+    def __tfidf(sentences: list[str]) -> sparse.csr_matrix:
+        """Sentences by terms, rows normalized to unit length so that their dot products are cosine similarities."""
+        words = pd.Series(sentences).str.casefold().str.findall(_TOKEN_PATTERN).explode().dropna()
+        words = words[~words.isin(STOP_WORDS)]
+        codes, vocabulary = pd.factorize(words)
+        counts = sparse.coo_matrix((np.ones(len(codes)), (words.index.to_numpy(), codes)),
+                                   shape=(len(sentences), len(vocabulary))).tocsr()
+        counts.sum_duplicates()
+
+        documents = np.bincount(counts.indices, minlength=len(vocabulary))
+        idf = np.log((1 + len(sentences)) / (1 + documents)) + 1
+        tfidf = counts.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms) @ tfidf
+
+    @staticmethod
+    def __textrank(matrix: sparse.csr_matrix) -> np.ndarray:
+        """PageRank over the graph of sentences weighted by their similarity."""
+        count = matrix.shape[0]
+        similarity = (matrix @ matrix.T).tocsr()
+        similarity = similarity - sparse.diags(similarity.diagonal())
+        similarity.eliminate_zeros()
+        out_weights = np.asarray(similarity.sum(axis=1)).ravel()
+        dangling = out_weights == 0
+        out_weights[dangling] = 1
+        transition = (sparse.diags(1 / out_weights) @ similarity).T.tocsr()
+
+        scores = np.full(count, 1 / count)
+        for _ in range(MAX_ITERATIONS):
+            # sentences sharing no word with any other spread their rank evenly
+            updated = (1 - DAMPING) / count + DAMPING * (transition @ scores + scores[dangling].sum() / count)
+            if np.abs(updated - scores).sum() < TOLERANCE:
+                return updated
+            scores = updated
+        return scores
+
+    @staticmethod
+    def __centrality(matrix: sparse.csr_matrix) -> np.ndarray:
+        """Cosine similarity of each sentence to the centroid of all of them."""
+        centroid = np.asarray(matrix.mean(axis=0)).ravel()
+        return matrix @ centroid
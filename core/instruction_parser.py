@@ -0,0 +1,235 @@
+"""
+    Deterministic parser for simple instructions, tried before the LLM
+"""
+import re
+import threading
+from difflib import SequenceMatcher
+from typing import Optional
+
+from config import logger
+from constants import Operations, SentimentBackends, SummaryBackends
+
+# phrases naming each operation, matched on whole words outside column and sheet names
+OPERATION_KEYWORDS = {
+    Operations.SUMMATION: ('sum', 'total', 'add up'),
+    Operations.SUBTRACTION: ('subtract', 'minus'),
+    Operations.MULTIPLICATION: ('multiply', 'product of'),
+    Operations.DIVISION: ('divide', 'ratio of'),
+    Operations.AVG: ('average', 'avg', 'mean'),
+    Operations.MIN: ('minimum', 'min', 'lowest', 'smallest'),
+    Operations.MAX: ('maximum', 'max', 'highest', 'largest'),
+    Operations.INNER_JOIN: ('inner join',),
+    Operations.LEFT_JOIN: ('left join',),
+    Operations.RIGHT_JOIN: ('right join',),
+    Operations.FULL_OUTER_JOIN: ('full outer join', 'outer join', 'full join'),
+    Operations.SENTIMENT_ANALYSIS: ('sentiment',),
+    Operations.SUMMARIZATION: ('summarize', 'summarise', 'summary of'),
+}
+
+# words an instruction may contain besides names and operation keywords. Any other word, e.g. a filter value,
+# means the instruction asks for more than the parser understands.
+FILLER_WORDS = {
+    'a', 'an', 'the', 'of', 'and', 'with', 'to', 'from', 'in', 'into', 'for', 'on', 'by', 'per', 'each', 'all',
+    'column', 'columns', 'sheet', 'sheets', 'tab', 'table', 'tables', 'data', 'values', 'value', 'rows', 'field',
+    'calculate', 'compute', 'find', 'get', 'give', 'show', 'me', 'what', 'is', 'are', 'please', 'do', 'perform',
+    'run', 'analysis', 'analyze', 'analyse', 'group', 'grouped', 'join', 'merge', 'text', 'using', 'between',
+}
+
+# words introducing the column a min, max or average is grouped by
+GROUP_BY_WORDS = {'by', 'per', 'each'}
+
+# words asking for the local backend of an NLP operation instead of the LLM
+LOCAL_BACKEND_WORDS = {
+    Operations.SENTIMENT_ANALYSIS: ({'fast', 'quick', 'offline', 'local', 'lexicon'}, SentimentBackends.LEXICON),
+    Operations.SUMMARIZATION: ({'fast', 'quick', 'offline', 'local', 'extractive'}, SummaryBackends.EXTRACTIVE),
+}
+
+# names shorter than this are matched exactly and with their case, so that column "A" is not read from the article
+SHORT_NAME_LENGTH = 3
+FUZZY_MATCH_RATIO = 0.85
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def _words(text: str) -> list[str]:
+    return _WORD_RE.findall(text)
+
+
+def find_mentions(words: list[str], excel_metadata: dict[str, list]) -> Optional[list[tuple]]:
+    """
+        Finds the sheet and column names among the words of an instruction. Of overlapping matches, the longest
+        name wins.
+
+    :return: Sorted (start, end, kind, name) tuples, kind being 'sheet' or 'column', or None when a name could be
+        both a sheet and a column
+    """
+    names = [('sheet', sheet) for sheet in excel_metadata]
+    names += [('column', column) for column in dict.fromkeys(column for columns in excel_metadata.values()
+                                                              for column in columns) if isinstance(column, str)]
+    folded = [word.casefold() for word in words]
+    candidates = []
+    for kind, name in names:
+        name_words = _words(name)
+        if not name_words:
+            continue
+        short = len(name) < SHORT_NAME_LENGTH
+        target = ' '.join(name_words if short else (word.casefold() for word in name_words))
+        for start in range(len(words) - len(name_words) + 1):
+            end = start + len(name_words)
+            window = ' '.join(words[start:end] if short else folded[start:end])
+            ratio = 1.0 if window == target else (
+                0.0 if short else SequenceMatcher(None, window, target).ratio())
+            if ratio >= FUZZY_MATCH_RATIO:
+                candidates.append((end - start, ratio, start, end, kind, name))
+
+    mentions = []
+    for _, _, start, end, kind, name in sorted(candidates, key=lambda c: (-c[0], -c[1], c[2])):
+        clashes = [mention for mention in mentions if start < mention[1] and mention[0] < end]
+        if any(mention[:2] == (start, end) and mention[2] != kind for mention in clashes):
+            return None
+        if not clashes:
+            mentions.append((start, end, kind, name))
+    return sorted(mentions)
+
+
+def candidate_sheets(instructions: str, excel_metadata: dict[str, list], limit: int) -> list[str]:
+    """
+        Sheets an instruction is likely to operate on: the sheets it names and those holding the columns it names,
+        or all sheets when it names neither. At most limit sheets are returned.
+    """
+    mentions = find_mentions(_words(instructions), excel_metadata) or []
+    names = {name for _, _, _, name in mentions}
+    sheets = [sheet for sheet, columns in excel_metadata.items()
+              if sheet in names or any(column in names for column in columns)]
+    return (sheets or list(excel_metadata))[:limit]
+
+
+class InstructionParser:
+    """
+        Parses instructions naming one operation and its columns or sheets, e.g. "average Salary by Department",
+        into the parameters the LLM would extract. Column and sheet names are matched against the workbook
+        metadata, allowing small typos. parse returns None whenever the instruction is ambiguous or contains
+        anything else, and the LLM is asked instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.fallbacks = 0
+
+    def parse(self, instructions: str, excel_metadata: dict[str, list]) -> Optional[dict]:
+        """
+        :param instructions: Instruction of the user
+        :param excel_metadata: Sheet names mapped to their column names
+        :return: Dict with the operation, columns, sheets and parameters, or None when not confident
+        """
+        params = self.__parse(instructions, excel_metadata)
+        with self._lock:
+            if params is None:
+                self.fallbacks += 1
+            else:
+                self.parsed += 1
+        logger.debug(f"Instruction parsed locally: {params}")
+        return params
+
+    def stats(self) -> dict:
+        with self._lock:
+            attempts = self.parsed + self.fallbacks
+            return {
+                "parsed": self.parsed,
+                "fallbacks": self.fallbacks,
+                "parsed_rate": self.parsed / attempts if attempts else 0.0,
+            }
+
+    def __parse(self, instructions: str, excel_metadata: dict[str, list]) -> Optional[dict]:
+        words = _words(instructions)
+        folded = [word.casefold() for word in words]
+        mentions = find_mentions(words, excel_metadata)
+        if mentions is None:
+            return None
+        covered = {index for start, end, _, _ in mentions for index in range(start, end)}
+        remaining = [word if index not in covered else None for index, word in enumerate(folded)]
+
+        operation = self.__find_operation(remaining)
+        if operation is None:
+            return None
+        allowed = FILLER_WORDS | {word for phrase in OPERATION_KEYWORDS[operation] for word in phrase.split()}
+        backend_words, backend = LOCAL_BACKEND_WORDS.get(operation, (set(), None))
+        allowed |= backend_words
+        if any(word is not None and word not in allowed for word in remaining):
+            return None
+
+        sheets = list(dict.fromkeys(name for _, _, kind, name in mentions if kind == 'sheet'))
+        columns = [(start, name) for start, _, kind, name in mentions if kind == 'column']
+        if operation in Operations.DF_JOIN_MAPPER:
+            return self.__join(operation, sheets, columns, folded, excel_metadata)
+        params = self.__sheet_operation(operation, sheets, columns, folded, excel_metadata)
+        if params is not None and backend_words.intersection(remaining):
+            params["parameters"]["backend"] = backend
+        return params
+
+    @staticmethod
+    def __find_operation(remaining: list[Optional[str]]) -> Optional[str]:
+        """The only operation whose keywords appear outside the names, None when there are none or several."""
+        text = ' '.join(word or '|' for word in remaining)
+        operations = [operation for operation, phrases in OPERATION_KEYWORDS.items()
+                      if any(re.search(rf'\b{phrase}\b', text) for phrase in phrases)]
+        return operations[0] if len(operations) == 1 else None
+
+    @staticmethod
+    def __join(operation: str, sheets: list[str], columns: list[tuple], folded: list[str],
+               excel_metadata: dict[str, list]) -> Optional[dict]:
+        if len(sheets) != 2:
+            return None
+        common = [column for column in excel_metadata[sheets[0]] if column in excel_metadata[sheets[1]]]
+        on_columns = [name for start, name in columns if start > 0 and folded[start - 1] == 'on'] or \
+            [name for _, name in columns]
+        if not on_columns and len(common) == 1:
+            on_columns = common
+        if len(set(on_columns)) != 1 or len(set(name for _, name in columns) - set(on_columns)) \
+                or on_columns[0] not in common:
+            return None
+        return {"operation": operation, "columns": on_columns[:1], "sheets": sheets,
+                "parameters": {"on": on_columns[0]}}
+
+    @staticmethod
+    def __sheet_operation(operation: str, sheets: list[str], columns: list[tuple], folded: list[str],
+                          excel_metadata: dict[str, list]) -> Optional[dict]:
+        preceding = {name: folded[start - 1] if start > 0 else None for start, name in reversed(columns)}
+        group_by = [name for name, word in preceding.items() if word in GROUP_BY_WORDS]
+        if operation == Operations.DIVISION:
+            # "divide Sales by Tax" names the divisor, not a group
+            group_by = [name for name in group_by if preceding[name] != 'by']
+        value_columns = [name for name in dict.fromkeys(name for _, name in columns) if name not in group_by]
+        parameters = {}
+        if operation in {Operations.AVG, Operations.MIN, Operations.MAX}:
+            if len(value_columns) != 1 or len(group_by) > 1:
+                return None
+            if group_by:
+                parameters["group_by"] = group_by[0]
+        elif operation in {Operations.SENTIMENT_ANALYSIS, Operations.SUMMARIZATION}:
+            if len(value_columns) != 1 or len(group_by) > 1:
+                return None
+            if group_by:
+                parameters["on"] = group_by[0]
+        elif group_by:
+            return None
+        elif operation in {Operations.SUBTRACTION, Operations.DIVISION}:
+            if len(value_columns) != 2:
+                return None
+            if preceding[value_columns[1]] == 'from':
+                # "subtract Tax from Sales"
+                value_columns.reverse()
+        elif len(value_columns) < (1 if operation == Operations.SUMMATION else 2):
+            return None
+
+        referenced = value_columns + group_by
+        if not sheets:
+            sheets = [sheet for sheet, sheet_columns in excel_metadata.items()
+                      if all(column in sheet_columns for column in referenced)]
+        if len(sheets) != 1 or not all(column in excel_metadata[sheets[0]] for column in referenced):
+            return None
+        return {"operation": operation, "columns": value_columns, "sheets": sheets, "parameters": parameters}
+
+
+instruction_parser = InstructionParser()
@@ -0,0 +1,176 @@
+"""
+    Process-wide Gemini client shared by the instruction parser and the NLP operations
+"""
+import asyncio
+import atexit
+import json
+import os
+import threading
+import weakref
+from typing import Any, Coroutine
+
+import aiohttp
+import google.generativeai as genai
+
+from config import logger, GEMINI_MODEL_NAME, LLM_HTTP_POOL_LIMIT, LLM_HTTP_POOL_LIMIT_PER_HOST, \
+    LLM_HTTP_KEEPALIVE_TIMEOUT, LLM_HTTP_DNS_CACHE_TTL
+from core.event_loop import EventLoopThread, event_loop
+from core.llm_scheduler import LLMScheduler, RetryableError, RETRYABLE_STATUSES, llm_scheduler
+from core.prompt_builder import estimate_tokens
+from custom_exceptions import LLMUnavailable
+
+API_BASE_URL = 'https://generativelanguage.googleapis.com/v1beta/models'
+
+
+class GeminiClient:
+    """
+        Configures the Gemini SDK once per process. genai.configure drops the clients the SDK built, so calling it
+        per request paid the connection and TLS setup on every instruction; configured once, the SDK keeps its
+        transport and its pooled connections for the life of the worker. The REST endpoint used by the NLP
+        operations is built once as well, with the API key sent as a header rather than in the logged URL.
+
+        The NLP operations call the endpoint through one pooled aiohttp session per event loop, so every chunk
+        of every operation run on a loop reuses the same keep-alive connections and cached DNS entries. The
+        operations run on the long-lived loop of event_loop, so its session serves every request of the worker.
+    """
+
+    def __init__(self, model_name: str = GEMINI_MODEL_NAME, pool_limit: int = LLM_HTTP_POOL_LIMIT,
+                 pool_limit_per_host: int = LLM_HTTP_POOL_LIMIT_PER_HOST,
+                 keepalive_timeout: float = LLM_HTTP_KEEPALIVE_TIMEOUT, dns_cache_ttl: int = LLM_HTTP_DNS_CACHE_TTL,
+                 scheduler: LLMScheduler = llm_scheduler, loop_thread: EventLoopThread = event_loop):
+        self.model_name = model_name
+        self.scheduler = scheduler
+        self.loop_thread = loop_thread
+        self.api_url = f"{API_BASE_URL}/{model_name}:generateContent"
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._configured = False
+        self._lock = threading.Lock()
+        self._sessions: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession] = \
+            weakref.WeakKeyDictionary()
+        self.sessions_opened = 0
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    @property
+    def api_key(self) -> str:
+        """Read when used rather than at import, so a key set after the module was imported is picked up."""
+        return os.environ.get('GEMINI_FLASH_API_KEY') or ''
+
+    @property
+    def headers(self) -> dict:
+        return {'Content-Type': 'application/json', 'x-goog-api-key': self.api_key}
+
+    def generate(self, system_instruction: str, message: str, generation_config: dict) -> str:
+        """
+            Sends one message to the model through the SDK.
+
+        :return: Text of the response
+        """
+        self.__configure()
+        model = genai.GenerativeModel(self.model_name, generation_config=generation_config,
+                                      system_instruction=system_instruction)
+        return model.generate_content(message).text
+
+    async def generate_content(self, payload: dict) -> dict:
+        """
+            Posts a request to the REST endpoint through the scheduler, which limits the calls in flight and their
+            rate and retries rate limited or failed calls.
+
+        :param payload: Body of the generateContent request
+        :return: Decoded JSON response
+        :raises LLMUnavailable: If the endpoint rejects the request, e.g. with an invalid key, or answers with a
+            body that is not JSON, so no chunk is silently left out of the result
+        """
+        async def post() -> dict:
+            async with self.session().post(self.api_url, json=payload) as response:
+                if response.status in RETRYABLE_STATUSES:
+                    retry_after = response.headers.get('Retry-After', '')
+                    raise RetryableError(f"HTTP {response.status}",
+                                         float(retry_after) if retry_after.isdigit() else None)
+                if response.status >= 300:
+                    logger.error(f"LLM call rejected with HTTP {response.status}: {(await response.text())[:500]}")
+                    raise LLMUnavailable(f"The language model rejected the request (HTTP {response.status}).")
+                try:
+                    return await response.json(content_type=None)
+                except ValueError as e:
+                    logger.error(f"Unreadable LLM response: {e!r}")
+                    raise LLMUnavailable()
+
+        tokens = estimate_tokens(json.dumps(payload.get("contents", []), ensure_ascii=False))
+        return await self.scheduler.run(post, tokens)
+
+    def session(self) -> aiohttp.ClientSession:
+        """
+            Pooled HTTP session for the REST endpoint, opened on the first call from the running event loop. A
+            session is bound to the loop it was opened on, so each loop gets its own.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_limit, limit_per_host=self.pool_limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout,
+                                             ttl_dns_cache=self.dns_cache_ttl, use_dns_cache=True)
+            session = aiohttp.ClientSession(headers=self.headers, connector=connector,
+                                            trace_configs=[self.__trace_config()])
+            self._sessions[loop] = session
+            with self._lock:
+                self.sessions_opened += 1
+        return session
+
+    async def close_session(self) -> None:
+        """Closes the session of the running event loop, if it opened one."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """
+            Runs a coroutine calling the REST endpoint on the long-lived event loop, blocking the calling thread
+            until it completes. The session of the loop stays open for the next requests.
+        """
+        return self.loop_thread.run(coroutine)
+
+    def close(self) -> None:
+        """Closes the session of the long-lived event loop, if it opened one."""
+        if self.loop_thread.running:
+            self.loop_thread.run(self.close_session())
+
+    def stats(self) -> dict:
+        with self._lock:
+            connections = self.connections_created + self.connections_reused
+            return {
+                "sessions_opened": self.sessions_opened,
+                "requests": self.requests,
+                "connections_created": self.connections_created,
+                "connections_reused": self.connections_reused,
+                "reuse_rate": self.connections_reused / connections if connections else 0.0,
+            }
+
+    def __trace_config(self) -> aiohttp.TraceConfig:
+        """Counts the requests sent and whether each got a new or a pooled connection."""
+        trace_config = aiohttp.TraceConfig()
+
+        def counter(name: str):
+            async def count(session, trace_config_ctx, params):
+                with self._lock:
+                    setattr(self, name, getattr(self, name) + 1)
+            return count
+
+        trace_config.on_request_start.append(counter('requests'))
+        trace_config.on_connection_create_end.append(counter('connections_created'))
+        trace_config.on_connection_reuseconn.append(counter('connections_reused'))
+        return trace_config
+
+    def __configure(self) -> None:
+        with self._lock:
+            if not self._configured:
+                genai.configure(api_key=self.api_key)
+                self._configured = True
+
+
+gemini_client = GeminiClient()
+atexit.register(gemini_client.close)
@@ -0,0 +1,151 @@
+"""
+    Concurrency limit, rate limit and retries of the LLM calls made by the NLP operations
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+
+from config import logger, LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_RETRIES, \
+    LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY
+from custom_exceptions import LLMUnavailable
+
+T = TypeVar('T')
+
+# statuses worth retrying: rate limited, overloaded or failing upstream
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """A call failed in a way that may succeed later, optionally after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+        Allows per_minute units a minute, in bursts of up to a minute's worth. Units are reserved in arrival order:
+        a reservation the bucket cannot cover yet puts it in debt, and the caller waits until the debt is refilled.
+        The bucket is not bound to an event loop, so every loop of the worker shares the same quota.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60
+        self._available = float(per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+            Takes amount units out of the bucket.
+
+        :return: Seconds to wait before using them
+        """
+        if self.per_minute <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.per_minute, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            # a single call larger than the bucket waits for a full bucket rather than forever
+            self._available -= min(amount, self.per_minute)
+            return max(0.0, -self._available / self.rate)
+
+    async def acquire(self, amount: float) -> float:
+        delay = self.reserve(amount)
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class LLMScheduler:
+    """
+        Runs LLM calls with at most max_concurrency in flight per event loop, within the requests and tokens per
+        minute of the quota, retrying calls raising RetryableError or a connection error after a jittered
+        exponential backoff. A call still failing after max_retries raises LLMUnavailable, so a chunk is never
+        silently dropped.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = LLM_TOKENS_PER_MINUTE, max_retries: int = LLM_MAX_RETRIES,
+                 base_delay: float = LLM_RETRY_BASE_DELAY, max_delay: float = LLM_RETRY_MAX_DELAY):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.throttled_seconds = 0.0
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """
+            Runs call, retrying it when it fails with a retryable error.
+
+        :param call: Coroutine function making one request
+        :param tokens: Estimated input tokens of the request
+        :return: Result of call
+        """
+        attempt = 0
+        while True:
+            async with self.__semaphore():
+                throttled = await self._requests.acquire(1) + await self._tokens.acquire(tokens)
+                self.__count(calls=1, in_flight=1, throttled_seconds=throttled)
+                try:
+                    return await call()
+                except (RetryableError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error = e
+                finally:
+                    self.__count(in_flight=-1)
+
+            if attempt >= self.max_retries:
+                self.__count(failures=1)
+                logger.error(f"LLM call failed after {attempt + 1} attempts: {error!r}")
+                raise LLMUnavailable()
+            delay = getattr(error, 'retry_after', None) or self.backoff(attempt)
+            attempt += 1
+            self.__count(retries=1)
+            logger.warning(f"LLM call failed ({error!r}), retry {attempt} of {self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def backoff(self, attempt: int) -> float:
+        """Random delay before the retry following attempt, full jitter keeping retried calls from bunching up."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "in_flight": self.in_flight,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+            }
+
+    def __semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def __count(self, **counts) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+
+llm_scheduler = LLMScheduler()
@@ -390,6 +390,14 @@ class MathOperationExecutor:
         }
         return operation_mapper[operation]
 
+    def _get_aggregation_method(self, operation):
+        aggregation_mapper = {
+            Operations.AVG: self.avg,
+            Operations.MIN: self._min,
+            Operations.MAX: self._max,
+        }
+        return aggregation_mapper[operation]
+
     @staticmethod
     def _get_value_key(operation):
         value_mapper = {
@@ -422,8 +430,9 @@ class MathOperationExecutor:
         if operation == Operations.DATE_DIFFERENCE:
             return self.date_difference(df, metadata.get('columns')[0], metadata.get('columns')[1],
                                         metadata.get('parameters', {}).get('unit'))
-        if operation == {Operations.AVG, Operations.MIN, Operations.MAX}:
-            return self.avg(df, columns, metadata.get('parameters', {}).get('group_by'))
+        if operation in {Operations.AVG, Operations.MIN, Operations.MAX}:
+            method = self._get_aggregation_method(operation)
+            return method(df, columns, metadata.get('parameters', {}).get('group_by'))
 
         if operation not in Operations.ALL_MATH_OPERATIONS:
             raise InvalidOperation(message=f"Unknown operation: {operation}", error_code=ErrorCodes.INVALID_OPERATION)
@@ -1,33 +1,131 @@
 import asyncio
 import json
-import os
-from typing import Any
+import re
+from collections import Counter
 
-import aiohttp
+import numpy as np
 import pandas as pd
 
-from config import logger
-from constants import Operations
-from custom_exceptions import EmptyColumnException
+from config import logger, NLP_CHUNK_TOKEN_BUDGET, NLP_MAX_OUTPUT_TOKENS, NLP_CHUNK_MAX_ROWS, SENTIMENT_BACKEND, \
+    SENTIMENT_LEXICON_FALLBACK, SUMMARY_BACKEND, SUMMARY_REDUCE_FAN_IN
+from constants import Operations, SentimentBackends, SummaryBackends, ErrorCodes
+from core.event_loop import offload
+from core.extractive_summarizer import ExtractiveSummarizer
+from core.llm_client import GeminiClient, gemini_client
+from core.prompt_builder import CHARS_PER_TOKEN, estimate_tokens
+from core.sentiment_cache import SentimentCache, normalize_text, sentiment_cache
+from core.sentiment_lexicon import LexiconClassifier
+from custom_exceptions import EmptyColumnException, InvalidParameters, LLMUnavailable, InvalidColumn
+
+_LAST_WHITESPACE_RE = re.compile(r'.*\s', re.DOTALL)
+
+
+def split_text(text: str, max_tokens: int) -> list[str]:
+    """Splits text, at whitespace where possible, into pieces of at most max_tokens estimated tokens."""
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    pieces = []
+    while len(text) > max_chars:
+        head = _LAST_WHITESPACE_RE.match(text, 0, max_chars + 1)
+        cut = head.end() if head and head.group().strip() else max_chars
+        pieces.append(text[:cut].strip())
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
 
 
 class BaseNLModel:
-    def __init__(self, gemini_model_name: str = "gemini-2.0-flash", chunk_size: int = 20):
-        self._api_key = os.environ.get('GEMINI_FLASH_API_KEY')
-        self._model_name = gemini_model_name
+    """
+        Sends items of a column to the LLM in chunks. Chunks are packed with as many items as fit the input token
+        budget and, for models answering per item, the output token limit, so short texts share few requests and
+        responses are not cut off. A text too long for one request is split into pieces sent as separate items.
+    """
+
+    # tokens framing each item of a request, e.g. its index
+    ITEM_TOKENS = 8
+
+    def __init__(self, client: GeminiClient = gemini_client, chunk_size: int = NLP_CHUNK_MAX_ROWS,
+                 token_budget: int = NLP_CHUNK_TOKEN_BUDGET, max_output_tokens: int = NLP_MAX_OUTPUT_TOKENS):
+        self._client = client
         self.chunk_size = chunk_size
-        self._api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self._model_name}:generateContent?key={self._api_key}"
+        self.token_budget = token_budget
+        self.max_output_tokens = max_output_tokens
 
-    def chunk_data(self, data_list):
-        """Splits the data list into smaller chunks."""
-        return [data_list[i:i + self.chunk_size] for i in range(0, len(data_list), self.chunk_size)]
+    def text_of(self, item) -> str:
+        return item
 
+    def with_text(self, item, text: str):
+        """The item with its text replaced by a piece of it."""
+        return text
+
+    def output_tokens(self, text: str) -> int:
+        """Tokens the response spends on an item, 0 when the response does not grow with the items."""
+        return 0
+
+    @property
+    def max_text_tokens(self) -> int:
+        """Largest text an item may carry to fit in a request on its own."""
+        return self.token_budget - self.ITEM_TOKENS
+
+    def split_item(self, item) -> list:
+        text = self.text_of(item)
+        if not isinstance(text, str) or estimate_tokens(text) <= self.max_text_tokens:
+            return [item]
+        return [self.with_text(item, piece) for piece in split_text(text, self.max_text_tokens)]
+
+    def chunk_data(self, data_list, max_items: int = None):
+        """
+            Packs consecutive items into chunks within the row, input token and output token limits.
+
+        :param max_items: Items a chunk may hold, chunk_size when None
+        """
+        max_items = max_items or self.chunk_size
+        chunks, chunk, input_tokens, output_tokens = [], [], 0, 0
+        for item in data_list:
+            for piece in self.split_item(item):
+                text = str(self.text_of(piece))
+                piece_input, piece_output = estimate_tokens(text) + self.ITEM_TOKENS, self.output_tokens(text)
+                if chunk and (len(chunk) >= max_items or input_tokens + piece_input > self.token_budget
+                              or output_tokens + piece_output > self.max_output_tokens):
+                    chunks.append(chunk)
+                    chunk, input_tokens, output_tokens = [], 0, 0
+                chunk.append(piece)
+                input_tokens += piece_input
+                output_tokens += piece_output
+        if chunk:
+            chunks.append(chunk)
+        logger.debug(f"{len(data_list)} items packed into {len(chunks)} chunks")
+        return chunks
 
-class Summarizer(BaseNLModel):
     @staticmethod
-    def __format_payload(chunk: list[str]) -> dict:
+    async def gather(coroutines) -> list:
+        """
+            Runs the chunk calls concurrently, the client's scheduler pacing them. Once all of them are done, the
+            first failure is raised rather than leaving its chunk out of the result.
+        """
+        responses = await asyncio.gather(*coroutines, return_exceptions=True)
+        for response in responses:
+            if isinstance(response, BaseException):
+                raise response
+        return responses
+
+
+class Summarizer(BaseNLModel):
+    """
+        Summarizes a column as a map-reduce tree: the rows are summarized in chunks, then the partial summaries
+        are merged fan_in at a time, level after level, until a single summary is left. The calls of a level are
+        made concurrently, so a column takes a number of round trips logarithmic in its size, and a column
+        fitting in one chunk takes a single call.
+    """
+
+    def __init__(self, *args, fan_in: int = SUMMARY_REDUCE_FAN_IN, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fan_in = max(2, fan_in)
+
+    def __format_payload(self, chunk: list[str], merge: bool = False) -> dict:
         """Formats the payload for the LLM API call."""
-        system_content = {"text": "Summarize following content"}
+        system_content = {"text": "Combine the following partial summaries into one summary" if merge
+                          else "Summarize following content"}
         content_parts = [{"text": text} for text in chunk]
         return {
             "contents": [{
@@ -35,168 +133,369 @@ class Summarizer(BaseNLModel):
             }],
             "generationConfig": {
                 "temperature": 0.0,
-                "maxOutputTokens": 7192, # Optimize this later.
+                "maxOutputTokens": self.max_output_tokens,
             }
         }
 
-    async def __call_llm_api(self, chunk):
+    async def __call_llm_api(self, chunk, merge: bool = False):
         """Calls the LLM API with a chunk of text data."""
-        headers = {
-            'Content-Type': 'application/json',
-        }
-        payload = self.__format_payload(chunk)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self._api_url, headers=headers, json=payload) as response:
-                result = await response.json()
-                for candidate in result.get("candidates", []):
-                    for part in candidate.get("content", {}).get("parts", []):
-                        return part["text"]
-
-    async def __process_chunks(self, chunks):
+        payload = self.__format_payload(chunk, merge)
+        result = await self._client.generate_content(payload)
+        for candidate in result.get("candidates", []):
+            for part in candidate.get("content", {}).get("parts", []):
+                return part["text"]
+
+    async def __process_chunks(self, chunks, merge: bool = False):
         """Processes each chunk of data and gathers responses."""
-        tasks = [asyncio.create_task(self.__call_llm_api(chunk)) for chunk in chunks]
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
+        responses = await self.gather(self.__call_llm_api(chunk, merge) for chunk in chunks)
         return [response for response in responses if response]
 
-    async def __summarize_chunks(self, data_list: list[str]) -> list[str]:
-        """Summarizes the text from a list of strings in chunks."""
-        chunks = self.chunk_data(data_list)
-        summaries = await self.__process_chunks(chunks)
+    async def summarize_async(self, data_list: list[str]) -> list[str]:
+        """Summarizes the text from a list of strings, reducing the chunk summaries until one is left."""
+        summaries = await self.__process_chunks(await offload(self.chunk_data, data_list))
+        level = 0
+        while len(summaries) > 1:
+            groups = self.chunk_data(summaries, self.fan_in)
+            if len(groups) >= len(summaries):
+                # summaries too long to pair within the token budget are merged fan_in at a time regardless
+                groups = [summaries[i:i + self.fan_in] for i in range(0, len(summaries), self.fan_in)]
+            level += 1
+            logger.info(f"Summarization level {level}: merging {len(summaries)} summaries in {len(groups)} calls")
+            summaries = await self.__process_chunks(groups, merge=True)
         return summaries
 
-    async def __summarize(self, data_list: list[str]) -> list[str]:
-        """Summarizes the text from a list of strings."""
-        initial_summaries = await self.__summarize_chunks(data_list)
-        # can comment this out if you want to see the full summaries
-        final_summary = await self.__summarize_chunks(initial_summaries)
-        return final_summary
-
     def summarize(self, data_list: list[str]) -> list[str]:
         """Summarizes the text from a list of strings."""
-        return asyncio.run(self.__summarize(data_list))
+        return self._client.run(self.summarize_async(data_list))
 
 
-class TextClassifier(BaseNLModel):
-    def __chunk_data(self, data_list):
-        """Splits the data list into smaller chunks."""
-        return [data_list[i:i + self.chunk_size] for i in range(0, len(data_list), self.chunk_size)]
+class GroupSummarizer(BaseNLModel):
+    """
+        Summarizes the texts of many groups, e.g. the reviews of each product. Groups small enough are packed
+        together, several to a request, the model answering with one summary per group; larger groups are
+        summarized on their own by the Summarizer tree. All the requests are made concurrently.
+    """
+
+    # output tokens kept for the summary of each group of a packed request
+    SUMMARY_TOKENS = 256
+
+    def __init__(self, summarizer: Summarizer, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._summarizer = summarizer
+
+    def text_of(self, item: tuple[int, str]) -> str:
+        return item[1]
+
+    def with_text(self, item: tuple[int, str], text: str) -> tuple[int, str]:
+        return item[0], text
+
+    def output_tokens(self, text: str) -> int:
+        return self.SUMMARY_TOKENS
+
+    def __format_payload(self, chunk: list[tuple[int, str]]) -> dict:
+        """Formats the payload for the LLM API call."""
+        system_content = {"text": "Each of the following parts is a group of texts, starting with \"Group <number>:\". "
+                                  "Summarize each group separately and respond with a JSON object mapping each group "
+                                  "number to the summary of its texts, e.g. {\"0\": \"summary\"}."}
+        return {
+            "contents": [{
+                "parts": [system_content] + [{"text": f"Group {group}:\n{text}"} for group, text in chunk]
+            }],
+            "generationConfig": {
+                "temperature": 0.0,
+                "maxOutputTokens": self.max_output_tokens,
+                "responseMimeType": "application/json",
+            }
+        }
 
     @staticmethod
-    def __format_payload(chunk: list[str]) -> dict:
+    def __format_response(response: dict) -> dict[int, str]:
+        """Summaries of the response keyed by group, leaving out malformed entries."""
+        json_text = response.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', "")
+        json_text = json_text.strip().removeprefix("```json").removesuffix("```")
+        try:
+            summaries = json.loads(json_text) if json_text else {}
+        except json.JSONDecodeError as e:
+            logger.info(f"Error decoding JSON: {e}")
+            return {}
+        if not isinstance(summaries, dict):
+            return {}
+        return {int(group): summary for group, summary in summaries.items()
+                if str(group).isdigit() and isinstance(summary, str) and summary}
+
+    async def __summarize_packed(self, chunk: list[tuple[int, str]]) -> dict[int, str]:
+        response = await self._client.generate_content(self.__format_payload(chunk))
+        return self.__format_response(response)
+
+    async def __summarize_alone(self, group: int, texts: list[str]) -> dict[int, str]:
+        summaries = await self._summarizer.summarize_async(texts)
+        return {group: summaries[0]} if summaries else {}
+
+    def __pack(self, groups: list[list[str]]) -> tuple[list[tuple[int, str]], list[int], list]:
+        """:return: The groups fitting in a request with their joined texts, the other groups and the chunks"""
+        joined = ['\n'.join(str(text) for text in texts) for texts in groups]
+        fits = [estimate_tokens(text) <= self.max_text_tokens for text in joined]
+        small = [(group, text) for group, text in enumerate(joined) if fits[group]]
+        large = [group for group in range(len(groups)) if not fits[group]]
+        return small, large, self.chunk_data(small)
+
+    async def __summarize_groups(self, groups: list[list[str]]) -> dict[int, str]:
+        small, large, chunks = await offload(self.__pack, groups)
+        logger.info(f"Summarizing {len(groups)} groups: {len(small)} packed in {len(chunks)} requests, "
+                    f"{len(large)} on their own")
+        responses = await self.gather([self.__summarize_packed(chunk) for chunk in chunks] +
+                                      [self.__summarize_alone(group, groups[group]) for group in large])
+        summaries = {group: summary for response in responses for group, summary in response.items()
+                     if group < len(groups)}
+
+        # groups the model skipped in a packed answer are asked again, each on its own
+        skipped = [group for group, _ in small if group not in summaries]
+        if skipped:
+            logger.warning(f"{len(skipped)} groups missing from packed summaries, summarizing them again")
+            for response in await self.gather(self.__summarize_alone(group, groups[group]) for group in skipped):
+                summaries.update(response)
+        return summaries
+
+    def summarize_groups(self, groups: list[list[str]]) -> list[str]:
+        """
+            Summarizes the texts of each group.
+
+        :return: The summary of each group, in the order of groups, None for a group the model did not summarize
+        """
+        summaries = self._client.run(self.__summarize_groups(groups))
+        return [summaries.get(group) for group in range(len(groups))]
+
+
+class TextClassifier(BaseNLModel):
+    SENTIMENTS = ('Positive', 'Negative', 'Neutral')
+    # tokens of the "<index>":"<sentiment>", entry the response holds per text
+    RESPONSE_ITEM_TOKENS = 8
+
+    def text_of(self, item: tuple[int, str]) -> str:
+        return item[1]
+
+    def with_text(self, item: tuple[int, str], text: str) -> tuple[int, str]:
+        return item[0], text
+
+    def output_tokens(self, text: str) -> int:
+        return self.RESPONSE_ITEM_TOKENS
+
+    def __format_payload(self, chunk: list[tuple[int, str]]) -> dict:
         """Formats the payload for the LLM API call."""
-        system_content = {"text": "Perform sentiment analysis on each provided text separately and return the result in JSON format. Each input will be structured as \"<index>: <number> <text>: <input>\". Extract the index and text, then respond with a JSON array where each object includes the original index, text, and a 'sentiment' field with values 'Positive', 'Negative', or 'Neutral'."}
+        system_content = {"text": "Perform sentiment analysis on each provided text separately. Each input is "
+                                  "structured as \"<index>: <text>\". Respond with a JSON object mapping each index "
+                                  "to its sentiment, one of 'Positive', 'Negative' or 'Neutral', e.g. "
+                                  "{\"0\": \"Positive\", \"1\": \"Neutral\"}. Do not repeat the texts."}
         return {
             "contents": [
                 {
                     "role": "user",
-                    "parts": [system_content] + [{"text": json.dumps(f"<index>: {index} <text>: {text}")} for index, text in chunk]
+                    "parts": [system_content] + [{"text": f"{index}: {text}"} for index, text in chunk]
                 }
             ],
             "generationConfig": {
                 "temperature": 0.0,
-                "maxOutputTokens": 7192, # Optimize this later.
+                "maxOutputTokens": self.max_output_tokens,
+                "responseMimeType": "application/json",
             }
         }
 
-    @staticmethod
-    def __format_response(response: dict) -> list[str]:
-        """Formats the response from the API call."""
-        data_list = []
+    def __format_response(self, response: dict) -> dict[int, str]:
+        """Sentiments of the response keyed by index, leaving out malformed entries."""
         json_text = response.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', "")
-        if json_text:
-            json_text = json_text.replace("```json\n", "").replace("\n```", "")
-        else:
-            return data_list
+        json_text = json_text.strip().removeprefix("```json").removesuffix("```")
         try:
-            data_list = json.loads(json_text)
+            sentiments = json.loads(json_text) if json_text else {}
         except json.JSONDecodeError as e:
             logger.info(f"Error decoding JSON: {e}")
-        return data_list
+            return {}
+        if isinstance(sentiments, list):
+            # an array of {"index", "sentiment"} objects, as the model sometimes answers
+            sentiments = {item.get('index'): item.get('sentiment') for item in sentiments if isinstance(item, dict)}
+        if not isinstance(sentiments, dict):
+            return {}
+        return {int(index): sentiment for index, sentiment in sentiments.items()
+                if str(index).isdigit() and sentiment in self.SENTIMENTS}
+
+    async def __fetch_sentiments(self, chunk: list[tuple[int, str]]) -> dict[int, str]:
+        """Classifies the texts of one chunk."""
+        payload = self.__format_payload(chunk)
+        response = await self._client.generate_content(payload)
+        return self.__format_response(response)
 
-    async def __fetch_sentiments(self, chunks: list[str]) -> list[str]:
-        """Summarizes the text from a list of strings in chunks."""
-        payload = self.__format_payload(chunks)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self._api_url, json=payload, headers={"Content-Type": "application/json"}) as response:
-                response = await response.json()
-                return self.__format_response(response)
+    def __pack(self, data_list: list[tuple[int, str]]) -> tuple[list[tuple[int, str]], list]:
+        """:return: The pieces of the texts and the chunks packing them, each piece under its position"""
+        pieces = [piece for item in data_list for piece in self.split_item(item)]
+        return pieces, self.chunk_data([(position, text) for position, (_, text) in enumerate(pieces)])
 
-    async def __process_chunks(self, chunks):
-        """Processes each chunk of data and gathers responses."""
-        results = []
-        tasks = [asyncio.create_task(self.__fetch_sentiments(chunk)) for chunk in chunks]
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
+    async def __classify(self, data_list: list[tuple[int, str]]) -> dict[int, str]:
+        """
+            Classifies the texts in chunks. Every piece of a split text is sent under an index of its own; a text
+            gets the sentiment most of its pieces got, or Neutral on a tie.
+        """
+        pieces, chunks = await offload(self.__pack, data_list)
+        responses = await self.gather(self.__fetch_sentiments(chunk) for chunk in chunks)
 
+        sentiments: dict[int, Counter] = {}
         for response in responses:
-            if response:
-                results.extend(response)
-        return results
-
-    async def __classify(self, data_list: list[tuple[int, str]]) -> list[dict[str, Any]]:
-        """Classifies the text from a list of strings in chunks."""
-        chunks = self.chunk_data(data_list)
-        result = await self.__process_chunks(chunks)
+            for position, sentiment in response.items():
+                if position < len(pieces):
+                    sentiments.setdefault(pieces[position][0], Counter())[sentiment] += 1
+        result = {}
+        for index, counts in sentiments.items():
+            ranked = counts.most_common(2)
+            result[index] = 'Neutral' if len(ranked) > 1 and ranked[0][1] == ranked[1][1] else ranked[0][0]
         return result
 
-    def classify(self, data_list: list[tuple[int, str]]) -> list[dict[str, Any]]:
-        """Classifies the text from a list of strings."""
-        responses = asyncio.run(self.__classify(data_list))
-        return responses
+    def classify(self, data_list: list[tuple[int, str]]) -> dict[int, str]:
+        """
+            Classifies the text from a list of (index, text) tuples.
+
+        :return: Sentiments keyed by the index of their text, leaving out the texts the model did not classify
+        """
+        return self._client.run(self.__classify(data_list))
 
 
 class NLPTaskExecutor:
 
-    def __init__(self):
+    def __init__(self, sentiment_labels: SentimentCache = sentiment_cache):
         self._summarizer = Summarizer()
+        self._group_summarizer = GroupSummarizer(self._summarizer)
+        self._extractive_summarizer = ExtractiveSummarizer()
         self._text_classifier = TextClassifier()
+        self._lexicon_classifier = LexiconClassifier()
+        self._sentiment_cache = sentiment_labels
 
-    def sentiment_analysis(self, df: pd.DataFrame, column: str) -> pd.DataFrame:
+    def sentiment_analysis(self, df: pd.DataFrame, column: str, backend: str = None, on: str = None) -> pd.DataFrame:
         """
-            Sentiment analysis on column.
+            Sentiment analysis on column. Each distinct text, ignoring case and whitespace, is classified once and
+            its label given to every row holding it. With the LLM backend, labels cached by earlier requests are
+            reused; the lexicon backend labels every text locally.
+
+        :param backend: One of SentimentBackends, SENTIMENT_BACKEND when None
+        :param on: Column to group the rows by. The result then holds one row per group, with the number of texts
+            of each sentiment and the most frequent sentiment
         """
-        data_list = list(df[column].items())
-        if not data_list:
+        if on is not None:
+            self.__check_group_column(df, on)
+        backend = backend or SENTIMENT_BACKEND
+        if backend not in SentimentBackends.ALL:
+            raise InvalidParameters(f"Unknown sentiment backend '{backend}'. "
+                                    f"Use one of {', '.join(SentimentBackends.ALL)}.")
+        if df[column].empty:
             raise EmptyColumnException(column_name=column)
-        responses = self._text_classifier.classify(data_list)
+        texts = df[column].map(normalize_text)
+        keys = texts.str.casefold()
+        # the first spelling of each distinct text is the one classified, in the order pd.factorize numbers them
+        unique_texts = texts[keys.notna() & ~keys.duplicated()].tolist()
 
-        sentiment_dict = {}
-        logger.debug(f"Responses: {responses}")
-        for response in responses:
-            _index = response.get('index')
-            text = response.get('text')
-            sentiment = response.get('sentiment')
-            if text and sentiment and _index is not None:
-                sentiment_dict[(text, _index)] = sentiment
+        if backend == SentimentBackends.LEXICON:
+            labels = self.__classify_with_lexicon(unique_texts)
+        else:
+            labels = self._sentiment_cache.get_many(unique_texts)
+            missing = [text for text in unique_texts if text not in labels]
+            logger.info(f"Sentiment of {len(texts)} rows: {len(unique_texts)} distinct texts, "
+                        f"{len(missing)} not cached")
+            if missing:
+                labels.update(self.__classify_with_llm(missing))
+
+        # each row takes the label of its distinct text by position, rows without text the trailing Unclassified
+        codes, _ = pd.factorize(keys)
+        sentiments = np.array([labels.get(text, "Unclassified") for text in unique_texts] + ["Unclassified"],
+                              dtype=object)
+        df[f'Classified_{column}'] = sentiments[codes]
+        if on is not None:
+            return self.__sentiment_per_group(df, column, on)
+        return df
+
+    @staticmethod
+    def __sentiment_per_group(df: pd.DataFrame, column: str, on: str) -> pd.DataFrame:
+        """
+            One row per group, in order of first appearance, even for groups without any classified text. A group
+            takes its most frequent sentiment, Neutral on a tie as for the pieces of a text, or Unclassified.
+        """
+        labels = df.loc[df[f'Classified_{column}'] != "Unclassified", [on, f'Classified_{column}']]
+        counts = pd.crosstab(labels[on], labels[f'Classified_{column}'])
+        counts = counts.reindex(index=pd.Index(df[on].dropna().unique(), name=on),
+                                columns=list(TextClassifier.SENTIMENTS), fill_value=0)
+        most = counts.max(axis=1)
+        tied = counts.eq(most, axis=0).sum(axis=1) > 1
+        counts[f'Classified_{column}'] = np.select([most == 0, tied], ["Unclassified", "Neutral"],
+                                                   default=counts.idxmax(axis=1))
+        counts.columns.name = None
+        return counts.reset_index()
 
-        def select_value(index_value: int, row_val):
-            key = (row_val, str(index_value))
-            return sentiment_dict.get(key, "Unclassified")
+    @staticmethod
+    def __check_group_column(df: pd.DataFrame, on: str) -> None:
+        if on not in df.columns:
+            raise InvalidColumn(message=f"Column '{on}' does not exist in DataFrame.",
+                                error_code=ErrorCodes.INVALID_COLUMN)
 
-        df[f'Classified_{column}'] = df.apply(lambda row: select_value(row.name, row[column]), axis=1)
-        return df
+    def __classify_with_llm(self, texts: list[str]) -> dict[str, str]:
+        """Labels of the texts the LLM classified, cached for later requests, or lexicon labels on failure."""
+        try:
+            responses = self._text_classifier.classify(list(enumerate(texts)))
+        except LLMUnavailable:
+            if not SENTIMENT_LEXICON_FALLBACK:
+                raise
+            logger.warning(f"LLM unavailable, {len(texts)} texts labelled by the lexicon instead")
+            return self.__classify_with_lexicon(texts)
+        logger.debug(f"Responses: {responses}")
+        classified = {texts[index]: sentiment for index, sentiment in responses.items()}
+        self._sentiment_cache.put_many(classified)
+        return classified
 
-    def summarization(self, df: pd.DataFrame, column: str, on: str = None) -> pd.DataFrame:
+    def __classify_with_lexicon(self, texts: list[str]) -> dict[str, str]:
+        return dict(zip(texts, self._lexicon_classifier.classify_texts(pd.Series(texts, dtype=object))))
+
+    def summarization(self, df: pd.DataFrame, column: str, on: str = None, backend: str = None) -> pd.DataFrame:
         """
             Summarize the sentence from the given column. Add result in a separate column.
+
+        :param on: Column to group the rows by. The result then holds one row per group with its summary
+        :param backend: One of SummaryBackends, SUMMARY_BACKEND when None
         """
+        backend = backend or SUMMARY_BACKEND
+        if backend not in SummaryBackends.ALL:
+            raise InvalidParameters(f"Unknown summarization backend '{backend}'. "
+                                    f"Use one of {', '.join(SummaryBackends.ALL)}.")
         if column not in df.columns:
             raise EmptyColumnException(column_name=column)
+        if on is not None:
+            return self.__summarize_per_group(df, column, on, backend)
 
         data_list = df[column].dropna().tolist()
 
         if not data_list:
             raise EmptyColumnException(column_name=column)
 
-        summary = self._summarizer.summarize(data_list)
+        summarizer = self._extractive_summarizer if backend == SummaryBackends.EXTRACTIVE else self._summarizer
+        summary = summarizer.summarize(data_list)
         df[f'Summarized_{column}'] = pd.Series(summary[:len(data_list)]).reindex(df.index)
         return df
 
+    def __summarize_per_group(self, df: pd.DataFrame, column: str, on: str, backend: str) -> pd.DataFrame:
+        self.__check_group_column(df, on)
+        if on == column:
+            raise InvalidParameters(f"Cannot summarize '{column}' per group of itself. Group by another column.")
+        groups = df[[on, column]].dropna().groupby(on, sort=False)[column].agg(list)
+        if groups.empty:
+            raise EmptyColumnException(column_name=column)
+        if backend == SummaryBackends.EXTRACTIVE:
+            summaries = [self._extractive_summarizer.summarize(texts)[0] for texts in groups]
+        else:
+            summaries = self._group_summarizer.summarize_groups(groups.tolist())
+        return pd.DataFrame({on: groups.index, f'Summarized_{column}': summaries})
+
     def execute(self, df: pd.DataFrame, metadata: dict) -> pd.DataFrame:
         """
             Method to execute the NLP operations
         """
         operations = metadata.get('operation')
+        parameters = metadata.get('parameters') or {}
+        # the column grouping the rows, which the LLM may also extract as group_by
+        on = parameters.get('on') or parameters.get('group_by')
         if operations == Operations.SUMMARIZATION:
-            return self.summarization(df, metadata.get('columns')[0])
+            return self.summarization(df, metadata.get('columns')[0], on=on, backend=parameters.get('backend'))
         elif operations == Operations.SENTIMENT_ANALYSIS:
-            return self.sentiment_analysis(df, metadata.get('columns')[0])
+            return self.sentiment_analysis(df, metadata.get('columns')[0], parameters.get('backend'), on=on)
@@ -0,0 +1,118 @@
+"""
+    Cache of the operation parameters extracted from instructions
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import logger, PARAMS_CACHE_MAX_ENTRIES, PARAMS_CACHE_TTL, PARAMS_CACHE_PATH
+from core.sqlite_store import SQLiteStore
+
+
+class ParamsCache:
+    """
+        Maps an instruction and the schema of the workbook it runs against to the parameters the LLM extracted,
+        so a repeated instruction skips the LLM. Entries expire ttl seconds after they were stored and the least
+        recently used are evicted beyond max_entries. With a path, entries are also kept in a SQLite database
+        shared by the workers and surviving restarts.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = SQLiteStore(path, 'params_cache', max_entries, 'parameters') if path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(instructions: str, excel_metadata) -> str:
+        """
+            Hashes the instruction, with whitespace collapsed, and the schema. Case is kept, as values quoted in
+            instructions may be case-sensitive.
+        """
+        instruction = ' '.join(instructions.split())
+        schema = json.dumps(excel_metadata, sort_keys=True, default=str)
+        return hashlib.sha256(f'{instruction}\0{schema}'.encode()).hexdigest()
+
+    def get(self, instructions: str, excel_metadata) -> Optional[dict]:
+        """Returns a copy of the cached parameters, or None when they are missing or expired."""
+        key = self.key_for(instructions, excel_metadata)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            elif self._db is not None:
+                entry = self.__read(key)
+                if entry is not None:
+                    self.disk_hits += 1
+                    self.__store_in_memory(key, entry)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                self.__remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, instructions: str, excel_metadata, params: dict) -> None:
+        key = self.key_for(instructions, excel_metadata)
+        entry = (time.time(), copy.deepcopy(params))
+        with self._lock:
+            self.__store_in_memory(key, entry)
+            if self._db is not None:
+                self.__write(key, entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
+
+    def __store_in_memory(self, key: str, entry: tuple[float, dict]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.delete([key])
+
+    # Disk backend
+
+    def __read(self, key: str) -> Optional[tuple[float, dict]]:
+        stored = self._db.read([key]).get(key)
+        if stored is None:
+            return None
+        try:
+            return stored[0], json.loads(stored[1])
+        except ValueError as e:
+            logger.warning(f"Dropping unreadable cached parameters: {e}")
+            self._db.delete([key])
+            return None
+
+    def __write(self, key: str, entry: tuple[float, dict]) -> None:
+        created, params = entry
+        self.evictions += self._db.write({key: json.dumps(params)}, created,
+                                         expired_before=time.time() - self.ttl)
+
+
+params_cache = ParamsCache(PARAMS_CACHE_MAX_ENTRIES, PARAMS_CACHE_TTL, PARAMS_CACHE_PATH)
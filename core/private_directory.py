@@ -0,0 +1,19 @@
+"""
+    Directories holding uploaded data on local disk, closed to the other users of the machine
+"""
+import os
+import stat
+
+
+def make_private_directory(path: str) -> None:
+    """
+        Creates a directory readable and writable by the current user only, or checks that an existing one is, so
+        another local user cannot pre-create it to read or swap the files written there.
+
+    :raises OSError: If the directory cannot be created, or exists but is not a directory owned by the current user
+        and closed to group and others
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    status = os.lstat(path)
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o077:
+        raise PermissionError(f"{path} is not a directory private to this user")
@@ -0,0 +1,116 @@
+"""
+    Builds the parameter extraction prompt within a token budget
+"""
+import json
+import math
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Optional
+
+from config import logger, PROMPT_TOKEN_BUDGET
+from system_prompt import EXCEL_PARAM_EXTRACTION_PROMPT
+
+# Gemini tokens average about four characters of English text, close enough to budget a prompt
+CHARS_PER_TOKEN = 4
+
+# short dtype names shown next to the columns
+DTYPE_HINTS = {'int64': 'int', 'float64': 'float', 'object': 'text', 'bool': 'bool', 'datetime64[ns]': 'date'}
+
+# words of a column name at least this similar to a word of the instruction make the column relevant
+RELEVANT_WORD_RATIO = 0.8
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def build_extraction_prompt(instructions: str, excel_metadata: dict[str, list], schema: Optional[dict] = None,
+                            token_budget: int = PROMPT_TOKEN_BUDGET) -> tuple[str, int]:
+    """
+        Fills EXCEL_PARAM_EXTRACTION_PROMPT with a compact JSON rendering of the workbook. Each sheet maps its
+        columns to a dtype hint when the schema is known. When the whole workbook does not fit in the token budget,
+        the columns sharing the most words with the instruction are kept and the others are counted in a note.
+
+    :param instructions: Instruction of the user
+    :param excel_metadata: Sheet names mapped to their column names
+    :param schema: Sheet names mapped to their column names, dtypes and row counts, see Workbook.schema
+    :param token_budget: Estimated number of tokens the prompt should not exceed
+    :return: The prompt and its estimated number of tokens
+    """
+    sheets = {sheet: _column_hints(columns, (schema or {}).get(sheet)) for sheet, columns in excel_metadata.items()}
+    base_tokens = estimate_tokens(EXCEL_PARAM_EXTRACTION_PROMPT.format(excel_metadata='', user_query=instructions))
+    rendered, omitted = _render(sheets), 0
+    if base_tokens + estimate_tokens(rendered) > token_budget:
+        rendered, omitted = _render_relevant(sheets, instructions, (token_budget - base_tokens) * CHARS_PER_TOKEN)
+
+    prompt = EXCEL_PARAM_EXTRACTION_PROMPT.format(excel_metadata=rendered, user_query=instructions)
+    tokens = estimate_tokens(prompt)
+    logger.info(f"Parameter extraction prompt of ~{tokens} tokens, "
+                f"{omitted} of {sum(len(columns) for columns in sheets.values())} columns left out")
+    logger.debug(f"system_prompt: {prompt}")
+    return prompt, tokens
+
+
+def _column_hints(columns: list, sheet_schema: Optional[dict]) -> dict[str, Optional[str]]:
+    hints = {}
+    if sheet_schema is not None and list(sheet_schema.get("columns", [])) == list(columns):
+        hints = {column: DTYPE_HINTS.get(dtype, dtype) for column, dtype in zip(columns, sheet_schema["dtypes"])}
+    return {str(column): hints.get(column) for column in columns}
+
+
+def _render(sheets: dict[str, dict], omitted: dict[str, int] = None) -> str:
+    """Sheets as JSON, each a list of its columns or, with dtype hints, an object of columns and hints."""
+    compact = {sheet: columns if any(columns.values()) else list(columns) for sheet, columns in sheets.items()}
+    rendered = json.dumps(compact, ensure_ascii=False, separators=(',', ':'))
+    notes = [f'{count} less relevant columns of "{sheet}" are not shown.'
+             for sheet, count in (omitted or {}).items() if count]
+    return '\n'.join([rendered] + notes)
+
+
+@lru_cache(maxsize=65536)
+def _similar(name_word: str, word: str) -> bool:
+    """Wide sheets repeat the same words across their column names, so comparisons are memoized."""
+    matcher = SequenceMatcher(None, name_word, word)
+    return matcher.quick_ratio() >= RELEVANT_WORD_RATIO and matcher.ratio() >= RELEVANT_WORD_RATIO
+
+
+def _relevance(name: str, words: set[str]) -> float:
+    """Share of the words of a name found, allowing typos, in the instruction."""
+    name_words = {word.casefold() for word in _WORD_RE.findall(name)}
+    if not name_words or not words:
+        return 0.0
+    matched = sum(1 for name_word in name_words
+                  if name_word in words or any(_similar(name_word, word) for word in words))
+    return matched / len(name_words)
+
+
+def _render_relevant(sheets: dict[str, dict], instructions: str, char_budget: int) -> tuple[str, int]:
+    """
+        Keeps the most relevant columns, in their sheet order, while the rendering fits in char_budget.
+
+    :return: The rendering and the number of columns left out
+    """
+    words = {word.casefold() for word in _WORD_RE.findall(instructions)}
+    sheet_relevance = {sheet: _relevance(sheet, words) for sheet in sheets}
+    ranked = sorted(((-(_relevance(column, words) + sheet_relevance[sheet]), sheet_index, index, sheet, column)
+                     for sheet_index, (sheet, columns) in enumerate(sheets.items())
+                     for index, column in enumerate(columns)),
+                    key=lambda item: item[:3])
+
+    selected = {sheet: set() for sheet in sheets}
+    # sheet names and the omission notes are always shown
+    used = len(_render({sheet: {} for sheet in sheets}, {sheet: len(columns) for sheet, columns in sheets.items()}))
+    for _, _, _, sheet, column in ranked:
+        cost = len(json.dumps(column, ensure_ascii=False)) + len(json.dumps(sheets[sheet][column])) + 2
+        if used + cost > char_budget:
+            break
+        selected[sheet].add(column)
+        used += cost
+
+    kept = {sheet: {column: hint for column, hint in columns.items() if column in selected[sheet]}
+            for sheet, columns in sheets.items()}
+    omitted = {sheet: len(sheets[sheet]) - len(kept[sheet]) for sheet in sheets}
+    return _render(kept, omitted), sum(omitted.values())
@@ -0,0 +1,94 @@
+"""
+    Cache of the sentiment labels given to texts
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from config import GEMINI_MODEL_NAME, SENTIMENT_CACHE_MAX_ENTRIES, SENTIMENT_CACHE_PATH
+from core.sqlite_store import SQLiteStore
+
+
+def normalize_text(value) -> Optional[str]:
+    """The text of a cell with whitespace collapsed, None for empty cells."""
+    if not isinstance(value, str) and pd.isna(value):
+        return None
+    text = ' '.join(str(value).split())
+    return text or None
+
+
+class SentimentCache:
+    """
+        Maps a hash of a normalized text to the sentiment label the model gave it, so a text classified once, in
+        this request or an earlier one, is not sent again. Texts differing only in case or whitespace share a
+        label. The least recently used labels are evicted beyond max_entries. With a path, labels are also kept
+        in a SQLite database shared by the workers and surviving restarts.
+    """
+
+    def __init__(self, max_entries: int, path: str = None, model_name: str = GEMINI_MODEL_NAME):
+        self.max_entries = max_entries
+        self.path = path
+        self.model_name = model_name
+        self._labels: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = SQLiteStore(path, 'sentiment_cache', max_entries, 'sentiments') if path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_for(self, text: str) -> str:
+        """Hashes the text, case folded, with the model name, as another model may label it differently."""
+        return hashlib.sha256(f'{self.model_name}\0{text.casefold()}'.encode()).hexdigest()
+
+    def get_many(self, texts: Iterable[str]) -> dict[str, str]:
+        """Returns the cached labels of the texts, leaving out the texts not cached."""
+        keys = {text: self.key_for(text) for text in texts}
+        with self._lock:
+            labels = {text: self._labels[key] for text, key in keys.items() if key in self._labels}
+            for text in labels:
+                self._labels.move_to_end(keys[text])
+            if self._db is not None and len(labels) < len(keys):
+                stored = {key: label for key, (_, label) in
+                          self._db.read([key for text, key in keys.items() if text not in labels]).items()}
+                for text, key in keys.items():
+                    if key in stored:
+                        labels[text] = stored[key]
+                        self.__store_in_memory(key, stored[key])
+                self.disk_hits += len(stored)
+            self.hits += len(labels)
+            self.misses += len(keys) - len(labels)
+        return labels
+
+    def put_many(self, labels: dict[str, str]) -> None:
+        entries = {self.key_for(text): label for text, label in labels.items()}
+        with self._lock:
+            for key, label in entries.items():
+                self.__store_in_memory(key, label)
+            if self._db is not None:
+                self.evictions += self._db.write(entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._labels),
+            }
+
+    def __store_in_memory(self, key: str, label: str) -> None:
+        self._labels[key] = label
+        self._labels.move_to_end(key)
+        while len(self._labels) > self.max_entries:
+            self._labels.popitem(last=False)
+            self.evictions += 1
+
+
+sentiment_cache = SentimentCache(SENTIMENT_CACHE_MAX_ENTRIES, SENTIMENT_CACHE_PATH)
@@ -0,0 +1,99 @@
+"""
+    Offline sentiment classifier scoring texts with a word lexicon and negation rules
+"""
+import numpy as np
+import pandas as pd
+
+# words and their polarity, 2 for the strongest
+POSITIVE_WORDS = {
+    **dict.fromkeys([
+        'good', 'nice', 'fine', 'happy', 'glad', 'like', 'liked', 'likes', 'enjoy', 'enjoyed', 'enjoyable', 'pleased',
+        'helpful', 'useful', 'easy', 'fast', 'quick', 'quickly', 'friendly', 'polite', 'kind', 'clean', 'comfortable',
+        'reliable', 'recommend', 'recommended', 'satisfied', 'satisfying', 'smooth', 'works', 'worked', 'working',
+        'worth', 'value', 'affordable', 'cheap', 'well', 'better', 'improved', 'improvement', 'pleasant', 'positive',
+        'correct', 'accurate', 'responsive', 'professional', 'efficient', 'convenient', 'valuable', 'thanks',
+        'thank', 'grateful', 'appreciate', 'appreciated', 'beautiful', 'cool', 'fun', 'interesting', 'solid',
+        'stable', 'secure', 'safe', 'support', 'supportive', 'impressed', 'impressive', 'win', 'success',
+        'successful', 'resolved', 'fixed', 'ok', 'okay', 'decent', 'fair', 'calm', 'tasty', 'fresh', 'intuitive',
+    ], 1),
+    **dict.fromkeys([
+        'great', 'excellent', 'amazing', 'awesome', 'fantastic', 'wonderful', 'love', 'loved', 'loves', 'lovely',
+        'perfect', 'best', 'outstanding', 'superb', 'brilliant', 'delighted', 'delightful', 'exceptional',
+        'incredible', 'terrific', 'favorite', 'favourite', 'flawless', 'magnificent', 'marvelous', 'thrilled',
+    ], 2),
+}
+NEGATIVE_WORDS = {
+    **dict.fromkeys([
+        'bad', 'poor', 'slow', 'late', 'delay', 'delayed', 'problem', 'problems', 'issue', 'issues', 'bug', 'bugs',
+        'broken', 'break', 'breaks', 'error', 'errors', 'fail', 'failed', 'fails', 'failure', 'crash', 'crashes',
+        'crashed', 'wrong', 'difficult', 'hard', 'confusing', 'confused', 'expensive', 'overpriced', 'dirty', 'rude',
+        'unhelpful', 'useless', 'unreliable', 'annoying', 'annoyed', 'angry', 'upset', 'sad', 'unhappy',
+        'disappointed', 'disappointing', 'dislike', 'disliked', 'complaint', 'complain', 'complained', 'missing',
+        'lost', 'damaged', 'defective', 'faulty', 'noisy', 'uncomfortable', 'negative', 'lack', 'lacking', 'lacks',
+        'waste', 'wasted', 'refund', 'cancel', 'cancelled', 'canceled', 'unfortunately', 'mediocre', 'meh',
+        'worse', 'frustrating', 'frustrated', 'inconvenient', 'inaccurate', 'unstable', 'unsafe', 'cold', 'stale',
+        'bland', 'boring', 'weak', 'ugly', 'hate', 'hated', 'hates',
+    ], 1),
+    **dict.fromkeys([
+        'terrible', 'horrible', 'awful', 'worst', 'disgusting', 'dreadful', 'pathetic', 'abysmal', 'atrocious',
+        'unacceptable', 'scam', 'fraud', 'furious', 'appalling', 'nightmare', 'garbage', 'trash', 'rubbish',
+    ], 2),
+}
+LEXICON = {**{word: float(weight) for word, weight in POSITIVE_WORDS.items()},
+           **{word: -float(weight) for word, weight in NEGATIVE_WORDS.items()}}
+
+# words flipping the polarity of the words following them
+NEGATIONS = {
+    'not', 'no', 'never', 'none', 'nothing', 'nobody', 'neither', 'nor', 'without', 'hardly', 'barely', 'cannot',
+    "don't", "doesn't", "didn't", "isn't", "aren't", "wasn't", "weren't", "won't", "wouldn't", "can't", "couldn't",
+    "shouldn't", "haven't", "hasn't", "hadn't", 'dont', 'doesnt', 'didnt', 'isnt', 'arent', 'wasnt', 'werent',
+    'wont', 'cant', 'couldnt', 'shouldnt', 'havent', 'hasnt',
+}
+# words strengthening the word following them
+INTENSIFIERS = {'very', 'really', 'extremely', 'so', 'too', 'super', 'totally', 'absolutely', 'incredibly', 'highly'}
+
+# a negation flips the polarity of this many following words
+NEGATION_WINDOW = 3
+# a negated word keeps part of its strength: "not bad" is milder than "good"
+NEGATION_FACTOR = -0.75
+INTENSIFIER_FACTOR = 1.5
+# texts scoring at least this far from zero are Positive or Negative, the others Neutral
+LABEL_THRESHOLD = 0.5
+
+_TOKEN_PATTERN = r"[a-z]+(?:'[a-z]+)?"
+
+
+class LexiconClassifier:
+    """
+        Labels texts Positive, Negative or Neutral from the polarity of their words, without calling the LLM. All
+        texts are tokenized and scored at once: the words of a column are exploded into one long Series, mapped
+        to their polarity, adjusted for the negations and intensifiers preceding them in the same text and summed
+        back per text. Coarse next to the LLM, but fast enough for millions of rows and usable without network.
+    """
+
+    def classify_texts(self, texts: pd.Series) -> pd.Series:
+        """
+        :param texts: Texts to label
+        :return: Labels aligned with texts, Neutral for texts without any known word
+        """
+        positions = pd.Series(texts.to_numpy(), dtype=object).fillna('').astype(str)
+        words = positions.str.casefold().str.findall(_TOKEN_PATTERN).explode().dropna()
+        owners = words.index.to_numpy()
+        # the lexicon is looked up once per distinct word, then spread over the words by their codes
+        codes, vocabulary = pd.factorize(words)
+        scores = np.array([LEXICON.get(word, 0.0) for word in vocabulary], dtype=float)[codes]
+        is_negation = np.array([word in NEGATIONS for word in vocabulary], dtype=bool)[codes]
+        is_intensifier = np.array([word in INTENSIFIERS for word in vocabulary], dtype=bool)[codes]
+        negated = np.zeros(len(words), dtype=bool)
+        for distance in range(1, NEGATION_WINDOW + 1):
+            negated[distance:] |= is_negation[:-distance] & (owners[distance:] == owners[:-distance])
+        intensified = np.zeros(len(words), dtype=bool)
+        intensified[1:] = is_intensifier[:-1] & (owners[1:] == owners[:-1])
+
+        scores = np.where(intensified, scores * INTENSIFIER_FACTOR, scores)
+        scores = np.where(negated, scores * NEGATION_FACTOR, scores)
+        totals = np.bincount(owners, weights=scores, minlength=len(positions)) if len(owners) \
+            else np.zeros(len(positions))
+        labels = np.select([totals >= LABEL_THRESHOLD, totals <= -LABEL_THRESHOLD], ['Positive', 'Negative'],
+                           default='Neutral')
+        return pd.Series(labels, index=texts.index, dtype=object)
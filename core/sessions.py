@@ -0,0 +1,153 @@
+"""
+    Server-side workbook sessions: upload a workbook once, run many instructions against it
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from config import logger, SESSION_IDLE_TIMEOUT, SESSION_MEMORY_BUDGET, SESSION_DIR
+from core.private_directory import make_private_directory
+from core.workbook import Workbook
+from core.workbook_cache import WorkbookCache
+from custom_exceptions import SessionsUnavailable, WorkbookNotFound
+
+
+class WorkbookSession:
+    """An uploaded workbook kept on local disk, with its parsed sheets held in memory."""
+
+    def __init__(self, workbook_id: str, path: str):
+        self.workbook_id = workbook_id
+        self.path = path
+        # Evictions are decided by the session store, not by the cache itself
+        self.cache = WorkbookCache(memory_budget=float('inf'))
+        self.last_access = time.monotonic()
+
+    @property
+    def memory_usage(self) -> int:
+        return self.cache.stats()["memory_bytes"]
+
+    def open_workbook(self) -> Workbook:
+        """
+            Opens the workbook for one instruction. Sheets parsed by earlier instructions are served from memory,
+            as copies, so instructions never see each other's changes.
+
+        :raises WorkbookNotFound: If the session was evicted or deleted meanwhile
+        """
+        self.last_access = time.monotonic()
+        try:
+            file_stream = open(self.path, 'rb')
+        except FileNotFoundError:
+            raise WorkbookNotFound()
+        return Workbook(file_stream, cache=self.cache, cache_key=self.workbook_id)
+
+    def close(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class WorkbookSessionStore:
+    """
+        Holds the workbook sessions of this worker. A session expires once it has been idle for idle_timeout
+        seconds, and the least recently used sessions are evicted first while the sheets held by all sessions
+        take more than memory_budget bytes.
+    """
+
+    def __init__(self, idle_timeout: int, memory_budget: int, directory: str):
+        self.idle_timeout = idle_timeout
+        self.memory_budget = memory_budget
+        self.directory = directory
+        self._sessions: dict[str, WorkbookSession] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def create(self, file_stream) -> tuple[WorkbookSession, dict[str, list[str]]]:
+        """
+            Stores an uploaded workbook and parses all its sheets.
+
+        :param file_stream: Uploaded file stream
+        :return: The new session and the sheet names mapped to their column names
+        :raises SessionsUnavailable: If the session directory is not private to the user running the app
+        """
+        try:
+            make_private_directory(self.directory)
+        except OSError as e:
+            logger.error(f"Refusing to store workbook sessions: {e}")
+            raise SessionsUnavailable()
+        workbook_id = uuid.uuid4().hex
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.xlsx', delete=False) as stored_file:
+            file_stream.seek(0)
+            shutil.copyfileobj(file_stream, stored_file)
+        session = WorkbookSession(workbook_id, stored_file.name)
+
+        workbook = session.open_workbook()
+        try:
+            metadata = workbook.metadata
+            for sheet_name in workbook.sheet_names:
+                workbook.get_sheet(sheet_name)
+        except Exception:
+            session.close()
+            raise
+        finally:
+            workbook.close()
+
+        with self._lock:
+            self._sessions[workbook_id] = session
+            self.__evict(keep=workbook_id)
+        logger.info(f"Created workbook session {workbook_id} holding {session.memory_usage} bytes")
+        return session, metadata
+
+    def get(self, workbook_id: str) -> WorkbookSession:
+        with self._lock:
+            self.__evict_idle()
+            session = self._sessions.get(workbook_id)
+            if session is None:
+                raise WorkbookNotFound()
+            session.last_access = time.monotonic()
+            return session
+
+    def reap(self) -> None:
+        """Drops the sessions idle for longer than idle_timeout, without waiting for the next session request."""
+        with self._lock:
+            self.__evict_idle()
+
+    def delete(self, workbook_id: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(workbook_id, None)
+        if session is None:
+            raise WorkbookNotFound()
+        session.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "memory_bytes": sum(session.memory_usage for session in self._sessions.values()),
+                "evictions": self.evictions,
+            }
+
+    def __evict_idle(self) -> None:
+        now = time.monotonic()
+        for workbook_id in [workbook_id for workbook_id, session in self._sessions.items()
+                            if now - session.last_access > self.idle_timeout]:
+            self.__remove(workbook_id)
+
+    def __evict(self, keep: str) -> None:
+        """Drops idle sessions, then the least recently used ones other than keep while over the memory budget."""
+        self.__evict_idle()
+        memory_usage = sum(session.memory_usage for session in self._sessions.values())
+        for _, workbook_id in sorted((session.last_access, workbook_id)
+                                     for workbook_id, session in self._sessions.items() if workbook_id != keep):
+            if memory_usage <= self.memory_budget:
+                break
+            memory_usage -= self._sessions[workbook_id].memory_usage
+            self.__remove(workbook_id)
+
+    def __remove(self, workbook_id: str) -> None:
+        self._sessions.pop(workbook_id).close()
+        self.evictions += 1
+        logger.info(f"Evicted workbook session {workbook_id}")
+
+workbook_sessions = WorkbookSessionStore(SESSION_IDLE_TIMEOUT, SESSION_MEMORY_BUDGET, SESSION_DIR)
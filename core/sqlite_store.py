@@ -0,0 +1,110 @@
+"""
+    SQLite table backing the caches shared by the workers
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+from config import logger
+
+# keys looked up in one SQLite statement, below the default limit of bound parameters
+SQLITE_BATCH_SIZE = 500
+
+
+class SQLiteStore:
+    """
+        Text values keyed by a string in a table of a SQLite database, keeping the max_entries most recently used.
+        The database may be shared by the workers and locked or damaged at any time: every failure is logged and
+        the store behaves as if the entries were missing, so a cache never fails the request using it.
+    """
+
+    def __init__(self, path: str, table: str, max_entries: int, description: str):
+        """
+        :param path: Path of the database file
+        :param table: Table of the entries, created if missing
+        :param max_entries: Entries kept, the least recently used are deleted beyond
+        :param description: What the entries are, e.g. "parameters", for the logs
+        """
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.description = description
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            with self._db:
+                self._db.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                                 '(key TEXT PRIMARY KEY, value TEXT, created REAL, last_access REAL)')
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Unable to open the {description} cache database {path}, keeping it in memory: {e}")
+            self._db = None
+
+    def read(self, keys: list[str]) -> dict[str, tuple[float, str]]:
+        """
+            Returns the stored entries of keys, marking them as used.
+
+        :return: Keys found mapped to the time their entry was stored and its value
+        """
+        if self._db is None or not keys:
+            return {}
+        stored = {}
+        try:
+            with self._lock, self._db:
+                for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+                    batch = keys[start:start + SQLITE_BATCH_SIZE]
+                    placeholders = ','.join('?' * len(batch))
+                    rows = self._db.execute(f'SELECT key, created, value FROM {self.table} '
+                                            f'WHERE key IN ({placeholders})', batch).fetchall()
+                    stored.update((key, (created, value)) for key, created, value in rows)
+                    self._db.execute(f'UPDATE {self.table} SET last_access = ? WHERE key IN ({placeholders})',
+                                     [time.time()] + batch)
+        except sqlite3.Error as e:
+            logger.warning(f"Unable to read cached {self.description}: {e}")
+            return {}
+        return stored
+
+    def write(self, entries: dict[str, str], created: float = None, expired_before: float = None) -> int:
+        """
+            Stores entries, then deletes the entries stored before expired_before and the least recently used
+            beyond max_entries.
+
+        :param created: Time the entries were stored, now when None
+        :return: Number of entries deleted
+        """
+        if self._db is None or not entries:
+            return 0
+        created = created if created is not None else time.time()
+        try:
+            with self._lock, self._db:
+                self._db.executemany(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)',
+                                     [(key, value, created, created) for key, value in entries.items()])
+                deleted = 0
+                if expired_before is not None:
+                    deleted += self._db.execute(f'DELETE FROM {self.table} WHERE created < ?',
+                                                (expired_before,)).rowcount
+                deleted += self._db.execute(f'DELETE FROM {self.table} WHERE key NOT IN '
+                                            f'(SELECT key FROM {self.table} ORDER BY last_access DESC LIMIT ?)',
+                                            (self.max_entries,)).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Unable to store {self.description} in the cache: {e}")
+            return 0
+        return deleted
+
+    def delete(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if self._db is None or not keys:
+            return
+        try:
+            with self._lock, self._db:
+                for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+                    batch = keys[start:start + SQLITE_BATCH_SIZE]
+                    self._db.execute(f'DELETE FROM {self.table} WHERE key IN ({",".join("?" * len(batch))})',
+                                     batch)
+        except sqlite3.Error as e:
+            logger.warning(f"Unable to delete cached {self.description}: {e}")
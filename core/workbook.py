@@ -0,0 +1,221 @@
+"""
+    Parsed workbook shared between metadata extraction and the engine
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+from zipfile import BadZipFile
+
+import pandas as pd
+
+from config import logger, PREFETCH_WORKERS
+from constants import ErrorCodes, ExcelEngines
+from core.excel_engines import select_reader, engine_timings
+from core.workbook_cache import WorkbookCache
+from core.xlsx_scanner import XlsxSchemaScanner
+from custom_exceptions import InvalidFile
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='workbook-prefetch')
+
+
+class Workbook:
+    """
+        Parses an uploaded Excel file once and serves both its schema and its sheets.
+        With a cache, a workbook uploaded before is served from it without opening the file with openpyxl.
+    """
+
+    def __init__(self, file_stream, cache: Optional[WorkbookCache] = None, cache_key: str = None):
+        self.file_stream = file_stream
+        # Held by anything seeking or reading the uploaded file, as sheets may be parsed in the background
+        self.stream_lock = threading.RLock()
+        self._cache = cache
+        self._cache_key = cache_key or (cache.key_for(file_stream) if cache is not None else None)
+        self._excel_files: dict[str, pd.ExcelFile] = {}
+        self._reader_engine = None
+        self._scanner = None
+        self._scanner_unavailable = False
+        self._sheets: dict[str, pd.DataFrame] = {}
+        self._columns: dict[str, list[str]] = {}
+        self._schemas: dict[str, dict] = {}
+        self._prefetches: dict[str, Future] = {}
+
+        manifest = cache.get_manifest(self._cache_key) if cache is not None else None
+        if manifest is not None:
+            self._sheet_names, self._columns = manifest
+            logger.debug(f"Workbook {self._cache_key} served from cache")
+        else:
+            self._sheet_names = self.scanner.sheet_names if self.scanner is not None else self.excel_file.sheet_names
+            if cache is not None:
+                cache.put_manifest(self._cache_key, self._sheet_names, {})
+
+    @property
+    def excel_file(self) -> pd.ExcelFile:
+        """The uploaded file opened with openpyxl, on first use only."""
+        with self.stream_lock:
+            if ExcelEngines.OPENPYXL not in self._excel_files:
+                try:
+                    self._excel_files[ExcelEngines.OPENPYXL] = pd.ExcelFile(self.file_stream,
+                                                                            engine=ExcelEngines.OPENPYXL)
+                except (BadZipFile, ValueError, KeyError) as e:
+                    logger.info(f"Unable to open uploaded workbook: {e}")
+                    raise InvalidFile(error_code=ErrorCodes.INVALID_FILE)
+            return self._excel_files[ExcelEngines.OPENPYXL]
+
+    @property
+    def size(self) -> int:
+        """Size of the uploaded file in bytes."""
+        with self.stream_lock:
+            position = self.file_stream.tell()
+            self.file_stream.seek(0, 2)
+            size = self.file_stream.tell()
+            self.file_stream.seek(position)
+            return size
+
+    @property
+    def reader_engine(self) -> str:
+        """Engine parsing the sheets, picked by file size on first use."""
+        if self._reader_engine is None:
+            self._reader_engine = select_reader(self.size)
+        return self._reader_engine
+
+    def __reader(self) -> pd.ExcelFile:
+        """The uploaded file opened with the reader engine, falling back to openpyxl when that engine cannot read it."""
+        engine = self.reader_engine
+        if engine != ExcelEngines.OPENPYXL and engine not in self._excel_files:
+            try:
+                self._excel_files[engine] = pd.ExcelFile(self.file_stream, engine=engine)
+            except Exception as e:
+                # The fast engines raise their own exception types for files they cannot read
+                logger.info(f"Unable to open uploaded workbook with {engine}, falling back to openpyxl: {e}")
+                self._reader_engine = engine = ExcelEngines.OPENPYXL
+        return self._excel_files[engine] if engine != ExcelEngines.OPENPYXL else self.excel_file
+
+    def __read_excel(self, sheet_name: str, **kwargs) -> pd.DataFrame:
+        with self.stream_lock:
+            reader = self.__reader()
+            with engine_timings.timed(self.reader_engine, 'read', f"sheet '{sheet_name}'"):
+                return pd.read_excel(reader, sheet_name=sheet_name, **kwargs)
+
+    @property
+    def scanner(self) -> Optional[XlsxSchemaScanner]:
+        """Streaming schema scanner of the uploaded file, None for files it cannot read."""
+        with self.stream_lock:
+            if self._scanner is None and not self._scanner_unavailable:
+                try:
+                    self._scanner = XlsxSchemaScanner(self.file_stream)
+                except ValueError as e:
+                    logger.info(f"Falling back to openpyxl for the workbook schema: {e}")
+                    self._scanner_unavailable = True
+            return self._scanner
+
+    @property
+    def sheet_names(self) -> list[str]:
+        return self._sheet_names
+
+    def get_sheet(self, sheet_name: str, columns: Optional[list] = None) -> pd.DataFrame:
+        """
+            Returns the parsed sheet, parsing it on first access only, or waiting for its prefetch.
+
+        :param sheet_name: Name of the sheet
+        :param columns: Columns to read. Unless the whole sheet is already parsed, only these columns are read,
+            and the resulting frame is not kept, so a later full read still parses every column.
+        """
+        self.__join_prefetch(sheet_name)
+        if sheet_name not in self._sheets:
+            if columns is not None:
+                return self.__get_projection(sheet_name, columns)
+            self.__load_sheet(sheet_name)
+        df = self._sheets[sheet_name]
+        return df[columns] if columns is not None else df
+
+    def prefetch(self, sheet_names: list[str]) -> None:
+        """
+            Starts parsing sheets in background threads, e.g. while the LLM extracts the parameters.
+            get_sheet waits for a sheet being prefetched instead of parsing it again.
+        """
+        for sheet_name in sheet_names:
+            if sheet_name in self._sheet_names and sheet_name not in self._sheets \
+                    and sheet_name not in self._prefetches:
+                self._prefetches[sheet_name] = _prefetch_executor.submit(self.__load_sheet, sheet_name)
+                logger.debug(f"Prefetching sheet '{sheet_name}'")
+
+    def __join_prefetch(self, sheet_name: str) -> None:
+        future = self._prefetches.pop(sheet_name, None)
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            # Parsed again in the calling thread, which raises the error to the request
+            logger.info(f"Prefetch of sheet '{sheet_name}' failed: {e!r}")
+
+    def __load_sheet(self, sheet_name: str) -> None:
+        df = self._cache.get_sheet(self._cache_key, sheet_name) if self._cache is not None else None
+        if df is None:
+            df = self.__read_excel(sheet_name)
+            logger.debug(f"Parsed sheet '{sheet_name}'")
+            if self._cache is not None:
+                self._cache.put_sheet(self._cache_key, sheet_name, df)
+        self._sheets[sheet_name] = df
+
+    def __get_projection(self, sheet_name: str, columns: list) -> pd.DataFrame:
+        df = self._cache.get_sheet(self._cache_key, sheet_name, columns) if self._cache is not None else None
+        if df is None:
+            df = self.__read_excel(sheet_name, usecols=columns)
+            logger.debug(f"Parsed columns {columns} of sheet '{sheet_name}'")
+        return df
+
+    def get_schema(self, sheet_name: str) -> dict:
+        """
+            Returns the column names, inferred dtypes and data row count of a sheet. Only the header and first rows
+            are read, streamed from the xlsx XML when possible.
+        """
+        if sheet_name not in self._schemas:
+            schema = None
+            if self.scanner is not None:
+                try:
+                    with self.stream_lock:
+                        schema = self.scanner.scan(sheet_name)
+                except ValueError as e:
+                    logger.info(f"Falling back to openpyxl for the schema of sheet '{sheet_name}': {e}")
+            if schema is None:
+                df = self.__read_excel(sheet_name, nrows=XlsxSchemaScanner.SAMPLE_ROWS)
+                schema = {"columns": list(df.columns), "dtypes": [str(dtype) for dtype in df.dtypes], "rows": None}
+            self._schemas[sheet_name] = schema
+        return self._schemas[sheet_name]
+
+    def get_columns(self, sheet_name: str) -> list[str]:
+        """Returns the column names of a sheet, reading only its header row unless it is already parsed."""
+        if sheet_name in self._sheets:
+            return list(self._sheets[sheet_name].columns)
+        if sheet_name not in self._columns:
+            self._columns[sheet_name] = list(self.get_schema(sheet_name)["columns"])
+            if self._cache is not None:
+                self._cache.put_manifest(self._cache_key, self._sheet_names, {sheet_name: self._columns[sheet_name]})
+        return self._columns[sheet_name]
+
+    def iter_rows(self, sheet_name: str):
+        """Streams the raw cell values of a sheet row by row without building a DataFrame."""
+        with self.stream_lock:
+            yield from self.excel_file.book[sheet_name].iter_rows(values_only=True)
+
+    def close(self) -> None:
+        """Releases the uploaded file, dropping the prefetches not started yet."""
+        for future in self._prefetches.values():
+            future.cancel()
+        with self.stream_lock:
+            if self._scanner is not None:
+                self._scanner.close()
+            for excel_file in self._excel_files.values():
+                excel_file.close()
+            self.file_stream.close()
+
+    @property
+    def metadata(self) -> dict[str, list[str]]:
+        """Sheet names mapped to their column names."""
+        return {sheet: self.get_columns(sheet) for sheet in self.sheet_names}
+
+    @property
+    def schema(self) -> dict[str, dict]:
+        """Sheet names mapped to their column names, inferred dtypes and data row counts."""
+        return {sheet: self.get_schema(sheet) for sheet in self.sheet_names}
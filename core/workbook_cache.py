@@ -0,0 +1,285 @@
+"""
+    Content-addressed cache of parsed workbooks
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+
+from config import logger, WORKBOOK_CACHE_MEMORY_BUDGET, WORKBOOK_CACHE_DISK_BUDGET, WORKBOOK_CACHE_DIR
+from core.private_directory import make_private_directory
+
+MANIFEST_FILE = 'manifest.json'
+
+_KEY_RE = re.compile(r'[0-9a-f]{64}')
+
+
+def _encode_column(column):
+    """JSON value of a column name, datetimes tagged so they are read back as datetimes."""
+    if isinstance(column, datetime):
+        return {"datetime": column.isoformat()}
+    if column is None or isinstance(column, (str, int, float, bool)):
+        return column
+    raise TypeError(f"Unsupported column name {column!r}")
+
+
+def _decode_column(value):
+    return datetime.fromisoformat(value["datetime"]) if isinstance(value, dict) else value
+
+
+class CachedWorkbook:
+    """Sheet names, known column names and parsed sheets of one workbook."""
+
+    def __init__(self, sheet_names: list[str], columns: dict[str, list]):
+        self.sheet_names = sheet_names
+        self.columns = columns
+        self.sheets: dict[str, pd.DataFrame] = {}
+        self.size = 0
+
+
+class WorkbookCache:
+    """
+        Caches parsed workbooks under a hash of the uploaded bytes, so a repeated upload skips openpyxl.
+        Entries are kept in memory and, when a disk budget is set, as Feather files on local disk. Each tier has
+        its own budget in bytes and evicts the least recently used workbook first. The disk tier is only used in a
+        directory owned by the current user and closed to others, so no other user can plant cached content.
+    """
+
+    def __init__(self, memory_budget: int, disk_budget: int = 0, directory: str = None):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget if directory else 0
+        self.directory = directory
+        self._memory: OrderedDict[str, CachedWorkbook] = OrderedDict()
+        self._memory_usage = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.disk_budget and not self.__open_directory():
+            self.disk_budget = 0
+        if self.disk_budget:
+            self.__scan_disk()
+
+    @staticmethod
+    def key_for(file_stream) -> str:
+        """Hashes the content of a seekable stream and rewinds it."""
+        digest = hashlib.sha256()
+        file_stream.seek(0)
+        for block in iter(lambda: file_stream.read(1024 * 1024), b''):
+            digest.update(block)
+        file_stream.seek(0)
+        return digest.hexdigest()
+
+    def get_manifest(self, key: str) -> Optional[tuple[list[str], dict[str, list]]]:
+        """Returns the sheet names and known column names of a cached workbook."""
+        with self._lock:
+            entry = self.__get_entry(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(entry.sheet_names), dict(entry.columns)
+
+    def put_manifest(self, key: str, sheet_names: list[str], columns: dict[str, list]) -> None:
+        with self._lock:
+            entry = self.__get_entry(key)
+            if entry is None:
+                entry = CachedWorkbook(list(sheet_names), {})
+                self._memory[key] = entry
+            entry.columns.update(columns)
+            self.__write_manifest(key, entry)
+
+    def get_sheet(self, key: str, sheet_name: str, columns: Optional[list] = None) -> Optional[pd.DataFrame]:
+        """
+            Returns a copy of a cached sheet, which the caller is free to modify. With columns, only those columns
+            are returned, and a sheet found on disk is read without its other columns and not kept in memory.
+        """
+        with self._lock:
+            entry = self.__get_entry(key)
+            df = entry.sheets.get(sheet_name) if entry is not None else None
+            if df is not None and columns is not None:
+                df = df[columns]
+            elif df is None and entry is not None and key in self._disk:
+                df = self.__read_sheet(key, entry, sheet_name, columns)
+                if df is not None:
+                    self.disk_hits += 1
+                    if columns is None:
+                        self.__store_in_memory(key, entry, sheet_name, df)
+            if df is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return df.copy()
+
+    def put_sheet(self, key: str, sheet_name: str, df: pd.DataFrame) -> None:
+        """Stores a copy of a parsed sheet of a workbook whose manifest is cached."""
+        with self._lock:
+            entry = self.__get_entry(key)
+            if entry is None:
+                return
+            df = df.copy()
+            self.__store_in_memory(key, entry, sheet_name, df)
+            self.__write_sheet(key, entry, sheet_name, df)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_usage,
+                "disk_entries": len(self._disk),
+                "disk_bytes": sum(self._disk.values()),
+            }
+
+    def __get_entry(self, key: str) -> Optional[CachedWorkbook]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        elif key in self._disk:
+            entry = self.__read_manifest(key)
+            if entry is not None:
+                self._memory[key] = entry
+        if key in self._disk:
+            self._disk.move_to_end(key)
+        return entry
+
+    def __store_in_memory(self, key: str, entry: CachedWorkbook, sheet_name: str, df: pd.DataFrame) -> None:
+        size = int(df.memory_usage(deep=True).sum())
+        if sheet_name in entry.sheets:
+            size -= int(entry.sheets[sheet_name].memory_usage(deep=True).sum())
+        entry.sheets[sheet_name] = df
+        entry.size += size
+        self._memory_usage += size
+        while self._memory_usage > self.memory_budget and self._memory:
+            evicted_key, evicted = self._memory.popitem(last=False)
+            self._memory_usage -= evicted.size
+            self.evictions += 1
+            logger.debug(f"Evicted workbook {evicted_key} from memory cache")
+
+    # Disk tier
+
+    def __path(self, key: str, name: str = '') -> str:
+        return os.path.join(self.directory, key, name)
+
+    def __open_directory(self) -> bool:
+        try:
+            make_private_directory(self.directory)
+        except OSError as e:
+            logger.warning(f"Workbook disk cache disabled: {e}")
+            return False
+        return True
+
+    def __scan_disk(self) -> None:
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self.__path(key)
+            if _KEY_RE.fullmatch(key) and os.path.isdir(path) and not os.path.islink(path):
+                files = [os.path.join(path, name) for name in os.listdir(path)]
+                size = sum(os.path.getsize(file) for file in files)
+                entries.append((os.path.getmtime(path), key, size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+
+    def __read_manifest(self, key: str) -> Optional[CachedWorkbook]:
+        try:
+            with open(self.__path(key, MANIFEST_FILE), encoding='utf-8') as manifest:
+                stored = json.load(manifest)
+            sheet_names = [str(sheet_name) for sheet_name in stored["sheet_names"]]
+            columns = {str(sheet_name): [_decode_column(column) for column in sheet_columns]
+                       for sheet_name, sheet_columns in stored["columns"].items()}
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Dropping unreadable cached workbook {key}: {e}")
+            self.__remove_from_disk(key)
+            return None
+        os.utime(self.__path(key))
+        return CachedWorkbook(sheet_names, columns)
+
+    def __write_manifest(self, key: str, entry: CachedWorkbook) -> None:
+        if not self.disk_budget:
+            return
+        try:
+            manifest = json.dumps({
+                "sheet_names": entry.sheet_names,
+                "columns": {sheet_name: [_encode_column(column) for column in columns]
+                            for sheet_name, columns in entry.columns.items()},
+            })
+        except TypeError as e:
+            logger.debug(f"Workbook {key} has column names JSON cannot hold, keeping it in memory only: {e}")
+            return
+        self.__write_atomically(key, MANIFEST_FILE, lambda path: self.__write_text(manifest, path))
+
+    def __read_sheet(self, key: str, entry: CachedWorkbook, sheet_name: str,
+                     columns: Optional[list] = None) -> Optional[pd.DataFrame]:
+        path = self.__path(key, self.__sheet_file(entry, sheet_name))
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_feather(path, columns=columns)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read cached sheet '{sheet_name}' of workbook {key}: {e}")
+            return None
+
+    def __write_sheet(self, key: str, entry: CachedWorkbook, sheet_name: str, df: pd.DataFrame) -> None:
+        if not self.disk_budget:
+            return
+        if not all(isinstance(column, str) for column in df.columns):
+            logger.debug(f"Sheet '{sheet_name}' has non-string column names, keeping it in memory only")
+            return
+        if key not in self._disk:
+            self.__write_manifest(key, entry)
+            if key not in self._disk:
+                return
+        try:
+            self.__write_atomically(key, self.__sheet_file(entry, sheet_name), df.to_feather)
+        except (ValueError, TypeError, ArithmeticError) as e:
+            # pyarrow raises subclasses of these for columns it cannot convert, e.g. mixed-type object columns
+            logger.debug(f"Sheet '{sheet_name}' cannot be stored as Feather, keeping it in memory only: {e}")
+
+    @staticmethod
+    def __sheet_file(entry: CachedWorkbook, sheet_name: str) -> str:
+        return f'sheet_{entry.sheet_names.index(sheet_name)}.feather'
+
+    @staticmethod
+    def __write_text(text: str, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+    def __write_atomically(self, key: str, name: str, write) -> None:
+        os.makedirs(self.__path(key), exist_ok=True)
+        path = self.__path(key, name)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        size = sum(os.path.getsize(self.__path(key, file)) for file in os.listdir(self.__path(key)))
+        self._disk[key] = size
+        self._disk.move_to_end(key)
+        while sum(self._disk.values()) > self.disk_budget and len(self._disk) > 1:
+            evicted_key = next(iter(self._disk))
+            self.__remove_from_disk(evicted_key)
+            self.evictions += 1
+            logger.debug(f"Evicted workbook {evicted_key} from disk cache")
+
+    def __remove_from_disk(self, key: str) -> None:
+        self._disk.pop(key, None)
+        shutil.rmtree(self.__path(key), ignore_errors=True)
+
+
+workbook_cache = WorkbookCache(WORKBOOK_CACHE_MEMORY_BUDGET, WORKBOOK_CACHE_DISK_BUDGET, WORKBOOK_CACHE_DIR)
@@ -0,0 +1,279 @@
+"""
+    Writes an xlsx workbook by copying untouched parts of the source zip as they are
+"""
+import math
+import posixpath
+import re
+import zipfile
+from datetime import date, datetime, time, timedelta
+from xml.sax.saxutils import escape, quoteattr, unescape
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils import get_column_letter
+
+from config import logger
+
+WORKBOOK_PART = 'xl/workbook.xml'
+WORKBOOK_RELS_PART = 'xl/_rels/workbook.xml.rels'
+CONTENT_TYPES_PART = '[Content_Types].xml'
+STYLES_PART = 'xl/styles.xml'
+CALC_CHAIN_PART = 'xl/calcChain.xml'
+
+WORKSHEET_REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet'
+WORKSHEET_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+# Built-in number format 22 is "m/d/yy h:mm"
+DATETIME_NUMBER_FORMAT_ID = 22
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+_ATTR_RE = re.compile(r'([\w:]+)\s*=\s*"([^"]*)"')
+_SHEET_RE = re.compile(r'<(?:\w+:)?sheet\b[^>]*/?>')
+_SHEETS_CLOSE_RE = re.compile(r'</((?:\w+:)?)sheets>')
+_RELATIONSHIP_RE = re.compile(r'<Relationship\b[^>]*/?>')
+_CELL_XFS_RE = re.compile(r'<((?:\w+:)?)cellXfs\b([^>]*)>(.*?)</(?:\w+:)?cellXfs>', re.S)
+_ILLEGAL_XML_CHARS_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _attributes(element: str) -> dict[str, str]:
+    return dict(_ATTR_RE.findall(element))
+
+
+def _resolve_target(target: str) -> str:
+    """Resolves a relationship target of the workbook part to a zip member name."""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join('xl', target))
+
+
+class WorkbookLayout:
+    """Sheets of an xlsx zip and the worksheet parts holding them."""
+
+    def __init__(self, archive: zipfile.ZipFile):
+        """
+        :param archive: The opened xlsx zip
+        :raises ValueError: If the workbook part or its relationships cannot be read
+        """
+        self.members = archive.namelist()
+        self.sheet_parts: dict[str, str] = {}
+        self.sheet_ids: list[int] = []
+        try:
+            workbook_xml = archive.read(WORKBOOK_PART).decode('utf-8')
+            rels_xml = archive.read(WORKBOOK_RELS_PART).decode('utf-8')
+
+            relationships = {}
+            for element in _RELATIONSHIP_RE.findall(rels_xml):
+                attrs = _attributes(element)
+                relationships[attrs['Id']] = (attrs.get('Type'), attrs.get('Target'))
+            self.relationship_ids = set(relationships)
+
+            for element in _SHEET_RE.findall(workbook_xml):
+                attrs = _attributes(element)
+                rel_id = next(value for key, value in attrs.items() if key.endswith(':id'))
+                rel_type, target = relationships[rel_id]
+                self.sheet_ids.append(int(attrs['sheetId']))
+                if rel_type == WORKSHEET_REL_TYPE:
+                    name = unescape(attrs['name'], {'&quot;': '"', '&apos;': "'"})
+                    self.sheet_parts[name] = _resolve_target(target)
+        except (KeyError, StopIteration, UnicodeDecodeError) as e:
+            raise ValueError(f"Unsupported workbook layout: {e!r}")
+        if _SHEETS_CLOSE_RE.search(workbook_xml) is None:
+            raise ValueError("Unsupported workbook layout: no sheets element")
+
+
+class XlsxPassthroughWriter:
+    """
+        Builds an output workbook from the source xlsx zip. Parts of sheets that were not modified are copied
+        as they are, so their cells, styles and formulas survive and are never re-serialized. Only replaced and
+        new sheets are written, as inline-string worksheets generated from their DataFrames.
+    """
+
+    def __init__(self, source):
+        """
+            Reads the sheet layout of the source workbook.
+
+        :param source: Seekable binary stream of the source xlsx file
+        :raises ValueError: If the source layout is not supported for passthrough writing
+        """
+        self._source = source
+        try:
+            source.seek(0)
+            with zipfile.ZipFile(source) as archive:
+                layout = WorkbookLayout(archive)
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Unsupported workbook layout: {e!r}")
+        self._members = layout.members
+        self._sheet_parts = layout.sheet_parts
+        self._sheet_ids = layout.sheet_ids
+        self._relationship_ids = layout.relationship_ids
+
+    @property
+    def sheet_parts(self) -> dict[str, str]:
+        """Sheet names mapped to their worksheet part in the source zip."""
+        return self._sheet_parts
+
+    def write(self, target, sheets: dict[str, pd.DataFrame]) -> None:
+        """
+            Writes the workbook to the target path or stream.
+
+        :param target: Path or writable binary stream
+        :param sheets: Modified and new sheets mapped to their DataFrames; every other sheet is copied as is
+        """
+        replaced = {name: self._sheet_parts[name] for name in sheets if name in self._sheet_parts}
+        added = {}
+        next_index = 1
+        for name in sheets:
+            if name in self._sheet_parts:
+                continue
+            while f'xl/worksheets/sheet{next_index}.xml' in self._members:
+                next_index += 1
+            added[name] = f'xl/worksheets/sheet{next_index}.xml'
+            next_index += 1
+
+        relationship_ids = dict(zip(added, self.__free_relationship_ids(len(added))))
+        self._source.seek(0)
+        with zipfile.ZipFile(self._source) as source, \
+                zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as output:
+            date_style = self.__date_style(source, output) if sheets else None
+            parts = {part: name for name, part in {**replaced, **added}.items()}
+
+            for info in source.infolist():
+                if info.filename in parts or (info.filename == STYLES_PART and date_style is not None):
+                    continue
+                if info.filename == CALC_CHAIN_PART and replaced:
+                    # Excel rebuilds the calculation chain, which may point at cells of replaced sheets
+                    continue
+                data = source.read(info.filename)
+                if info.filename == WORKBOOK_PART and added:
+                    data = self.__add_sheets_to_workbook(data.decode('utf-8'), relationship_ids).encode('utf-8')
+                elif info.filename == WORKBOOK_RELS_PART and (added or replaced):
+                    data = self.__update_workbook_rels(data.decode('utf-8'), added, relationship_ids,
+                                                       bool(replaced)).encode('utf-8')
+                elif info.filename == CONTENT_TYPES_PART and (added or replaced):
+                    data = self.__update_content_types(data.decode('utf-8'), added, bool(replaced)).encode('utf-8')
+                output.writestr(info, data)
+
+            for part, name in parts.items():
+                with output.open(part, 'w') as stream:
+                    _write_worksheet(stream, sheets[name], date_style)
+
+        logger.info(f"Copied {len(self._sheet_parts) - len(replaced)} untouched sheet(s), "
+                    f"wrote {len(replaced)} modified and {len(added)} new sheet(s)")
+
+    def __date_style(self, source: zipfile.ZipFile, output: zipfile.ZipFile):
+        """Appends a datetime cell format to the styles part and returns its index."""
+        if STYLES_PART not in self._members:
+            return None
+        styles_xml = source.read(STYLES_PART).decode('utf-8')
+        match = _CELL_XFS_RE.search(styles_xml)
+        if match is None:
+            return None
+        prefix, attrs, body = match.groups()
+        index = len(re.findall(r'<(?:\w+:)?xf\b', body))
+        attrs = re.sub(r'\bcount="\d+"', f'count="{index + 1}"', attrs)
+        new_xf = (f'<{prefix}xf numFmtId="{DATETIME_NUMBER_FORMAT_ID}" fontId="0" fillId="0" borderId="0" '
+                  f'xfId="0" applyNumberFormat="1"/>')
+        styles_xml = (styles_xml[:match.start()] + f'<{prefix}cellXfs{attrs}>{body}{new_xf}</{prefix}cellXfs>'
+                      + styles_xml[match.end():])
+        output.writestr(source.getinfo(STYLES_PART), styles_xml.encode('utf-8'))
+        return index
+
+    def __free_relationship_ids(self, count: int) -> list[str]:
+        """Returns relationship ids for added sheets that do not clash with the source ones."""
+        ids = []
+        number = 1
+        while len(ids) < count:
+            if f'rId{number}' not in self._relationship_ids:
+                ids.append(f'rId{number}')
+            number += 1
+        return ids
+
+    def __add_sheets_to_workbook(self, workbook_xml: str, relationship_ids: dict[str, str]) -> str:
+        match = _SHEETS_CLOSE_RE.search(workbook_xml)
+        prefix = match.group(1)
+        sheet_id = max(self._sheet_ids, default=0)
+        elements = []
+        for name, relationship_id in relationship_ids.items():
+            sheet_id += 1
+            elements.append(f'<{prefix}sheet xmlns:r="{RELATIONSHIPS_NS}" name={quoteattr(name)} '
+                            f'sheetId="{sheet_id}" r:id="{relationship_id}"/>')
+        return workbook_xml[:match.start()] + ''.join(elements) + workbook_xml[match.start():]
+
+    @staticmethod
+    def __update_workbook_rels(rels_xml: str, added: dict[str, str], relationship_ids: dict[str, str],
+                               drop_calc_chain: bool) -> str:
+        if drop_calc_chain:
+            rels_xml = re.sub(r'<Relationship\b[^>]*Target="/?(?:xl/)?calcChain\.xml"[^>]*/>', '', rels_xml)
+        elements = [f'<Relationship Id="{relationship_ids[name]}" Type="{WORKSHEET_REL_TYPE}" Target="/{part}"/>'
+                    for name, part in added.items()]
+        return rels_xml.replace('</Relationships>', ''.join(elements) + '</Relationships>')
+
+    @staticmethod
+    def __update_content_types(types_xml: str, added: dict[str, str], drop_calc_chain: bool) -> str:
+        if drop_calc_chain:
+            types_xml = re.sub(r'<Override\b[^>]*PartName="/xl/calcChain\.xml"[^>]*/>', '', types_xml)
+        elements = [f'<Override PartName="/{part}" ContentType="{WORKSHEET_CONTENT_TYPE}"/>'
+                    for part in added.values()]
+        return types_xml.replace('</Types>', ''.join(elements) + '</Types>')
+
+
+def _column_label(column) -> str:
+    if isinstance(column, tuple):
+        return ' '.join(str(part) for part in column if part != '')
+    return column
+
+
+def _inline_string(value) -> str:
+    text = _ILLEGAL_XML_CHARS_RE.sub('', str(value))
+    return f' t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _cell_body(value, date_style):
+    """Returns the cell markup following the cell reference, or None for an empty cell."""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return f' t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, np.integer)):
+        return f'><v>{int(value)}</v></c>'
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value):
+            return None
+        if math.isinf(value):
+            return _inline_string(value)
+        return f'><v>{float(value)!r}</v></c>'
+    if isinstance(value, (datetime, date)):
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_localize(None)
+        serial = (timestamp - EXCEL_EPOCH) / pd.Timedelta(days=1)
+        style = f' s="{date_style}"' if date_style is not None else ''
+        return f'{style}><v>{serial!r}</v></c>'
+    if isinstance(value, (timedelta, np.timedelta64)):
+        return f'><v>{pd.Timedelta(value) / pd.Timedelta(days=1)!r}</v></c>'
+    if isinstance(value, time):
+        return _inline_string(value.isoformat())
+    return _inline_string(value)
+
+
+def _write_worksheet(stream, df: pd.DataFrame, date_style) -> None:
+    """Streams a DataFrame, header row first, as worksheet XML."""
+    letters = [get_column_letter(index + 1) for index in range(len(df.columns))]
+    last_cell = f'{letters[-1]}{len(df) + 1}' if letters else 'A1'
+    stream.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                 f'<worksheet xmlns="{SPREADSHEET_NS}"><dimension ref="A1:{last_cell}"/><sheetData>'.encode('utf-8'))
+
+    header = ''.join(f'<c r="{letter}1"{_inline_string(_column_label(column))}' for letter, column in zip(letters, df.columns))
+    stream.write(f'<row r="1">{header}</row>'.encode('utf-8'))
+
+    for row_number, row in enumerate(df.itertuples(index=False, name=None), start=2):
+        cells = []
+        for letter, value in zip(letters, row):
+            body = _cell_body(value, date_style)
+            if body is not None:
+                cells.append(f'<c r="{letter}{row_number}"{body}')
+        stream.write(f'<row r="{row_number}">{"".join(cells)}</row>'.encode('utf-8'))
+
+    stream.write(b'</sheetData></worksheet>')
@@ -0,0 +1,265 @@
+"""
+    Streaming schema scanner reading only the header and first rows of each worksheet of an xlsx file
+"""
+import re
+import zipfile
+from typing import Optional
+from xml.etree.ElementTree import iterparse, ParseError
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import from_excel
+
+from core.xlsx_passthrough import WorkbookLayout, STYLES_PART
+
+SHARED_STRINGS_PART = 'xl/sharedStrings.xml'
+
+_CELL_REF_RE = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _number(text: str):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+class XlsxSchemaScanner:
+    """
+        Reads column names, inferred dtypes and row counts of worksheets straight from the xlsx XML. Each sheet
+        is streamed only up to its header and sample_rows data rows, and only the shared strings those rows use
+        are read, so a scan takes about the same time however long the sheet is.
+    """
+
+    SAMPLE_ROWS = 5
+
+    def __init__(self, source, sample_rows: int = SAMPLE_ROWS):
+        """
+        :param source: Seekable binary stream of the xlsx file
+        :param sample_rows: Number of data rows used to infer the dtypes
+        :raises ValueError: If the file is not an xlsx workbook the scanner can read
+        """
+        self.sample_rows = sample_rows
+        self._source = source
+        self._shared_strings: list[str] = []
+        self._shared_strings_complete = False
+        self._shared_strings_reader = None
+        self._date_styles: Optional[set[int]] = None
+        try:
+            source.seek(0)
+            with zipfile.ZipFile(source) as archive:
+                layout = WorkbookLayout(archive)
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Unsupported workbook layout: {e!r}")
+        self._members = set(layout.members)
+        self._sheet_parts = layout.sheet_parts
+
+    @property
+    def sheet_names(self) -> list[str]:
+        return list(self._sheet_parts)
+
+    def scan(self, sheet_name: str) -> dict:
+        """
+            Scans the header and the first rows of a sheet.
+
+        :param sheet_name: Name of the sheet to scan
+        :return: Dict with the column names, their inferred dtypes, and the number of data rows taken from the
+            sheet dimension, or None when the sheet does not declare one
+        """
+        with zipfile.ZipFile(self._source) as archive:
+            dimension, rows = self.__read_rows(archive, self._sheet_parts[sheet_name])
+            shared_indices = [value for _, cells in rows for kind, value, style in cells.values() if kind == 's']
+            if shared_indices:
+                self.__load_shared_strings(max(shared_indices))
+            if self._date_styles is None:
+                self._date_styles = self.__read_date_styles(archive)
+
+        if not rows:
+            return {"columns": [], "dtypes": [], "rows": 0}
+        width = max((max(cells) + 1 for _, cells in rows if cells), default=0)
+        header_number, header = rows[0]
+        columns = self.__column_names([self.__value(header.get(index)) for index in range(width)])
+        dtypes = [self.__dtype([cells.get(index) for _, cells in rows[1:]]) for index in range(width)]
+        return {"columns": columns, "dtypes": dtypes, "rows": self.__row_count(dimension, header_number, rows)}
+
+    def __read_rows(self, archive: zipfile.ZipFile, part: str) -> tuple[Optional[str], list[tuple]]:
+        """Streams the sheet XML up to the header row and sample_rows data rows."""
+        dimension = None
+        rows = []
+        with archive.open(part) as stream:
+            try:
+                for _, element in iterparse(stream, events=('end',)):
+                    name = _local_name(element.tag)
+                    if name == 'dimension':
+                        dimension = element.get('ref')
+                    elif name == 'row':
+                        cells = self.__read_cells(element)
+                        row_number = int(element.get('r', len(rows) + 1))
+                        element.clear()
+                        # Leading empty rows are skipped, as pandas does
+                        if cells or rows:
+                            rows.append((row_number, cells))
+                        if len(rows) > self.sample_rows:
+                            break
+            except ParseError as e:
+                raise ValueError(f"Unable to read worksheet '{part}': {e}")
+        return dimension, rows
+
+    @staticmethod
+    def __read_cells(element) -> dict:
+        """Returns the cells of a row as column index -> (kind, raw value, style index)."""
+        cells = {}
+        for position, cell in enumerate(child for child in element if _local_name(child.tag) == 'c'):
+            match = _CELL_REF_RE.match(cell.get('r', ''))
+            index = _column_index(match.group(1)) if match else position
+            kind = cell.get('t', 'n')
+            if kind == 'inlineStr':
+                text = ''.join(node.text or '' for node in cell.iter() if _local_name(node.tag) == 't')
+                cells[index] = ('str', text, None)
+                continue
+            value = next((child.text for child in cell if _local_name(child.tag) == 'v'), None)
+            if value is None:
+                continue
+            if kind == 's':
+                value = int(value)
+            cells[index] = (kind, value, int(cell.get('s', 0)))
+        return cells
+
+    def close(self) -> None:
+        """Stops reading the shared strings table, if a scan left it partly read."""
+        if self._shared_strings_reader is not None:
+            self._shared_strings_reader.close()
+            self._shared_strings_reader = None
+
+    def __load_shared_strings(self, last_index: int) -> None:
+        """
+            Reads shared strings up to last_index only. The table is read once across the scans of all the sheets:
+            each scan resumes where the previous one stopped.
+        """
+        if len(self._shared_strings) > last_index or self._shared_strings_complete:
+            return
+        if SHARED_STRINGS_PART not in self._members:
+            self._shared_strings_complete = True
+            return
+        if self._shared_strings_reader is None:
+            self._shared_strings_reader = self.__iter_shared_strings()
+        for text in self._shared_strings_reader:
+            self._shared_strings.append(text)
+            if len(self._shared_strings) > last_index:
+                return
+        self._shared_strings_complete = True
+        self._shared_strings_reader = None
+
+    def __iter_shared_strings(self):
+        with zipfile.ZipFile(self._source) as archive, archive.open(SHARED_STRINGS_PART) as stream:
+            for _, element in iterparse(stream, events=('end',)):
+                if _local_name(element.tag) == 'si':
+                    yield self.__shared_string_text(element)
+                    element.clear()
+
+    @staticmethod
+    def __shared_string_text(element) -> str:
+        """Text of a plain or rich text string item. Phonetic runs (rPh) are not part of the displayed text."""
+        texts = []
+        for child in element:
+            name = _local_name(child.tag)
+            if name == 't':
+                texts.append(child.text or '')
+            elif name == 'r':
+                texts.extend(node.text or '' for node in child if _local_name(node.tag) == 't')
+        return ''.join(texts)
+
+    def __read_date_styles(self, archive: zipfile.ZipFile) -> set[int]:
+        """Returns the indices of cell formats showing dates."""
+        if STYLES_PART not in self._members:
+            return set()
+        custom_formats = {}
+        date_styles = set()
+        in_cell_xfs = False
+        cell_xf_index = 0
+        with archive.open(STYLES_PART) as stream:
+            for event, element in iterparse(stream, events=('start', 'end')):
+                name = _local_name(element.tag)
+                if name == 'numFmt' and event == 'end':
+                    custom_formats[int(element.get('numFmtId'))] = element.get('formatCode', '')
+                elif name == 'cellXfs':
+                    in_cell_xfs = event == 'start'
+                elif name == 'xf' and in_cell_xfs and event == 'end':
+                    format_id = int(element.get('numFmtId', 0))
+                    format_code = custom_formats.get(format_id, BUILTIN_FORMATS.get(format_id, 'General'))
+                    if is_date_format(format_code):
+                        date_styles.add(cell_xf_index)
+                    cell_xf_index += 1
+        return date_styles
+
+    def __value(self, cell):
+        if cell is None:
+            return None
+        kind, value, style = cell
+        if kind == 's':
+            return self._shared_strings[value] if value < len(self._shared_strings) else None
+        if kind == 'b':
+            return value == '1'
+        if kind in {'str', 'e'}:
+            return value
+        if style in self._date_styles:
+            # Date formatted numbers are read as datetimes, as openpyxl does, e.g. dates used as column names
+            return from_excel(float(value))
+        return _number(value)
+
+    def __dtype(self, cells: list) -> str:
+        kinds = set()
+        # Empty strings are read as missing values, as pandas does
+        cells = [None if cell is None or self.__value(cell) == '' else cell for cell in cells]
+        for cell in cells:
+            if cell is None:
+                continue
+            kind, value, style = cell
+            if kind == 'n':
+                if style in self._date_styles:
+                    kinds.add('datetime64[ns]')
+                else:
+                    kinds.add('int64' if float(value).is_integer() else 'float64')
+            elif kind == 'b':
+                kinds.add('bool')
+            else:
+                kinds.add('object')
+        if kinds == {'int64', 'float64'} or (kinds == {'int64'} and None in cells):
+            return 'float64'
+        return kinds.pop() if len(kinds) == 1 else 'object'
+
+    @staticmethod
+    def __column_names(values: list) -> list:
+        """Names columns the way pandas does: blank headers become 'Unnamed: <n>', duplicates get a suffix."""
+        columns = []
+        seen = {}
+        for index, value in enumerate(values):
+            if value is None or value == '':
+                value = f"Unnamed: {index}"
+            if value in seen:
+                seen[value] += 1
+                value = f"{value}.{seen[value]}"
+            else:
+                seen[value] = 0
+            columns.append(value)
+        return columns
+
+    def __row_count(self, dimension: Optional[str], header_number: Optional[int], rows: list) -> Optional[int]:
+        if not dimension or header_number is None:
+            return None
+        match = _CELL_REF_RE.match(dimension.split(':')[-1])
+        if match is None:
+            return None
+        row_count = int(match.group(2)) - header_number
+        if row_count < len(rows) - 1 and len(rows) > 1:
+            # The dimension is stale, e.g. a single cell reference written by some tools
+            return None
+        return row_count
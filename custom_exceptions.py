@@ -88,3 +88,27 @@ class EmptyColumnException(CustomBaseException):
     def __init__(self, column_name, error_code=None):
         message = f"The column '{column_name}' is empty."
         super().__init__(message, error_code, StatusCodes.BAD_REQUEST)
+
+
+class WorkbookNotFound(CustomBaseException):
+    """Exception raised when an uploaded workbook session does not exist or has expired."""
+
+    def __init__(self, message=None, error_code=None):
+        super().__init__(message or ErrorMessages.WORKBOOK_NOT_FOUND, error_code or ErrorCodes.WORKBOOK_NOT_FOUND,
+                         StatusCodes.NOT_FOUND)
+
+
+class LLMUnavailable(CustomBaseException):
+    """Exception raised when a call to the LLM still fails after its retries."""
+
+    def __init__(self, message=None, error_code=None):
+        super().__init__(message or ErrorMessages.LLM_UNAVAILABLE, error_code or ErrorCodes.LLM_UNAVAILABLE,
+                         StatusCodes.SERVICE_UNAVAILABLE)
+
+
+class SessionsUnavailable(CustomBaseException):
+    """Exception raised when uploaded workbooks cannot be stored safely on this server."""
+
+    def __init__(self, message=None, error_code=None):
+        super().__init__(message or ErrorMessages.SESSIONS_UNAVAILABLE,
+                         error_code or ErrorCodes.SESSIONS_UNAVAILABLE, StatusCodes.SERVICE_UNAVAILABLE)
@@ -4,9 +4,10 @@
 from flask import jsonify, Flask
 
 from custom_exceptions import CustomBaseException
-from utils import validate_process_excel_request
+from utils import validate_process_excel_request, SpooledUploadRequest
 
 app = Flask(__name__)
+app.request_class = SpooledUploadRequest
 
 @app.errorhandler(CustomBaseException)
 def handle_custom_exception(error):
@@ -0,0 +1,68 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+
+from core import Engine
+from core.workbook import Workbook
+from tests import BaseTest
+
+
+class TestEngine(BaseTest):
+    def setUp(self):
+        self.excel_data = BytesIO()
+        with pd.ExcelWriter(self.excel_data, engine='openpyxl') as writer:
+            pd.DataFrame({"A": [1, 2], "B": [3, 4]}).to_excel(writer, sheet_name="Sheet1", index=False)
+        self.excel_data.seek(0)
+        self.metadata = {"operation": "summation", "columns": ["A", "B"], "sheets": ["Sheet1"], "parameters": {}}
+
+    def test_execute_returns_in_memory_output(self):
+        output = Engine(self.metadata, Workbook(self.excel_data)).execute()
+
+        self.assertFalse(output._rolled)
+        df = pd.read_excel(output, sheet_name="Sheet1")
+        self.assertListEqual(df["A_B_sum"].tolist(), [4.0, 6.0])
+
+    def test_execute_outputs_are_isolated(self):
+        first = Engine(self.metadata, Workbook(self.excel_data)).execute()
+        other_data = BytesIO()
+        with pd.ExcelWriter(other_data, engine='openpyxl') as writer:
+            pd.DataFrame({"A": [10], "B": [20]}).to_excel(writer, sheet_name="Sheet1", index=False)
+        second = Engine(self.metadata, Workbook(other_data)).execute()
+
+        self.assertListEqual(pd.read_excel(first)["A_B_sum"].tolist(), [4.0, 6.0])
+        self.assertListEqual(pd.read_excel(second)["A_B_sum"].tolist(), [30.0])
+
+    @patch("core.OUTPUT_MODE", "passthrough")
+    def test_execute_overwriting_existing_column_is_saved(self):
+        excel_data = BytesIO()
+        with pd.ExcelWriter(excel_data, engine='openpyxl') as writer:
+            pd.DataFrame({"A": [1, 2], "B": [3, 4], "A_B_sum": [0, 0]}).to_excel(writer, sheet_name="Sheet1",
+                                                                                   index=False)
+
+        output = Engine(self.metadata, Workbook(excel_data)).execute()
+
+        self.assertListEqual(pd.read_excel(output, sheet_name="Sheet1")["A_B_sum"].tolist(), [4, 6])
+
+    @patch("core.OUTPUT_SPOOL_MAX_SIZE", 1)
+    def test_execute_spools_large_output(self):
+        output = Engine(self.metadata, Workbook(self.excel_data)).execute()
+
+        self.assertTrue(output._rolled)
+        self.assertListEqual(pd.read_excel(output)["A_B_sum"].tolist(), [4.0, 6.0])
+
+    def test_execute_aggregation_reads_only_referenced_columns(self):
+        metadata = {"operation": "max", "columns": ["A"], "sheets": ["Sheet1"], "parameters": {"group_by": "B"}}
+        with patch("core.workbook.pd.read_excel", wraps=pd.read_excel) as mock_read_excel:
+            output = Engine(metadata, Workbook(self.excel_data)).execute()
+
+        self.assertListEqual([call.kwargs.get("usecols") for call in mock_read_excel.call_args_list], [["A", "B"]])
+        result = pd.read_excel(output, sheet_name="result_sheet")
+        self.assertListEqual(result["max_of_A"].tolist(), [1, 2])
+        self.assertListEqual(pd.read_excel(output, sheet_name="Sheet1").columns.tolist(), ["A", "B"])
+
+    def test_execute_write_back_operation_reads_whole_sheet(self):
+        with patch("core.workbook.pd.read_excel", wraps=pd.read_excel) as mock_read_excel:
+            Engine(self.metadata, Workbook(self.excel_data)).execute()
+
+        self.assertListEqual([call.kwargs.get("usecols") for call in mock_read_excel.call_args_list], [None])
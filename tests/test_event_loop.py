@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.event_loop import EventLoopThread, offload
+from tests import BaseTest
+
+
+class TestEventLoopThread(BaseTest):
+    def setUp(self):
+        self.loop_thread = EventLoopThread(name='test-event-loop')
+        self.addCleanup(self.loop_thread.stop)
+
+    def test_runs_share_one_loop(self):
+        async def running_loop():
+            return asyncio.get_running_loop()
+
+        self.assertFalse(self.loop_thread.running)
+        first = self.loop_thread.run(running_loop())
+        self.assertIs(self.loop_thread.run(running_loop()), first)
+        self.assertTrue(self.loop_thread.running)
+        self.assertEqual(self.loop_thread.stats(), {"jobs": 2, "jobs_in_flight": 0})
+
+    def test_jobs_of_several_threads_are_in_flight_at_once(self):
+        started, release = [], None
+
+        async def job():
+            nonlocal release
+            release = release or asyncio.Event()
+            started.append(1)
+            if len(started) == 3:
+                release.set()
+            await asyncio.wait_for(release.wait(), timeout=5)
+            return len(started)
+
+        with ThreadPoolExecutor(max_workers=3) as requests:
+            results = list(requests.map(lambda _: self.loop_thread.run(job()), range(3)))
+
+        self.assertEqual(results, [3, 3, 3])
+
+    def test_errors_are_raised_in_the_calling_thread(self):
+        async def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.loop_thread.run(fail())
+        self.assertEqual(self.loop_thread.stats()["jobs_in_flight"], 0)
+
+    def test_offloaded_work_leaves_the_loop_free(self):
+        ticks = []
+
+        def cpu_bound():
+            time.sleep(0.2)
+            return threading.current_thread().name
+
+        async def tick():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        async def job():
+            ticker = asyncio.create_task(tick())
+            try:
+                return await offload(cpu_bound)
+            finally:
+                ticker.cancel()
+
+        self.assertTrue(self.loop_thread.run(job()).startswith('nlp-cpu'))
+        self.assertGreater(len(ticks), 5)
+
+    def test_stopped_loop_restarts_on_next_run(self):
+        async def running_loop():
+            return asyncio.get_running_loop()
+
+        first = self.loop_thread.run(running_loop())
+        self.loop_thread.stop()
+        self.assertFalse(self.loop_thread.running)
+        self.assertTrue(first.is_closed())
+        self.assertIsNot(self.loop_thread.run(running_loop()), first)
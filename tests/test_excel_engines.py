@@ -0,0 +1,76 @@
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+
+from constants import ExcelEngines, OutputModes
+from core import FileHandler
+from core.excel_engines import select_reader, select_writer, is_available, EngineTimings
+from core.workbook import Workbook
+from tests import BaseTest
+
+
+class TestEngineSelection(BaseTest):
+    @patch("core.excel_engines.is_available", return_value=True)
+    def test_auto_picks_fast_engines_for_large_files(self, _):
+        with patch("core.excel_engines.EXCEL_FAST_ENGINE_MIN_SIZE", 100):
+            self.assertEqual(select_reader(99, ExcelEngines.AUTO), ExcelEngines.OPENPYXL)
+            self.assertEqual(select_reader(100, ExcelEngines.AUTO), ExcelEngines.CALAMINE)
+            self.assertEqual(select_writer(100, ExcelEngines.AUTO), ExcelEngines.XLSXWRITER)
+
+    @patch("core.excel_engines.is_available", return_value=False)
+    def test_missing_engines_fall_back_to_openpyxl(self, _):
+        with patch("core.excel_engines.EXCEL_FAST_ENGINE_MIN_SIZE", 0):
+            self.assertEqual(select_reader(100, ExcelEngines.AUTO), ExcelEngines.OPENPYXL)
+        self.assertEqual(select_writer(100, ExcelEngines.XLSXWRITER), ExcelEngines.OPENPYXL)
+
+    def test_configured_engine_ignores_file_size(self):
+        self.assertEqual(select_reader(0, ExcelEngines.OPENPYXL), ExcelEngines.OPENPYXL)
+
+    def test_timings_are_recorded_per_engine_and_operation(self):
+        timings = EngineTimings()
+        with timings.timed(ExcelEngines.OPENPYXL, 'read'):
+            pass
+        with timings.timed(ExcelEngines.OPENPYXL, 'read'):
+            pass
+        self.assertEqual(timings.stats()["openpyxl.read"]["calls"], 2)
+
+
+@unittest.skipUnless(is_available(ExcelEngines.CALAMINE) and is_available(ExcelEngines.XLSXWRITER),
+                     "python-calamine and xlsxwriter are optional")
+class TestFastEngines(BaseTest):
+    def setUp(self):
+        self.df = pd.DataFrame({"A": [1, 2], "B": ["x", float("nan")], "D": pd.to_datetime(["2023-01-01", "2023-02-01"])})
+        self.excel_data = BytesIO()
+        with pd.ExcelWriter(self.excel_data, engine='openpyxl') as writer:
+            self.df.to_excel(writer, sheet_name="Sheet1", index=False)
+            self.df.to_excel(writer, sheet_name="Sheet2", index=False)
+        self.excel_data.seek(0)
+
+    @patch("core.excel_engines.EXCEL_FAST_ENGINE_MIN_SIZE", 0)
+    def test_calamine_reads_same_frame_as_openpyxl(self):
+        workbook = Workbook(self.excel_data)
+        df = workbook.get_sheet("Sheet1")
+        self.assertEqual(workbook.reader_engine, ExcelEngines.CALAMINE)
+        pd.testing.assert_frame_equal(df, self.df)
+
+    @patch("core.excel_engines.EXCEL_FAST_ENGINE_MIN_SIZE", 0)
+    def test_xlsxwriter_rewrite_copies_untouched_sheets(self):
+        file_handler = FileHandler(Workbook(self.excel_data), ["Sheet1"])
+        file_handler.get_df("Sheet1")["C"] = 1
+        output = BytesIO()
+        file_handler.save_file(output, mode=OutputModes.REWRITE)
+
+        output.seek(0)
+        sheets = pd.read_excel(output, sheet_name=None)
+        self.assertListEqual(sheets["Sheet1"]["C"].tolist(), [1, 1])
+        pd.testing.assert_frame_equal(sheets["Sheet2"], self.df)
+
+    @patch("core.excel_engines.EXCEL_FAST_ENGINE_MIN_SIZE", 0)
+    def test_unreadable_file_falls_back_to_openpyxl(self):
+        workbook = Workbook(self.excel_data)
+        with patch("core.workbook.pd.ExcelFile", side_effect=[RuntimeError("unsupported"), pd.ExcelFile(self.excel_data)]):
+            df = workbook.get_sheet("Sheet1")
+        self.assertEqual(workbook.reader_engine, ExcelEngines.OPENPYXL)
+        pd.testing.assert_frame_equal(df, self.df)
@@ -0,0 +1,33 @@
+from core.extractive_summarizer import ExtractiveSummarizer
+from tests import BaseTest
+
+
+class TestExtractiveSummarizer(BaseTest):
+    def setUp(self):
+        self.summarizer = ExtractiveSummarizer(max_sentences=2)
+        self.texts = [
+            "The battery drains quickly. Support replaced the battery.",
+            "Battery life is short and the battery gets hot.",
+            "I like the colour.",
+            "The battery drains quickly.",
+            "Shipping took a week.\nThe box was fine.",
+        ]
+
+    def test_split_sentences(self):
+        self.assertEqual(self.summarizer.split_sentences(self.texts), [
+            "The battery drains quickly.", "Support replaced the battery.",
+            "Battery life is short and the battery gets hot.", "I like the colour.", "Shipping took a week.",
+            "The box was fine.",
+        ])
+
+    def test_central_sentences_in_original_order(self):
+        summary = self.summarizer.summarize(self.texts)
+        self.assertEqual(summary, ["The battery drains quickly. Battery life is short and the battery gets hot."])
+
+    def test_short_column_is_kept_whole(self):
+        self.assertEqual(self.summarizer.summarize(["Great product!", "Arrived late."]),
+                         ["Great product! Arrived late."])
+
+    def test_sentences_without_known_words(self):
+        summary = ExtractiveSummarizer(max_sentences=1).summarize(["It is.", "They were.", "We are."])
+        self.assertEqual(summary, ["It is."])
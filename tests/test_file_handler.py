@@ -0,0 +1,78 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+
+from constants import OutputModes
+from core import FileHandler
+from core.workbook import Workbook
+from tests import BaseTest
+
+
+class TestFileHandler(BaseTest):
+    def setUp(self):
+        self.excel_data = BytesIO()
+        with pd.ExcelWriter(self.excel_data, engine='openpyxl') as writer:
+            pd.DataFrame({"A": [1, 2], "B": [3, 4]}).to_excel(writer, sheet_name="Sheet1", index=False)
+            pd.DataFrame({"X": ["foo", "bar"], "Y": [1.5, 2.5]}).to_excel(writer, sheet_name="Sheet2", index=False)
+        self.excel_data.seek(0)
+        self.file_handler = FileHandler(Workbook(self.excel_data), ["Sheet1"])
+
+    def test_load_file_does_not_parse_sheets(self):
+        with patch("core.workbook.pd.read_excel") as mock_read_excel:
+            self.file_handler.load_file()
+        mock_read_excel.assert_not_called()
+        self.assertEqual(self.file_handler.df_dict, {})
+
+    def test_load_file_missing_sheet(self):
+        file_handler = FileHandler(self.file_handler.workbook, ["Missing"])
+        with self.assertRaises(ValueError):
+            file_handler.load_file()
+
+    def test_get_df_parses_only_requested_sheet(self):
+        df = self.file_handler.get_df("Sheet1")
+        self.assertListEqual(df["A"].tolist(), [1, 2])
+        self.assertListEqual(list(self.file_handler.df_dict), ["Sheet1"])
+
+    def test_get_df_with_columns_keeps_sheet_untouched(self):
+        df = self.file_handler.get_df("Sheet1", ["B"])
+        self.assertListEqual(df.columns.tolist(), ["B"])
+        self.assertEqual(self.file_handler.df_dict, {})
+        self.assertListEqual(self.file_handler.get_df("Sheet1").columns.tolist(), ["A", "B"])
+
+    def test_save_file_keeps_untouched_sheets(self):
+        df = self.file_handler.get_df("Sheet1")
+        df["C"] = df["A"] + df["B"]
+        self.file_handler.update_df(pd.DataFrame({"total": [10]}), "result_sheet")
+        output = BytesIO()
+
+        with patch("core.workbook.pd.read_excel") as mock_read_excel:
+            self.file_handler.save_file(output)
+        mock_read_excel.assert_not_called()
+
+        output.seek(0)
+        sheets = pd.read_excel(output, sheet_name=None)
+        self.assertListEqual(list(sheets), ["Sheet1", "Sheet2", "result_sheet"])
+        self.assertListEqual(sheets["Sheet1"]["C"].tolist(), [4, 6])
+        pd.testing.assert_frame_equal(sheets["Sheet2"], pd.DataFrame({"X": ["foo", "bar"], "Y": [1.5, 2.5]}))
+
+    def test_save_file_rewrite_mode(self):
+        self.file_handler.get_df("Sheet1")
+        output = BytesIO()
+        self.file_handler.save_file(output, mode=OutputModes.REWRITE)
+
+        output.seek(0)
+        sheets = pd.read_excel(output, sheet_name=None)
+        self.assertListEqual(list(sheets), ["Sheet1", "Sheet2"])
+        pd.testing.assert_frame_equal(sheets["Sheet1"], pd.DataFrame({"A": [1, 2], "B": [3, 4]}))
+
+    def test_modified_sheets(self):
+        df = self.file_handler.get_df("Sheet1")
+        self.file_handler.get_df("Sheet2")
+        self.assertEqual(self.file_handler.modified_sheets, {})
+
+        df["C"] = df["A"] * 2
+        self.assertListEqual(list(self.file_handler.modified_sheets), ["Sheet1"])
+
+    def tearDown(self):
+        self.excel_data.close()
@@ -0,0 +1,72 @@
+from core.instruction_parser import InstructionParser
+from tests import BaseTest
+
+
+class TestInstructionParser(BaseTest):
+    def setUp(self):
+        self.parser = InstructionParser()
+        self.metadata = {
+            "Sheet1": ["Sales", "Tax", "Region"],
+            "Employees": ["Employee ID", "Salary", "Department"],
+            "Orders": ["Order ID", "Amount", "Customer ID"],
+            "Customers": ["Customer ID", "Name"],
+            "Reviews": ["Feedback", "Rating"],
+        }
+
+    def test_sum_with_sheet(self):
+        params = self.parser.parse("sum Sales and Tax in Sheet1", self.metadata)
+        self.assertEqual(params, {"operation": "summation", "columns": ["Sales", "Tax"], "sheets": ["Sheet1"],
+                                  "parameters": {}})
+
+    def test_average_by_group_infers_sheet(self):
+        params = self.parser.parse("average Salary by Department", self.metadata)
+        self.assertEqual(params, {"operation": "avg", "columns": ["Salary"], "sheets": ["Employees"],
+                                  "parameters": {"group_by": "Department"}})
+
+    def test_fuzzy_column_names(self):
+        params = self.parser.parse("Find the maximum salry per department", self.metadata)
+        self.assertEqual(params["operation"], "max")
+        self.assertEqual(params["columns"], ["Salary"])
+        self.assertEqual(params["parameters"], {"group_by": "Department"})
+
+    def test_join_on_column(self):
+        params = self.parser.parse("inner join Orders and Customers on Customer ID", self.metadata)
+        self.assertEqual(params, {"operation": "inner_join", "columns": ["Customer ID"],
+                                  "sheets": ["Orders", "Customers"], "parameters": {"on": "Customer ID"}})
+
+    def test_join_infers_common_column(self):
+        params = self.parser.parse("left join Orders with Customers", self.metadata)
+        self.assertEqual(params["parameters"], {"on": "Customer ID"})
+
+    def test_subtraction_order(self):
+        params = self.parser.parse("subtract Tax from Sales", self.metadata)
+        self.assertEqual(params["columns"], ["Sales", "Tax"])
+
+    def test_fast_sentiment_uses_lexicon(self):
+        params = self.parser.parse("fast sentiment analysis of Feedback", self.metadata)
+        self.assertEqual(params, {"operation": "sentiment_analysis", "columns": ["Feedback"], "sheets": ["Reviews"],
+                                  "parameters": {"backend": "lexicon"}})
+        self.assertEqual(self.parser.parse("sentiment of Feedback", self.metadata)["parameters"], {})
+        self.assertIsNone(self.parser.parse("fast sum of Sales", self.metadata))
+        self.assertEqual(self.parser.parse("quick summary of Feedback", self.metadata)["parameters"],
+                         {"backend": "extractive"})
+
+    def test_nlp_per_group(self):
+        params = self.parser.parse("summarize Feedback per Rating", self.metadata)
+        self.assertEqual(params, {"operation": "summarization", "columns": ["Feedback"], "sheets": ["Reviews"],
+                                  "parameters": {"on": "Rating"}})
+
+    def test_short_column_names_match_case(self):
+        metadata = {"Sheet1": ["A", "B"]}
+        self.assertEqual(self.parser.parse("Sum column A and column B", metadata)["columns"], ["A", "B"])
+        self.assertEqual(self.parser.parse("calculate a sum of B", metadata)["columns"], ["B"])
+
+    def test_not_confident(self):
+        for instructions in ["sum Sales where Region is East", "add 5 to Sales", "average Salary and Tax",
+                             "sum Sales by Region", "sum and average Sales", "pivot Sales by Region",
+                             "join Orders and Customers"]:
+            self.assertIsNone(self.parser.parse(instructions, self.metadata), instructions)
+        self.assertEqual(self.parser.stats()["fallbacks"], 7)
+
+    def test_name_of_both_sheet_and_column_is_ambiguous(self):
+        self.assertIsNone(self.parser.parse("sum Sales", {"Sales": ["Sales"]}))
@@ -0,0 +1,124 @@
+from unittest.mock import patch
+
+from aiohttp import web
+
+from core.event_loop import EventLoopThread
+from core.llm_client import GeminiClient
+from core.llm_scheduler import LLMScheduler
+from custom_exceptions import LLMUnavailable
+from tests import BaseTest
+
+
+class TestGeminiClient(BaseTest):
+    @patch("core.llm_client.genai")
+    def test_sdk_configured_once(self, mock_genai):
+        mock_genai.GenerativeModel.return_value.generate_content.return_value.text = '{"operation": "avg"}'
+        client = GeminiClient(model_name="test-model")
+
+        for _ in range(3):
+            self.assertEqual(client.generate("system prompt", "average of A", {"temperature": 0}),
+                             '{"operation": "avg"}')
+
+        mock_genai.configure.assert_called_once()
+        mock_genai.GenerativeModel.assert_called_with("test-model", generation_config={"temperature": 0},
+                                                      system_instruction="system prompt")
+
+    @patch.dict("os.environ", {"GEMINI_FLASH_API_KEY": "secret"})
+    def test_api_key_is_sent_as_header(self):
+        client = GeminiClient(model_name="test-model")
+        self.assertNotIn("secret", client.api_url)
+        self.assertTrue(client.api_url.endswith("/test-model:generateContent"))
+        self.assertEqual(client.headers["x-goog-api-key"], "secret")
+
+    def test_api_key_set_after_import_is_used(self):
+        client = GeminiClient(model_name="test-model")
+        with patch.dict("os.environ", {"GEMINI_FLASH_API_KEY": "loaded-later"}):
+            self.assertEqual(client.headers["x-goog-api-key"], "loaded-later")
+
+    def test_session_pooled_across_runs(self):
+        loop_thread = EventLoopThread()
+        self.addCleanup(loop_thread.stop)
+        client = GeminiClient(model_name="test-model", loop_thread=loop_thread)
+
+        async def call_server():
+            app = web.Application()
+            app.router.add_post("/generate", lambda request: web.json_response({"candidates": []}))
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            try:
+                session = client.session()
+                for _ in range(3):
+                    async with client.session().post(f"http://127.0.0.1:{port}/generate", json={}) as response:
+                        await response.json()
+                self.assertIs(client.session(), session)
+                return session
+            finally:
+                await runner.cleanup()
+
+        session = client.run(call_server())
+        self.assertIs(client.run(call_server()), session)
+        self.assertFalse(session.closed)
+
+        stats = client.stats()
+        self.assertEqual(stats["sessions_opened"], 1)
+        self.assertEqual(stats["requests"], 6)
+        self.assertEqual(stats["connections_created"], 2)
+        self.assertEqual(stats["connections_reused"], 4)
+
+        client.close()
+        self.assertTrue(session.closed)
+
+    @staticmethod
+    def generate_with(client: GeminiClient, generate):
+        """Calls generate_content against a local server answering with the generate handler."""
+        async def call_server():
+            app = web.Application()
+            app.router.add_post("/generate", generate)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            client.api_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/generate"
+            try:
+                return await client.generate_content({"contents": [{"parts": [{"text": "hello"}]}]})
+            finally:
+                await runner.cleanup()
+
+        return client.run(call_server())
+
+    def test_rate_limited_call_is_retried(self):
+        scheduler = LLMScheduler(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0, max_retries=1,
+                                 base_delay=0, max_delay=0)
+        client = GeminiClient(model_name="test-model", scheduler=scheduler)
+        statuses = [429, 200]
+
+        async def generate(request):
+            return web.json_response({"candidates": []}, status=statuses.pop(0))
+
+        self.assertEqual(self.generate_with(client, generate), {"candidates": []})
+        self.assertEqual(scheduler.stats()["retries"], 1)
+
+    def test_rejected_call_raises_without_retry(self):
+        scheduler = LLMScheduler(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0, max_retries=3,
+                                 base_delay=0, max_delay=0)
+        client = GeminiClient(model_name="test-model", scheduler=scheduler)
+
+        async def generate(request):
+            return web.json_response({"error": {"message": "API key not valid"}}, status=400)
+
+        with self.assertRaises(LLMUnavailable) as context:
+            self.generate_with(client, generate)
+        self.assertIn("HTTP 400", context.exception.message)
+        self.assertEqual(scheduler.stats()["retries"], 0)
+
+    def test_unreadable_response_raises(self):
+        client = GeminiClient(model_name="test-model")
+
+        async def generate(request):
+            return web.Response(text="<html>Bad gateway</html>", content_type="text/html")
+
+        with self.assertRaises(LLMUnavailable):
+            self.generate_with(client, generate)
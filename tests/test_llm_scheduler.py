@@ -0,0 +1,83 @@
+import asyncio
+from unittest.mock import patch
+
+from core.llm_scheduler import LLMScheduler, RetryableError, TokenBucket
+from custom_exceptions import LLMUnavailable
+from tests import BaseTest
+
+
+class TestTokenBucket(BaseTest):
+    def test_reservations_beyond_capacity_wait_for_refill(self):
+        bucket = TokenBucket(per_minute=60)
+        self.assertEqual(bucket.reserve(60), 0.0)
+        self.assertAlmostEqual(bucket.reserve(3), 3.0, delta=0.1)
+        self.assertAlmostEqual(bucket.reserve(1), 4.0, delta=0.1)
+
+    def test_unlimited_bucket_never_waits(self):
+        bucket = TokenBucket(per_minute=0)
+        self.assertEqual(bucket.reserve(10 ** 9), 0.0)
+
+
+class TestLLMScheduler(BaseTest):
+    def setUp(self):
+        self.scheduler = LLMScheduler(max_concurrency=2, requests_per_minute=0, tokens_per_minute=0, max_retries=2,
+                                      base_delay=0, max_delay=0)
+
+    def test_retryable_errors_are_retried(self):
+        attempts = []
+
+        async def call():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RetryableError("HTTP 429")
+            return "ok"
+
+        self.assertEqual(asyncio.run(self.scheduler.run(call, tokens=10)), "ok")
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.scheduler.stats()["retries"], 2)
+
+    def test_failure_after_retries_raises(self):
+        async def call():
+            raise RetryableError("HTTP 503")
+
+        with self.assertRaises(LLMUnavailable):
+            asyncio.run(self.scheduler.run(call))
+        self.assertEqual(self.scheduler.stats()["calls"], 3)
+        self.assertEqual(self.scheduler.stats()["failures"], 1)
+
+    def test_other_errors_are_not_retried(self):
+        async def call():
+            raise ValueError("bad response")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(self.scheduler.run(call))
+        self.assertEqual(self.scheduler.stats()["calls"], 1)
+
+    @patch("core.llm_scheduler.asyncio.sleep")
+    def test_retry_after_is_honoured(self, mock_sleep):
+        attempts = []
+
+        async def call():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RetryableError("HTTP 429", retry_after=7)
+            return "ok"
+
+        asyncio.run(self.scheduler.run(call))
+        mock_sleep.assert_called_once_with(7)
+
+    def test_concurrency_is_bounded(self):
+        running, peak = [0], [0]
+
+        async def call():
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+
+        async def run_all():
+            await asyncio.gather(*(self.scheduler.run(call) for _ in range(6)))
+
+        asyncio.run(run_all())
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(self.scheduler.stats()["in_flight"], 0)
@@ -272,6 +272,12 @@ class TestAvgMethod(BaseTest):
         with self.assertRaises(InvalidColumn):
             self.executor.avg(self.df, columns=['Nonexistent'], group_by='Region')
 
+    def test_execute_avg_with_group_by(self):
+        metadata = {'operation': 'avg', 'columns': ['Sales'], 'parameters': {'group_by': 'Region'}}
+        result = self.executor.execute(self.df, metadata)
+        expected_df = pd.DataFrame({'Region': ['East', 'West'], 'avg_of_Sales': [200.0, 300.0]})
+        pd.testing.assert_frame_equal(result, expected_df)
+
     def test_avg_without_group_by(self):
         result = self.executor.avg(self.df, columns=['Sales'])
         expected_data = {'avg_of_Sales': [250.0]}
@@ -1,9 +1,13 @@
-from unittest.mock import patch, AsyncMock
+import asyncio
+import json
+from unittest.mock import patch, AsyncMock, MagicMock
 
 import pandas as pd
 
 from core import NLPTaskExecutor
-from custom_exceptions import EmptyColumnException
+from core.nlp_processor import GroupSummarizer, Summarizer, TextClassifier, split_text
+from core.sentiment_cache import SentimentCache
+from custom_exceptions import EmptyColumnException, InvalidColumn, InvalidParameters, LLMUnavailable
 from tests import BaseTest
 
 
@@ -55,3 +59,241 @@ class TestNLPTaskExecutor(BaseTest):
         empty_df = pd.DataFrame(columns=['Text'])
         with self.assertRaises(EmptyColumnException):
             self.executor.summarization(empty_df, 'Text')
+
+
+class TestChunking(BaseTest):
+    def test_short_texts_share_a_chunk(self):
+        summarizer = Summarizer(chunk_size=1000, token_budget=100)
+        chunks = summarizer.chunk_data(["short text"] * 30)
+        self.assertEqual([len(chunk) for chunk in chunks], [9, 9, 9, 3])
+
+    def test_chunks_fit_output_limit(self):
+        classifier = TextClassifier(chunk_size=1000, token_budget=10000, max_output_tokens=40)
+        chunks = classifier.chunk_data([(index, "x" * 80) for index in range(20)])
+        self.assertEqual([len(chunk) for chunk in chunks], [5, 5, 5, 5])
+
+    def test_long_text_is_split(self):
+        summarizer = Summarizer(chunk_size=1000, token_budget=58)
+        chunks = summarizer.chunk_data(["word " * 100])
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(all(len(chunk[0]) <= 200 for chunk in chunks))
+        self.assertEqual(" ".join(piece for chunk in chunks for piece in chunk).split(), ["word"] * 100)
+
+    def test_split_text_without_whitespace(self):
+        self.assertEqual(split_text("a" * 10, 1), ["aaaa", "aaaa", "aa"])
+
+    def test_pieces_of_split_text_are_merged(self):
+        client = MagicMock()
+        client.run.side_effect = asyncio.run
+
+        async def generate_content(payload):
+            items = [part["text"].split(": ", 1) for part in payload["contents"][0]["parts"][1:]]
+            sentiments = {index: "Negative" if "bad" in text else "Positive" for index, text in items}
+            return {"candidates": [{"content": {"parts": [{"text": json.dumps(sentiments)}]}}]}
+
+        client.generate_content.side_effect = generate_content
+        classifier = TextClassifier(client=client, chunk_size=1000, token_budget=44)
+        long_text = "good " * 100 + "bad " * 5
+
+        sentiments = classifier.classify([(3, "fine"), (7, long_text)])
+
+        self.assertEqual(client.generate_content.call_count, 5)
+        self.assertEqual(sentiments, {3: "Positive", 7: "Positive"})
+
+    def test_response_maps_indexes_to_sentiments(self):
+        client = MagicMock()
+        client.run.side_effect = asyncio.run
+        client.generate_content = AsyncMock(return_value={"candidates": [{"content": {"parts": [
+            {"text": '```json\n{"0": "Negative", "1": "Unsure", "2": "Positive"}\n```'}]}}]})
+        classifier = TextClassifier(client=client)
+
+        sentiments = classifier.classify([(10, "awful"), (11, "hmm"), (12, "great")])
+
+        self.assertEqual(sentiments, {10: "Negative", 12: "Positive"})
+        parts = client.generate_content.call_args.args[0]["contents"][0]["parts"]
+        self.assertEqual([part["text"] for part in parts[1:]], ["0: awful", "1: hmm", "2: great"])
+
+
+class TestSentimentDeduplication(BaseTest):
+    def setUp(self):
+        self.cache = SentimentCache(max_entries=100)
+        self.executor = NLPTaskExecutor(sentiment_labels=self.cache)
+
+    @patch('core.nlp_processor.TextClassifier.classify')
+    def test_distinct_texts_are_classified_once(self, mock_classify):
+        mock_classify.side_effect = lambda data_list: {
+            index: 'Positive' if text == 'Good' else 'Neutral' for index, text in data_list}
+        df = pd.DataFrame({'Text': ['Good', 'N/A', ' good ', None, 'Good', 'n/a']})
+
+        result_df = self.executor.sentiment_analysis(df, 'Text')
+
+        mock_classify.assert_called_once_with([(0, 'Good'), (1, 'N/A')])
+        self.assertListEqual(result_df['Classified_Text'].tolist(),
+                             ['Positive', 'Neutral', 'Positive', 'Unclassified', 'Positive', 'Neutral'])
+
+    @patch('core.nlp_processor.TextClassifier.classify')
+    def test_cached_labels_skip_the_model(self, mock_classify):
+        self.cache.put_many({'Good': 'Positive', 'Bad': 'Negative'})
+        df = pd.DataFrame({'Text': ['bad', 'Good']})
+
+        result_df = self.executor.sentiment_analysis(df, 'Text')
+
+        mock_classify.assert_not_called()
+        self.assertListEqual(result_df['Classified_Text'].tolist(), ['Negative', 'Positive'])
+
+    @patch('core.nlp_processor.TextClassifier.classify')
+    def test_lexicon_backend_skips_the_model(self, mock_classify):
+        df = pd.DataFrame({'Text': ['Great service', 'awful food', 'Great service', None]})
+
+        result_df = self.executor.execute(df, {'operation': 'sentiment_analysis', 'columns': ['Text'],
+                                               'parameters': {'backend': 'lexicon'}})
+
+        mock_classify.assert_not_called()
+        self.assertListEqual(result_df['Classified_Text'].tolist(),
+                             ['Positive', 'Negative', 'Positive', 'Unclassified'])
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    @patch('core.nlp_processor.SENTIMENT_LEXICON_FALLBACK', True)
+    @patch('core.nlp_processor.TextClassifier.classify', side_effect=LLMUnavailable())
+    def test_lexicon_fallback_when_llm_unavailable(self, mock_classify):
+        result_df = self.executor.sentiment_analysis(pd.DataFrame({'Text': ['terrible']}), 'Text')
+        self.assertListEqual(result_df['Classified_Text'].tolist(), ['Negative'])
+
+    @patch('core.nlp_processor.TextClassifier.classify', side_effect=LLMUnavailable())
+    def test_llm_unavailable_without_fallback(self, mock_classify):
+        with self.assertRaises(LLMUnavailable):
+            self.executor.sentiment_analysis(pd.DataFrame({'Text': ['terrible']}), 'Text')
+
+    def test_unknown_backend(self):
+        with self.assertRaises(InvalidParameters):
+            self.executor.sentiment_analysis(pd.DataFrame({'Text': ['fine']}), 'Text', backend='magic')
+
+
+class TestSummarizationBackends(BaseTest):
+    @patch('core.nlp_processor.Summarizer.summarize')
+    def test_extractive_backend_skips_the_model(self, mock_summarize):
+        executor = NLPTaskExecutor()
+        df = pd.DataFrame({'Text': ['Good phone.', 'Bad battery.', None]})
+
+        result_df = executor.execute(df, {'operation': 'summarization', 'columns': ['Text'],
+                                          'parameters': {'backend': 'extractive'}})
+
+        mock_summarize.assert_not_called()
+        self.assertEqual(result_df['Summarized_Text'].tolist()[0], 'Good phone. Bad battery.')
+
+    def test_unknown_backend(self):
+        with self.assertRaises(InvalidParameters):
+            NLPTaskExecutor().summarization(pd.DataFrame({'Text': ['fine']}), 'Text', backend='magic')
+
+
+class TestSummarizationTree(BaseTest):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.run.side_effect = asyncio.run
+        self.calls = []
+
+        async def generate_content(payload):
+            parts = [part["text"] for part in payload["contents"][0]["parts"]]
+            self.calls.append(parts)
+            return {"candidates": [{"content": {"parts": [{"text": f"summary of {len(parts) - 1}"}]}}]}
+
+        self.client.generate_content.side_effect = generate_content
+
+    def test_summaries_are_merged_level_by_level(self):
+        summarizer = Summarizer(client=self.client, chunk_size=5, fan_in=3)
+
+        summary = summarizer.summarize([f"text {index}" for index in range(50)])
+
+        self.assertEqual(summary, ["summary of 2"])
+        # 10 chunk summaries merged into 4, then 2, then 1
+        self.assertEqual(len(self.calls), 10 + 4 + 2 + 1)
+        self.assertEqual(sum(parts[0].startswith("Combine") for parts in self.calls), 7)
+
+    def test_single_chunk_needs_one_call(self):
+        summarizer = Summarizer(client=self.client, chunk_size=5, fan_in=3)
+        self.assertEqual(summarizer.summarize(["first text", "second text"]), ["summary of 2"])
+        self.assertEqual(len(self.calls), 1)
+
+
+class TestGroupwiseNLP(BaseTest):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'Product': ['Phone', 'Laptop', 'Phone', 'Tablet', 'Laptop', None],
+            'Review': ['Great screen', 'Too heavy', 'Awful battery', 'Fine', None, 'Orphan review'],
+        })
+
+    def test_groups_are_packed_into_shared_requests(self):
+        client = MagicMock()
+        client.run.side_effect = asyncio.run
+        calls = []
+
+        async def generate_content(payload):
+            parts = [part["text"] for part in payload["contents"][0]["parts"][1:]]
+            calls.append(parts)
+            summaries = {part.split(":")[0].split()[1]: f"{len(part.splitlines()) - 1} texts" for part in parts}
+            return {"candidates": [{"content": {"parts": [{"text": json.dumps(summaries)}]}}]}
+
+        client.generate_content.side_effect = generate_content
+        summarizer = GroupSummarizer(Summarizer(client=client), client=client)
+
+        summaries = summarizer.summarize_groups([["Great screen", "Awful battery"], ["Too heavy"], ["Fine"]])
+
+        self.assertEqual(summaries, ["2 texts", "1 texts", "1 texts"])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][0], "Group 0:\nGreat screen\nAwful battery")
+
+    def test_large_and_skipped_groups_are_summarized_alone(self):
+        client = MagicMock()
+        client.run.side_effect = asyncio.run
+
+        async def generate_content(payload):
+            if payload["generationConfig"].get("responseMimeType"):
+                text = json.dumps({"0": "packed"})
+            else:
+                text = "alone"
+            return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+        client.generate_content.side_effect = generate_content
+        summarizer = GroupSummarizer(Summarizer(client=client, token_budget=100), client=client, token_budget=100)
+
+        summaries = summarizer.summarize_groups([["short"], ["word " * 200], ["skipped"]])
+
+        self.assertEqual(summaries, ["packed", "alone", "alone"])
+
+    @patch('core.nlp_processor.GroupSummarizer.summarize_groups')
+    def test_summarization_per_group(self, mock_summarize_groups):
+        mock_summarize_groups.side_effect = lambda groups: [f"{len(texts)} reviews" for texts in groups]
+
+        result_df = NLPTaskExecutor().execute(self.df, {'operation': 'summarization', 'columns': ['Review'],
+                                                        'parameters': {'on': 'Product'}})
+
+        mock_summarize_groups.assert_called_once_with([['Great screen', 'Awful battery'], ['Too heavy'], ['Fine']])
+        pd.testing.assert_frame_equal(result_df, pd.DataFrame({
+            'Product': ['Phone', 'Laptop', 'Tablet'],
+            'Summarized_Review': ['2 reviews', '1 reviews', '1 reviews']}))
+
+    def test_sentiment_per_group(self):
+        executor = NLPTaskExecutor(sentiment_labels=SentimentCache(max_entries=10))
+
+        result_df = executor.sentiment_analysis(self.df, 'Review', backend='lexicon', on='Product')
+
+        pd.testing.assert_frame_equal(result_df, pd.DataFrame({
+            'Product': ['Phone', 'Laptop', 'Tablet'], 'Positive': [1, 0, 1], 'Negative': [1, 0, 0],
+            'Neutral': [0, 1, 0], 'Classified_Review': ['Neutral', 'Neutral', 'Positive']}))
+
+    def test_sentiment_per_group_keeps_groups_without_classified_texts(self):
+        df = pd.DataFrame({'Product': ['Phone', 'Watch', 'Watch'], 'Review': ['Great screen', None, '  ']})
+        executor = NLPTaskExecutor(sentiment_labels=SentimentCache(max_entries=10))
+
+        result_df = executor.sentiment_analysis(df, 'Review', backend='lexicon', on='Product')
+
+        self.assertListEqual(result_df['Product'].tolist(), ['Phone', 'Watch'])
+        self.assertListEqual(result_df['Classified_Review'].tolist(), ['Positive', 'Unclassified'])
+
+    def test_summarization_per_group_of_itself(self):
+        with self.assertRaises(InvalidParameters):
+            NLPTaskExecutor().summarization(self.df, 'Review', on='Review')
+
+    def test_unknown_group_column(self):
+        with self.assertRaises(InvalidColumn):
+            NLPTaskExecutor().summarization(self.df, 'Review', on='Brand')
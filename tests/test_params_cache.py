@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from core.params_cache import ParamsCache
+from tests import BaseTest
+
+
+class TestParamsCache(BaseTest):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.metadata = {"Sheet1": ["A", "B"]}
+        self.params = {"operation": "avg", "columns": ["A"], "sheets": ["Sheet1"], "parameters": {}}
+
+    def test_key_depends_on_instruction_and_schema(self):
+        key = ParamsCache.key_for("Average of A", self.metadata)
+        self.assertEqual(key, ParamsCache.key_for(" Average  of A\n", self.metadata))
+        self.assertNotEqual(key, ParamsCache.key_for("average of a", self.metadata))
+        self.assertNotEqual(key, ParamsCache.key_for("Average of A", {"Sheet1": ["A", "C"]}))
+
+    def test_cached_params_are_copies(self):
+        cache = ParamsCache(max_entries=10, ttl=60)
+        cache.put("Average of A", self.metadata, self.params)
+        cache.get("Average of A", self.metadata)["columns"].append("B")
+
+        self.assertEqual(cache.get("Average of A", self.metadata), self.params)
+        self.assertIsNone(cache.get("Average of B", self.metadata))
+        self.assertEqual(cache.stats()["hit_rate"], 2 / 3)
+
+    def test_entries_expire(self):
+        cache = ParamsCache(max_entries=10, ttl=60)
+        with patch("core.params_cache.time.time", return_value=1000):
+            cache.put("Average of A", self.metadata, self.params)
+        with patch("core.params_cache.time.time", return_value=1061):
+            self.assertIsNone(cache.get("Average of A", self.metadata))
+
+    def test_lru_eviction(self):
+        cache = ParamsCache(max_entries=2, ttl=60)
+        for instructions in ["first", "second"]:
+            cache.put(instructions, self.metadata, self.params)
+        cache.get("first", self.metadata)
+        cache.put("third", self.metadata, self.params)
+
+        self.assertIsNone(cache.get("second", self.metadata))
+        self.assertIsNotNone(cache.get("first", self.metadata))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_disk_backend_survives_restart(self):
+        path = os.path.join(self.directory.name, "params.sqlite")
+        ParamsCache(max_entries=10, ttl=60, path=path).put("Average of A", self.metadata, self.params)
+
+        restarted_cache = ParamsCache(max_entries=10, ttl=60, path=path)
+        self.assertEqual(restarted_cache.get("Average of A", self.metadata), self.params)
+        self.assertEqual(restarted_cache.stats()["disk_hits"], 1)
+
+    def test_expired_entry_with_locked_database_is_a_miss(self):
+        path = os.path.join(self.directory.name, "params.sqlite")
+        cache = ParamsCache(max_entries=10, ttl=60, path=path)
+        with patch("core.params_cache.time.time", return_value=1000):
+            cache.put("Average of A", self.metadata, self.params)
+        cache._db._db = MagicMock()
+        cache._db._db.execute.side_effect = sqlite3.OperationalError("database is locked")
+
+        with patch("core.params_cache.time.time", return_value=1061):
+            self.assertIsNone(cache.get("Average of A", self.metadata))
+        self.assertEqual(cache.stats()["entries"], 0)
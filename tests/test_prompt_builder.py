@@ -0,0 +1,36 @@
+import json
+
+from core.prompt_builder import build_extraction_prompt
+from tests import BaseTest
+
+
+def rendered_metadata(prompt: str) -> str:
+    return prompt[prompt.index('<EXCEL_METADATA>') + len('<EXCEL_METADATA>'):prompt.index('</EXCEL_METADATA>')].strip()
+
+
+class TestBuildExtractionPrompt(BaseTest):
+    def test_small_workbook_shown_with_dtype_hints(self):
+        metadata = {"Sales": ["Product", "Revenue", "Date"]}
+        schema = {"Sales": {"columns": ["Product", "Revenue", "Date"],
+                            "dtypes": ["object", "float64", "datetime64[ns]"], "rows": 10}}
+        prompt, tokens = build_extraction_prompt("total revenue", metadata, schema)
+
+        self.assertEqual(json.loads(rendered_metadata(prompt)),
+                         {"Sales": {"Product": "text", "Revenue": "float", "Date": "date"}})
+        self.assertIn("<USER_QUERY>\ntotal revenue\n</USER_QUERY>", prompt)
+        self.assertEqual(tokens, -(-len(prompt) // 4))
+
+    def test_without_schema_columns_are_listed(self):
+        prompt, _ = build_extraction_prompt("total revenue", {"Sales": ["Product", "Revenue"]})
+        self.assertEqual(json.loads(rendered_metadata(prompt)), {"Sales": ["Product", "Revenue"]})
+
+    def test_wide_workbook_keeps_relevant_columns_within_budget(self):
+        metadata = {"Wide": [f"Metric {index}" for index in range(3000)] + ["Revenue", "Region"], "Other": ["Name"]}
+        prompt, tokens = build_extraction_prompt("total Revnue by Region", metadata, token_budget=4000)
+
+        self.assertLessEqual(tokens, 4000)
+        rendered, *notes = rendered_metadata(prompt).split('\n')
+        sheets = json.loads(rendered)
+        self.assertListEqual(sheets["Wide"][-2:], ["Revenue", "Region"])
+        self.assertIn("Other", sheets)
+        self.assertIn(f'{3002 - len(sheets["Wide"])} less relevant columns of "Wide" are not shown.', notes)
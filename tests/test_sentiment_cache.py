@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+from core.sentiment_cache import SentimentCache, normalize_text
+from tests import BaseTest
+
+
+class TestSentimentCache(BaseTest):
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("  Very   good\n"), "Very good")
+        self.assertIsNone(normalize_text("   "))
+        self.assertIsNone(normalize_text(float("nan")))
+        self.assertEqual(normalize_text(5), "5")
+
+    def test_labels_ignore_case(self):
+        cache = SentimentCache(max_entries=10)
+        cache.put_many({"Good": "Positive"})
+        self.assertEqual(cache.get_many(["good", "Bad"]), {"good": "Positive"})
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_least_recently_used_labels_are_evicted(self):
+        cache = SentimentCache(max_entries=2)
+        cache.put_many({"a": "Positive", "b": "Negative"})
+        cache.get_many(["a"])
+        cache.put_many({"c": "Neutral"})
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": "Positive", "c": "Neutral"})
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_labels_survive_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sentiments.db")
+            SentimentCache(max_entries=10, path=path).put_many({"N/A": "Neutral"})
+
+            cache = SentimentCache(max_entries=10, path=path)
+            self.assertEqual(cache.get_many(["n/a"]), {"n/a": "Neutral"})
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+
+    def test_labels_are_per_model(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sentiments.db")
+            SentimentCache(max_entries=10, path=path, model_name="model-a").put_many({"Good": "Positive"})
+            self.assertEqual(SentimentCache(max_entries=10, path=path, model_name="model-b").get_many(["Good"]), {})
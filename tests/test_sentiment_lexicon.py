@@ -0,0 +1,27 @@
+import pandas as pd
+
+from core.sentiment_lexicon import LexiconClassifier
+from tests import BaseTest
+
+
+class TestLexiconClassifier(BaseTest):
+    def setUp(self):
+        self.classifier = LexiconClassifier()
+
+    def test_classify_texts(self):
+        texts = pd.Series(["I love this product!", "The service was terrible.", "It is a table.",
+                           "Not good at all", "not bad", "Really great, but a bit slow", None],
+                          index=[10, 11, 12, 13, 14, 15, 16])
+        labels = self.classifier.classify_texts(texts)
+        self.assertListEqual(labels.index.tolist(), [10, 11, 12, 13, 14, 15, 16])
+        self.assertListEqual(labels.tolist(), ["Positive", "Negative", "Neutral", "Negative", "Positive",
+                                               "Positive", "Neutral"])
+
+    def test_negation_is_limited_to_its_text(self):
+        labels = self.classifier.classify_texts(pd.Series(["not", "good"]))
+        self.assertListEqual(labels.tolist(), ["Neutral", "Positive"])
+
+    def test_labels_keep_the_index_of_the_texts(self):
+        labels = self.classifier.classify_texts(pd.Series(["awful", "excellent"], index=[3, 5]))
+        self.assertEqual(labels.to_dict(), {3: "Negative", 5: "Positive"})
+        self.assertTrue(self.classifier.classify_texts(pd.Series([], dtype=object)).empty)
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import time
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+
+from core.sessions import WorkbookSessionStore
+from custom_exceptions import WorkbookNotFound, InvalidFile, SessionsUnavailable
+from tests import BaseTest
+
+
+class TestWorkbookSessionStore(BaseTest):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = WorkbookSessionStore(idle_timeout=60, memory_budget=10 ** 8, directory=self.directory.name)
+        self.excel_data = BytesIO()
+        with pd.ExcelWriter(self.excel_data, engine='openpyxl') as writer:
+            pd.DataFrame({"A": [1, 2], "B": [3, 4]}).to_excel(writer, sheet_name="Sheet1", index=False)
+        self.excel_data.seek(0)
+
+    def test_create_parses_sheets_once(self):
+        session, metadata = self.store.create(self.excel_data)
+        self.assertEqual(metadata, {"Sheet1": ["A", "B"]})
+
+        with patch("core.workbook.pd.read_excel") as mock_read_excel:
+            workbook = self.store.get(session.workbook_id).open_workbook()
+            df = workbook.get_sheet("Sheet1")
+            workbook.close()
+        mock_read_excel.assert_not_called()
+        self.assertListEqual(df["A"].tolist(), [1, 2])
+
+    def test_instructions_do_not_see_each_other_changes(self):
+        session, _ = self.store.create(self.excel_data)
+        first = session.open_workbook()
+        first.get_sheet("Sheet1")["C"] = 0
+        first.close()
+
+        second = session.open_workbook()
+        self.assertListEqual(list(second.get_sheet("Sheet1").columns), ["A", "B"])
+        second.close()
+
+    def test_invalid_file(self):
+        with self.assertRaises(InvalidFile):
+            self.store.create(BytesIO(b"not an excel file"))
+
+    def test_delete(self):
+        session, _ = self.store.create(self.excel_data)
+        self.store.delete(session.workbook_id)
+        with self.assertRaises(WorkbookNotFound):
+            self.store.get(session.workbook_id)
+
+    def test_idle_sessions_expire(self):
+        session, _ = self.store.create(self.excel_data)
+        session.last_access = time.monotonic() - 120
+        other, _ = self.store.create(BytesIO(self.excel_data.getvalue()))
+
+        with self.assertRaises(WorkbookNotFound):
+            self.store.get(session.workbook_id)
+        self.assertEqual(self.store.get(other.workbook_id), other)
+
+    def test_least_recently_used_sessions_evicted_under_memory_pressure(self):
+        self.store.memory_budget = 1
+        first, _ = self.store.create(self.excel_data)
+        second, _ = self.store.create(BytesIO(self.excel_data.getvalue()))
+
+        with self.assertRaises(WorkbookNotFound):
+            self.store.get(first.workbook_id)
+        self.assertEqual(self.store.get(second.workbook_id), second)
+        self.assertEqual(self.store.stats()["evictions"], 1)
+
+    def test_session_evicted_while_in_use_is_not_found(self):
+        session, _ = self.store.create(self.excel_data)
+        self.store.delete(session.workbook_id)
+
+        with self.assertRaises(WorkbookNotFound):
+            session.open_workbook()
+
+    def test_reap_drops_idle_sessions(self):
+        session, _ = self.store.create(self.excel_data)
+        session.last_access = time.monotonic() - 120
+
+        self.store.reap()
+
+        self.assertEqual(self.store.stats()["sessions"], 0)
+        self.assertFalse(os.path.exists(session.path))
+
+    def test_shared_directory_is_refused(self):
+        os.chmod(self.directory.name, 0o777)
+
+        with self.assertRaises(SessionsUnavailable):
+            self.store.create(self.excel_data)
+        self.assertListEqual(os.listdir(self.directory.name), [])
+
+    def test_new_directory_is_private(self):
+        directory = os.path.join(self.directory.name, "sessions")
+        store = WorkbookSessionStore(idle_timeout=60, memory_budget=10 ** 8, directory=directory)
+        store.create(self.excel_data)
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+    def tearDown(self):
+        self.directory.cleanup()
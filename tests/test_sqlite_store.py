@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import tempfile
+from unittest.mock import MagicMock
+
+from core.sqlite_store import SQLiteStore
+from tests import BaseTest
+
+
+class TestSQLiteStore(BaseTest):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "cache", "store.sqlite")
+
+    def test_entries_survive_restart(self):
+        SQLiteStore(self.path, 'entries', 10, 'entries').write({"a": "1", "b": "2"}, created=100)
+
+        stored = SQLiteStore(self.path, 'entries', 10, 'entries').read(["a", "b", "c"])
+        self.assertEqual(stored, {"a": (100, "1"), "b": (100, "2")})
+
+    def test_least_recently_used_and_expired_entries_are_deleted(self):
+        store = SQLiteStore(self.path, 'entries', 3, 'entries')
+        store.write({"old": "0"}, created=1)
+        store.write({"a": "1"}, created=100)
+        store.write({"b": "2"}, created=101)
+        store.read(["a"])
+
+        self.assertEqual(store.write({"c": "3", "d": "4"}, created=102, expired_before=50), 2)
+        self.assertEqual(set(store.read(["old", "a", "b", "c", "d"])), {"a", "c", "d"})
+
+    def test_database_errors_are_logged_not_raised(self):
+        store = SQLiteStore(self.path, 'entries', 10, 'entries')
+        store._db = MagicMock()
+        store._db.execute.side_effect = sqlite3.OperationalError("database is locked")
+        store._db.executemany.side_effect = sqlite3.OperationalError("database is locked")
+
+        self.assertEqual(store.read(["a"]), {})
+        self.assertEqual(store.write({"a": "1"}), 0)
+        store.delete(["a"])
+
+    def test_unusable_path_keeps_nothing(self):
+        blocker = os.path.join(self.directory.name, "file")
+        open(blocker, "w").close()
+
+        store = SQLiteStore(os.path.join(blocker, "store.sqlite"), 'entries', 10, 'entries')
+        self.assertEqual(store.write({"a": "1"}), 0)
+        self.assertEqual(store.read(["a"]), {})
@@ -1,13 +1,17 @@
 import io
 import json
+import tempfile
 from io import BytesIO
 from unittest.mock import patch
 
 import pandas as pd
+from flask import request
 
+from core.params_cache import ParamsCache
+from core.workbook import Workbook
 from tests import BaseTest
 from tests.mocks.mock_utils import app
-from utils import extract_excel_metadata
+from utils import extract_excel_metadata, open_upload, MappedUpload
 
 
 class TestValidateProcessExcelRequest(BaseTest):
@@ -16,6 +20,9 @@ class TestValidateProcessExcelRequest(BaseTest):
     def setUp(self):
         """Set up Flask test client"""
         self.client = app.test_client()
+        params_cache_patcher = patch("utils.params_cache", ParamsCache(max_entries=10, ttl=60))
+        self.params_cache = params_cache_patcher.start()
+        self.addCleanup(params_cache_patcher.stop)
 
     @patch("utils.extract_params_from_instructions")
     def test_valid_request(self, mock_parse_params_from_instructions):
@@ -35,6 +42,30 @@ class TestValidateProcessExcelRequest(BaseTest):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get_json(), {"message": "Success"})
 
+    @patch("utils.extract_params_from_instructions")
+    def test_repeated_instructions_skip_llm(self, mock_parse_params_from_instructions):
+        """ Test the parameters of a repeated instruction come from the cache"""
+        excel_data = BytesIO()
+        pd.DataFrame({"A": [1, 2], "B": [3, 4]}).to_excel(excel_data, sheet_name="Sheet1", index=False)
+        mock_parse_params_from_instructions.return_value = {"operation": "summation", "columns": ["A", "B"],
+                                                            "sheets": ["Sheet1"]}
+        for instructions in ["Sum the positive values of A and B", "  Sum the positive values of A  and B"]:
+            data = {"file": (BytesIO(excel_data.getvalue()), "test.xlsx"), "instructions": instructions}
+            response = self.client.post("/process_excel", data=data, content_type='multipart/form-data')
+            self.assertEqual(response.status_code, 200)
+        mock_parse_params_from_instructions.assert_called_once()
+        self.assertEqual(self.params_cache.stats()["hits"], 1)
+
+    @patch("utils.extract_params_from_instructions")
+    def test_simple_instructions_skip_llm(self, mock_parse_params_from_instructions):
+        """ Test instructions understood by the local parser are not sent to the LLM"""
+        excel_data = BytesIO()
+        pd.DataFrame({"A": [1, 2], "B": [3, 4]}).to_excel(excel_data, sheet_name="Sheet1", index=False)
+        data = {"file": (BytesIO(excel_data.getvalue()), "test.xlsx"), "instructions": "Sum column A and column B"}
+        response = self.client.post("/process_excel", data=data, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        mock_parse_params_from_instructions.assert_not_called()
+
     def test_missing_file(self):
         """ Test when file is missing"""
         data = {"instructions": "valid instruction"}
@@ -109,6 +140,52 @@ class TestExtractExcelMetadata(BaseTest):
         }
         self.assertEqual(metadata, expected_metadata)
 
+    def test_extract_metadata_from_workbook_reads_headers_only(self):
+        workbook = Workbook(self.excel_data)
+        with patch("core.workbook.pd.read_excel", wraps=pd.read_excel) as mock_read_excel:
+            metadata = extract_excel_metadata(workbook)
+            df = workbook.get_sheet("Sheet1")
+            workbook.get_sheet("Sheet1")
+
+        self.assertEqual(metadata["Sheet1"], ["A", "B", "C"])
+        self.assertListEqual(df["A"].tolist(), [1, 2])
+        self.assertEqual([call.kwargs.get("nrows") for call in mock_read_excel.call_args_list], [None])
+
     def tearDown(self):
         self.excel_data.close()
         self.excel_data = None
+
+
+class TestUploadSpooling(BaseTest):
+    """Tests for spooling uploads to disk"""
+
+    def setUp(self):
+        self.excel_data = BytesIO()
+        pd.DataFrame({"A": [1, 2]}).to_excel(self.excel_data, sheet_name="Sheet1", index=False)
+
+    def test_small_upload_stays_in_memory(self):
+        with app.test_request_context("/process_excel", method="POST",
+                                      data={"file": (BytesIO(self.excel_data.getvalue()), "test.xlsx")}):
+            stream = request.files["file"].stream
+            self.assertFalse(stream._rolled)
+            self.assertIs(open_upload(request.files["file"]), request.files["file"])
+
+    @patch("utils.UPLOAD_SPOOL_MAX_SIZE", 16)
+    def test_large_upload_is_spooled_and_memory_mapped(self):
+        with app.test_request_context("/process_excel", method="POST",
+                                      data={"file": (BytesIO(self.excel_data.getvalue()), "test.xlsx")}):
+            self.assertFalse(hasattr(request.files["file"].stream, "_rolled"))
+            upload = open_upload(request.files["file"])
+            self.assertIsInstance(upload, MappedUpload)
+            workbook = Workbook(upload)
+            self.assertListEqual(workbook.get_sheet("Sheet1")["A"].tolist(), [1, 2])
+            workbook.close()
+            self.assertTrue(upload.closed)
+
+    def test_rolled_spooled_file_is_memory_mapped(self):
+        with tempfile.SpooledTemporaryFile(max_size=1) as stream:
+            stream.write(self.excel_data.getvalue())
+            upload = open_upload(stream)
+            self.assertIsInstance(upload, MappedUpload)
+            self.assertEqual(upload.read(), self.excel_data.getvalue())
+            upload.close()
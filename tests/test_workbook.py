@@ -0,0 +1,59 @@
+import threading
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+
+from core.params_cache import ParamsCache
+from core.workbook import Workbook
+from tests import BaseTest
+from utils import extract_validated_params
+
+
+class TestWorkbookPrefetch(BaseTest):
+    def setUp(self):
+        self.excel_data = BytesIO()
+        with pd.ExcelWriter(self.excel_data, engine='openpyxl') as writer:
+            pd.DataFrame({"A": [1, 2], "B": [3, 4]}).to_excel(writer, sheet_name="Sheet1", index=False)
+            pd.DataFrame({"C": ["x", "y"]}).to_excel(writer, sheet_name="Sheet2", index=False)
+        self.excel_data.seek(0)
+        self.read_threads = []
+        read_excel = pd.read_excel
+
+        def record_thread(*args, **kwargs):
+            self.read_threads.append(threading.current_thread().name)
+            return read_excel(*args, **kwargs)
+
+        patcher = patch("core.workbook.pd.read_excel", side_effect=record_thread)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prefetched_sheet_is_parsed_once_in_background(self):
+        workbook = Workbook(self.excel_data)
+        workbook.prefetch(["Sheet1", "Missing"])
+        df = workbook.get_sheet("Sheet1")
+
+        self.assertListEqual(df["A"].tolist(), [1, 2])
+        self.assertEqual(len(self.read_threads), 1)
+        self.assertTrue(self.read_threads[0].startswith("workbook-prefetch"))
+
+    def test_projection_waits_for_prefetch(self):
+        workbook = Workbook(self.excel_data)
+        workbook.prefetch(["Sheet1"])
+        self.assertListEqual(workbook.get_sheet("Sheet1", ["B"]).columns.tolist(), ["B"])
+        self.assertEqual(len(self.read_threads), 1)
+
+    @patch("utils.extract_params_from_instructions")
+    def test_candidate_sheets_parsed_while_waiting_for_llm(self, mock_extract_params):
+        workbook = Workbook(self.excel_data)
+
+        def slow_llm(*_):
+            threading.Event().wait(0.2)
+            return {"operation": "summation", "columns": ["A", "B"], "sheets": ["Sheet1"]}
+
+        mock_extract_params.side_effect = slow_llm
+        with patch("utils.params_cache", ParamsCache(max_entries=10, ttl=60)):
+            params = extract_validated_params(workbook, "Sum A and B where A is positive")
+        workbook.get_sheet(params["sheets"][0])
+
+        self.assertListEqual([name.startswith("workbook-prefetch") for name in self.read_threads], [True])
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+
+from core.workbook import Workbook
+from core.workbook_cache import WorkbookCache
+from tests import BaseTest
+
+
+def make_excel(sheets: dict[str, pd.DataFrame]) -> BytesIO:
+    excel_data = BytesIO()
+    with pd.ExcelWriter(excel_data, engine='openpyxl') as writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    excel_data.seek(0)
+    return excel_data
+
+
+class TestWorkbookCache(BaseTest):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame({"A": [1, 2], "B": ["x", "y"]})
+        self.excel_data = make_excel({"Sheet1": self.df, "Sheet2": pd.DataFrame({"C": [1.5]})})
+
+    def test_repeat_upload_skips_openpyxl(self):
+        cache = WorkbookCache(memory_budget=10 ** 8)
+        Workbook(self.excel_data, cache=cache).get_sheet("Sheet1")
+
+        with patch("core.workbook.pd.ExcelFile") as mock_excel_file:
+            workbook = Workbook(BytesIO(self.excel_data.getvalue()), cache=cache)
+            df = workbook.get_sheet("Sheet1")
+        mock_excel_file.assert_not_called()
+        self.assertListEqual(workbook.sheet_names, ["Sheet1", "Sheet2"])
+        pd.testing.assert_frame_equal(df, self.df)
+        self.assertEqual(cache.stats()["hits"], 2)
+
+    def test_cached_sheet_is_not_modified_by_callers(self):
+        cache = WorkbookCache(memory_budget=10 ** 8)
+        modified = Workbook(self.excel_data, cache=cache).get_sheet("Sheet1")
+        modified["A"] += 10
+
+        df = Workbook(self.excel_data, cache=cache).get_sheet("Sheet1")
+        self.assertListEqual(df["A"].tolist(), [1, 2])
+
+    def test_disk_tier_survives_memory_eviction(self):
+        cache = WorkbookCache(memory_budget=10 ** 8, disk_budget=10 ** 8, directory=self.directory.name)
+        workbook = Workbook(self.excel_data, cache=cache)
+        workbook.metadata
+        workbook.get_sheet("Sheet1")
+
+        restarted_cache = WorkbookCache(memory_budget=10 ** 8, disk_budget=10 ** 8, directory=self.directory.name)
+        with patch("core.workbook.pd.ExcelFile") as mock_excel_file:
+            workbook = Workbook(self.excel_data, cache=restarted_cache)
+            metadata = workbook.metadata
+            df = workbook.get_sheet("Sheet1")
+        mock_excel_file.assert_not_called()
+        self.assertEqual(metadata, {"Sheet1": ["A", "B"], "Sheet2": ["C"]})
+        pd.testing.assert_frame_equal(df, self.df)
+        self.assertEqual(restarted_cache.stats()["disk_hits"], 1)
+
+    def test_disk_tier_reads_only_requested_columns(self):
+        cache = WorkbookCache(memory_budget=10 ** 8, disk_budget=10 ** 8, directory=self.directory.name)
+        Workbook(self.excel_data, cache=cache).get_sheet("Sheet1")
+
+        restarted_cache = WorkbookCache(memory_budget=10 ** 8, disk_budget=10 ** 8, directory=self.directory.name)
+        with patch("core.workbook.pd.ExcelFile") as mock_excel_file:
+            df = Workbook(self.excel_data, cache=restarted_cache).get_sheet("Sheet1", ["B"])
+        mock_excel_file.assert_not_called()
+        pd.testing.assert_frame_equal(df, self.df[["B"]])
+        self.assertEqual(restarted_cache.stats()["memory_bytes"], 0)
+
+    def test_disk_manifest_is_json(self):
+        excel_data = make_excel({"Sheet1": pd.DataFrame({"Region": ["North"], datetime(2024, 1, 1): [1]})})
+        cache = WorkbookCache(memory_budget=10 ** 8, disk_budget=10 ** 8, directory=self.directory.name)
+        Workbook(excel_data, cache=cache).metadata
+        key = cache.key_for(excel_data)
+
+        with open(os.path.join(self.directory.name, key, "manifest.json"), encoding="utf-8") as manifest:
+            self.assertListEqual(json.load(manifest)["sheet_names"], ["Sheet1"])
+        restarted_cache = WorkbookCache(memory_budget=10 ** 8, disk_budget=10 ** 8, directory=self.directory.name)
+        self.assertEqual(restarted_cache.get_manifest(key), (["Sheet1"], {"Sheet1": ["Region", datetime(2024, 1, 1)]}))
+
+    def test_disk_tier_needs_private_directory(self):
+        os.chmod(self.directory.name, 0o777)
+        cache = WorkbookCache(memory_budget=10 ** 8, disk_budget=10 ** 8, directory=self.directory.name)
+        Workbook(self.excel_data, cache=cache).get_sheet("Sheet1")
+
+        self.assertEqual(cache.disk_budget, 0)
+        self.assertListEqual(os.listdir(self.directory.name), [])
+
+    def test_new_disk_directory_is_private(self):
+        directory = os.path.join(self.directory.name, "workbooks")
+        WorkbookCache(memory_budget=10 ** 8, disk_budget=10 ** 8, directory=directory)
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+    def test_lru_eviction(self):
+        cache = WorkbookCache(memory_budget=1)
+        Workbook(self.excel_data, cache=cache).get_sheet("Sheet1")
+        other = make_excel({"Sheet1": pd.DataFrame({"Z": [0]})})
+        Workbook(other, cache=cache).get_sheet("Sheet1")
+
+        stats = cache.stats()
+        self.assertGreaterEqual(stats["evictions"], 1)
+        self.assertIsNone(cache.get_manifest(cache.key_for(self.excel_data)))
+
+    def tearDown(self):
+        self.directory.cleanup()
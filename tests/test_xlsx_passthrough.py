@@ -0,0 +1,74 @@
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook as OpenpyxlWorkbook, load_workbook
+from openpyxl.styles import Font
+
+from core.xlsx_passthrough import XlsxPassthroughWriter
+from tests import BaseTest
+
+
+class TestXlsxPassthroughWriter(BaseTest):
+    def setUp(self):
+        workbook = OpenpyxlWorkbook()
+        data = workbook.active
+        data.title = "Data"
+        data.append(["A", "B"])
+        data.append([1, 2])
+        data.append([3, 4])
+        totals = workbook.create_sheet("Totals & Notes")
+        totals.append(["Total"])
+        totals.append(["=SUM(Data!A2:A3)"])
+        totals["A1"].font = Font(bold=True)
+
+        self.source = BytesIO()
+        workbook.save(self.source)
+        self.writer = XlsxPassthroughWriter(self.source)
+
+    def _write(self, sheets):
+        output = BytesIO()
+        self.writer.write(output, sheets)
+        output.seek(0)
+        return output
+
+    def test_sheet_parts(self):
+        self.assertEqual(self.writer.sheet_parts, {"Data": "xl/worksheets/sheet1.xml",
+                                                   "Totals & Notes": "xl/worksheets/sheet2.xml"})
+
+    def test_untouched_sheet_is_copied_as_is(self):
+        df = pd.DataFrame({"A": [1, 3], "B": [2, 4], "A_B_sum": [3.0, 7.0]})
+        output = self._write({"Data": df})
+
+        with zipfile.ZipFile(self.source) as source, zipfile.ZipFile(output) as result:
+            self.assertEqual(source.read("xl/worksheets/sheet2.xml"), result.read("xl/worksheets/sheet2.xml"))
+            self.assertNotEqual(source.read("xl/worksheets/sheet1.xml"), result.read("xl/worksheets/sheet1.xml"))
+
+        workbook = load_workbook(output)
+        self.assertEqual(workbook["Totals & Notes"]["A2"].value, "=SUM(Data!A2:A3)")
+        self.assertTrue(workbook["Totals & Notes"]["A1"].font.bold)
+        self.assertEqual([cell.value for cell in workbook["Data"][1]], ["A", "B", "A_B_sum"])
+
+    def test_new_sheet_is_added(self):
+        result = pd.DataFrame({
+            "Name": ["x", None],
+            "Value": [1.5, float("nan")],
+            "When": pd.to_datetime(["2024-01-02", None]),
+            "Flag": [True, False],
+        })
+        output = self._write({"result_sheet": result})
+
+        workbook = load_workbook(output)
+        self.assertListEqual(workbook.sheetnames, ["Data", "Totals & Notes", "result_sheet"])
+        sheet = workbook["result_sheet"]
+        self.assertEqual([cell.value for cell in sheet[2]], ["x", 1.5, pd.Timestamp("2024-01-02"), True])
+        self.assertEqual([cell.value for cell in sheet[3]], [None, None, None, False])
+        self.assertTrue(sheet["C2"].is_date)
+
+        output.seek(0)
+        pd.testing.assert_frame_equal(pd.read_excel(output, sheet_name="Data"),
+                                      pd.DataFrame({"A": [1, 3], "B": [2, 4]}))
+
+    def test_invalid_source(self):
+        with self.assertRaises(ValueError):
+            XlsxPassthroughWriter(BytesIO(b"not a zip file"))
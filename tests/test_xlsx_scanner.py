@@ -0,0 +1,96 @@
+from datetime import datetime
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+from openpyxl import Workbook as OpenpyxlWorkbook
+
+from core.workbook import Workbook
+from core.xlsx_scanner import XlsxSchemaScanner
+from tests import BaseTest
+
+
+class TestXlsxSchemaScanner(BaseTest):
+    def setUp(self):
+        self.excel_data = BytesIO()
+        with pd.ExcelWriter(self.excel_data, engine='openpyxl') as writer:
+            pd.DataFrame({
+                "Id": [1, 2, 3],
+                "Price": [3.5, 4.5, None],
+                "Name": ["x", "y", "z"],
+                "Date": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03"]),
+                "Active": [True, False, True],
+            }).to_excel(writer, sheet_name="Sheet1", index=False)
+            pd.DataFrame({"Text": [f"row {index}" for index in range(2000)]}).to_excel(writer, sheet_name="Long",
+                                                                                      index=False)
+        self.excel_data.seek(0)
+        self.scanner = XlsxSchemaScanner(self.excel_data)
+
+    def test_sheet_names(self):
+        self.assertListEqual(self.scanner.sheet_names, ["Sheet1", "Long"])
+
+    def test_scan(self):
+        self.assertEqual(self.scanner.scan("Sheet1"), {
+            "columns": ["Id", "Price", "Name", "Date", "Active"],
+            "dtypes": ["int64", "float64", "object", "datetime64[ns]", "bool"],
+            "rows": 3,
+        })
+
+    def test_scan_reads_only_first_rows(self):
+        schema = self.scanner.scan("Long")
+        self.assertEqual(schema, {"columns": ["Text"], "dtypes": ["object"], "rows": 2000})
+        # Only the shared strings of the header and the sampled rows are read
+        self.assertLess(len(self.scanner._shared_strings), 100)
+
+    def test_scan_names_columns_like_pandas(self):
+        workbook = OpenpyxlWorkbook()
+        workbook.active.append(["A", None, "A", 2024])
+        workbook.active.append([1, 2, 3, 4])
+        excel_data = BytesIO()
+        workbook.save(excel_data)
+
+        columns = XlsxSchemaScanner(excel_data).scan("Sheet")["columns"]
+        excel_data.seek(0)
+        self.assertListEqual(columns, list(pd.read_excel(excel_data).columns))
+
+    def test_date_header_is_named_like_pandas(self):
+        workbook = OpenpyxlWorkbook()
+        workbook.active.append(["Region", datetime(2024, 1, 1), datetime(2024, 2, 1)])
+        workbook.active.append(["North", 1, 2])
+        excel_data = BytesIO()
+        workbook.save(excel_data)
+
+        columns = XlsxSchemaScanner(excel_data).scan("Sheet")["columns"]
+        excel_data.seek(0)
+        self.assertListEqual(columns, list(pd.read_excel(excel_data).columns))
+        self.assertEqual(columns[1], datetime(2024, 1, 1))
+
+    def test_shared_strings_are_read_once_across_sheets(self):
+        excel_data = BytesIO()
+        with pd.ExcelWriter(excel_data, engine='openpyxl') as writer:
+            for sheet in range(4):
+                pd.DataFrame({"Text": [f"sheet {sheet} row {row}" for row in range(50)]}).to_excel(
+                    writer, sheet_name=f"Sheet{sheet}", index=False)
+        scanner = XlsxSchemaScanner(excel_data)
+
+        with patch.object(XlsxSchemaScanner, "_XlsxSchemaScanner__shared_string_text",
+                          wraps=XlsxSchemaScanner._XlsxSchemaScanner__shared_string_text) as mock_text:
+            schemas = [scanner.scan(f"Sheet{sheet}") for sheet in range(4)]
+
+        self.assertTrue(all(schema["columns"] == ["Text"] for schema in schemas))
+        self.assertEqual(mock_text.call_count, len(scanner._shared_strings))
+        self.assertLess(len(scanner._shared_strings), 200)
+        scanner.close()
+
+    def test_invalid_file(self):
+        with self.assertRaises(ValueError):
+            XlsxSchemaScanner(BytesIO(b"not an excel file"))
+
+    def test_workbook_schema_skips_openpyxl(self):
+        with patch("core.workbook.pd.ExcelFile") as mock_excel_file:
+            workbook = Workbook(self.excel_data)
+            metadata = workbook.metadata
+            schema = workbook.schema
+        mock_excel_file.assert_not_called()
+        self.assertEqual(metadata, {"Sheet1": ["Id", "Price", "Name", "Date", "Active"], "Long": ["Text"]})
+        self.assertEqual(schema["Long"]["rows"], 2000)
@@ -1,19 +1,26 @@
 """
 Utility functions for the application
 """
+import io
 import json
+import mmap
 import os
+import tempfile
 from functools import wraps
 
-import google.generativeai as genai
-import pandas as pd
-from flask import request, g
+from flask import request, g, Request
 from pydantic import BaseModel, Field, model_validator
 
-from config import logger
+from config import logger, UPLOAD_SPOOL_MAX_SIZE, UPLOAD_SPOOL_DIR, LOCAL_INSTRUCTION_PARSER, PREFETCH_MAX_SHEETS
 from constants import ErrorCodes, Operations
+from core.instruction_parser import instruction_parser, candidate_sheets
+from core.llm_client import gemini_client
+from core.params_cache import params_cache
+from core.prompt_builder import build_extraction_prompt
+from core.sessions import workbook_sessions
+from core.workbook import Workbook
+from core.workbook_cache import workbook_cache
 from custom_exceptions import InvalidParameters, InvalidInstruction, InvalidFile
-from system_prompt import EXCEL_PARAM_EXTRACTION_PROMPT
 
 
 # create a schema for parameters checking from instructions
@@ -43,6 +50,70 @@ class Parameters(BaseModel):
         return self.model_dump()
 
 
+class SpooledUploadRequest(Request):
+    """
+    Request keeping uploaded files in memory up to UPLOAD_SPOOL_MAX_SIZE bytes and in a temporary file above it
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not UPLOAD_SPOOL_MAX_SIZE or (total_content_length or 0) > UPLOAD_SPOOL_MAX_SIZE:
+            # Known to be large, so written to disk from the first chunk instead of rolled over later
+            return tempfile.TemporaryFile('rb+', dir=UPLOAD_SPOOL_DIR)
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE, mode='rb+', dir=UPLOAD_SPOOL_DIR)
+
+
+class MappedUpload(io.RawIOBase):
+    """
+    Read-only seekable view of an uploaded file spooled to disk, memory mapped so zip members are read from the
+    page cache instead of being buffered by the process
+    """
+    def __init__(self, fileno: int):
+        super().__init__()
+        self._map = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size=-1) -> bytes:
+        return self._map.read(size if size is not None and size >= 0 else None)
+
+    def readinto(self, buffer) -> int:
+        data = self._map.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._map.seek(offset, whence)
+        return self._map.tell()
+
+    def tell(self) -> int:
+        return self._map.tell()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._map.close()
+        super().close()
+
+
+def open_upload(file):
+    """
+    Returns a seekable stream of an uploaded file, memory mapped when the upload was spooled to disk
+    """
+    stream = getattr(file, 'stream', file)
+    if getattr(stream, '_rolled', True) is False:
+        return file
+    try:
+        fileno = stream.fileno()
+    except (AttributeError, OSError):
+        return file
+    stream.flush()
+    if os.fstat(fileno).st_size == 0:
+        return file
+    return MappedUpload(fileno)
+
+
 def validate_process_excel_request(func: callable) -> callable:
     """
     Validates the request parameters for the process excel endpoint
@@ -59,21 +130,73 @@ def validate_process_excel_request(func: callable) -> callable:
             raise InvalidFile(error_code=ErrorCodes.INVALID_FILE)
 
         if instructions:
-            excel_metadata = extract_excel_metadata(file)
-            params = extract_params_from_instructions(excel_metadata, instructions)
-            if not params:
-                raise InvalidInstruction(error_code=ErrorCodes.INVALID_INSTRUCTION)
-            validated_params = validate_params_from_instructions(params)
-            g.params = validated_params
+            workbook = Workbook(open_upload(file), cache=workbook_cache)
+            # Set first so the upload is released at teardown even when the instructions are rejected
+            g.workbook = workbook
+            g.params = extract_validated_params(workbook, instructions)
         return func(*args, **kwargs)
     return decorated_function
 
 
-def extract_params_from_instructions(excel_metadata, instructions: str) -> dict:
+def validate_upload_workbook_request(func: callable) -> callable:
     """
-    Parse the parameters from the instructions
+    Validates the request parameters for the workbook upload endpoint
+    """
+    @wraps(func)
+    def decorated_function(*args, **kwargs):
+        if 'file' not in request.files:
+            raise InvalidParameters(error_code=ErrorCodes.INVALID_PARAMETERS)
+
+        if request.files['file'].filename == '':
+            raise InvalidFile(error_code=ErrorCodes.INVALID_FILE)
+        return func(*args, **kwargs)
+    return decorated_function
+
+
+def validate_workbook_session_request(func: callable) -> callable:
+    """
+    Validates the request parameters for the endpoint processing an uploaded workbook session
+    """
+    @wraps(func)
+    def decorated_function(workbook_id, *args, **kwargs):
+        instructions = request.form.get('instructions')
+        if not instructions:
+            raise InvalidParameters(error_code=ErrorCodes.INVALID_PARAMETERS)
+
+        workbook = workbook_sessions.get(workbook_id).open_workbook()
+        g.workbook = workbook
+        g.params = extract_validated_params(workbook, instructions)
+        return func(workbook_id, *args, **kwargs)
+    return decorated_function
+
+
+def extract_validated_params(workbook: Workbook, instructions: str) -> dict:
+    """
+    Extract and validate the operation parameters of the instructions against the workbook schema
+    """
+    excel_metadata = extract_excel_metadata(workbook)
+    validated_params = params_cache.get(instructions, excel_metadata)
+    if validated_params is not None:
+        logger.debug("Parameters of the instructions served from cache")
+        return validated_params
+    params = instruction_parser.parse(instructions, excel_metadata) if LOCAL_INSTRUCTION_PARSER else None
+    if params is None:
+        # Read before the prefetch starts, as both read the uploaded file
+        schema = workbook.schema
+        # Parse the sheets the instruction likely needs while waiting for the LLM
+        workbook.prefetch(candidate_sheets(instructions, excel_metadata, PREFETCH_MAX_SHEETS))
+        params = extract_params_from_instructions(excel_metadata, instructions, schema)
+    if not params:
+        raise InvalidInstruction(error_code=ErrorCodes.INVALID_INSTRUCTION)
+    validated_params = validate_params_from_instructions(params)
+    params_cache.put(instructions, excel_metadata, validated_params)
+    return validated_params
+
+
+def extract_params_from_instructions(excel_metadata, instructions: str, schema: dict = None) -> dict:
+    """
+    Parse the parameters from the instructions. The schema, when given, adds dtype hints to the prompt
     """
-    genai.configure(api_key=os.environ.get('GEMINI_FLASH_API_KEY'))
     generation_config = {
         "temperature": 0,
         "top_p": 0.95,
@@ -81,16 +204,8 @@ def extract_params_from_instructions(excel_metadata, instructions: str) -> dict:
         "max_output_tokens": 8192,
         "response_mime_type": "application/json",
     }
-    system_prompt = EXCEL_PARAM_EXTRACTION_PROMPT.format(excel_metadata=excel_metadata, user_query=instructions)
-    logger.info(f"system_prompt: {system_prompt}")
-    model = genai.GenerativeModel(
-        "gemini-2.0-flash",
-        generation_config=generation_config,
-        system_instruction=system_prompt
-    )
-    chat_session = model.start_chat(history=[])
-    _response = chat_session.send_message(instructions)
-    _response = _response.text
+    system_prompt, _ = build_extraction_prompt(instructions, excel_metadata, schema)
+    _response = gemini_client.generate(system_prompt, instructions, generation_config)
     logger.info(f"response from gemini: {_response}")
     return json.loads(_response)
 
@@ -104,12 +219,14 @@ def validate_params_from_instructions(params: dict) -> dict:
     return output.to_dict()
 
 
-def extract_excel_metadata(file_stream):
-    """Extract sheet names, column names, and data types from an uploaded Excel file."""
-    metadata = {}
-    xls = pd.ExcelFile(file_stream, engine='openpyxl')
-    for sheet in xls.sheet_names:
-        df = pd.read_excel(xls, sheet_name=sheet, nrows=2)
-        metadata[sheet] = list(df.columns)
+def extract_excel_metadata(workbook):
+    """
+    Extract sheet names and column names from an uploaded Excel file.
+
+    Accepts either a parsed Workbook, whose sheets are then reused by the engine, or a raw file stream.
+    """
+    if not isinstance(workbook, Workbook):
+        workbook = Workbook(workbook)
+    metadata = workbook.metadata
     logger.debug(f"metadata of uploaded excel file:: {metadata}")
     return metadata